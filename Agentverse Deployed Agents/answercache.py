@@ -0,0 +1,269 @@
+import functools
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, FrozenSet, List, Optional, Tuple, Type
+
+from uagents import Model
+
+from router import STOPWORDS, stem, tokenize
+import tracing
+
+# Final answers are served again for this long after they were sent (0 turns the cache off)
+FRESH_FOR = float(os.getenv("ANSWER_CACHE_FRESH_SECONDS", "900"))
+# Least Jaccard similarity between two normalized queries for one's answer to serve the other
+SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.85"))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "50000"))
+# Longer queries (pasted resumes, long compound requests) are neither cached nor looked up
+MAX_QUERY_WORDS = int(os.getenv("ANSWER_CACHE_MAX_QUERY_WORDS", "48"))
+
+# MinHash signature of BANDS x ROWS hashes. Two queries become candidates when
+# all ROWS hashes of any band agree, which is likely above a similarity of
+# about (1 / BANDS) ** (1 / ROWS), i.e. 0.75, and rare well below it.
+BANDS = 10
+ROWS = 8
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5A17)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(BANDS * ROWS)]
+
+# Words that only dress a request up ("please show me the latest ...")
+_FILLER = STOPWORDS | frozenset(tokenize(
+    "about all any best current find get give help hi hello kindly know latest let list looking me my "
+    "need new please recent show some tell top want"
+))
+
+# Other names for the same thing, mapped to one spelling (phrases are fine on the right)
+SYNONYMS = {
+    "bombay": "mumbai", "bangalore": "bengaluru", "calcutta": "kolkata", "madras": "chennai",
+    "gurgaon": "gurugram", "poona": "pune", "baroda": "vadodara", "trivandrum": "thiruvananthapuram",
+    "ml": "machine learning", "ai": "artificial intelligence", "nlp": "natural language processing",
+    "sde": "software engineer", "swe": "software engineer", "dev": "developer", "devs": "developer",
+    "sr": "senior", "jr": "junior", "cv": "resume", "biodata": "resume", "vacancy": "job",
+    "vacancies": "job", "certificate": "certification",
+    "wfh": "remote", "hr": "human resources"
+}
+_SYNONYMS = {stem(word): tokenize(canonical) for word, canonical in SYNONYMS.items()}
+
+# Set by AnswerCache.handler while a request is answered; `degraded()` marks that answer unfit to cache
+_degraded: ContextVar[Optional[List[str]]] = ContextVar("answer_degraded", default=None)
+
+
+def degraded(reason: str):
+    """Keep the answer being built in this task (and the tasks it started) out of the cache."""
+    reasons = _degraded.get()
+    if reasons is not None:
+        reasons.append(reason)
+
+
+def normalize_query(query: str) -> FrozenSet[str]:
+    """The query's topic words: stemmed, synonyms folded to one spelling, filler dropped."""
+    words = set()
+    for token in tokenize(query):
+        for word in _SYNONYMS.get(token, (token,)):
+            if word not in _FILLER:
+                words.add(word)
+    return frozenset(words)
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_hashes(word: str) -> Tuple[int, ...]:
+    # In-memory only, so Python's per-process string hash will do
+    h = hash(word) & _PRIME
+    return tuple((a * h + b) % _PRIME for a, b in _PERMUTATIONS)
+
+
+def signature(words: FrozenSet[str]) -> List[int]:
+    """MinHash of the word set."""
+    return list(map(min, *(_word_hashes(word) for word in words))) if len(words) > 1 \
+        else list(_word_hashes(next(iter(words))))
+
+
+class AnswerCache:
+    """Recent final answers of one agent, served again to near-identical queries.
+
+    Queries are compared as normalized word sets. An answer is served when the
+    Jaccard similarity reaches `similarity` and one set contains the other:
+    extra or missing words may be filler the stop list does not know, but a
+    word swapped for another ("Pune" for "Delhi") makes a different question.
+    Candidates come from a MinHash LSH index (one dict lookup per band), so a
+    lookup costs the same with a hundred entries or a few hundred thousand.
+
+    Answers are kept per `scope` (the request's hop count, since a forwarded
+    request gets a shorter pipeline) for `fresh_for` seconds, oldest evicted
+    first beyond `max_entries`.
+    """
+
+    def __init__(self, response_model: Type[Model], chunk_model: Type[Model], fresh_for: float = FRESH_FOR,
+                 similarity: float = SIMILARITY, max_entries: int = MAX_ENTRIES):
+        self.response_model = response_model
+        self.chunk_model = chunk_model
+        self.fresh_for = fresh_for
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.not_stored = 0
+        self._response_digest = Model.build_schema_digest(response_model)
+        self._chunk_digest = Model.build_schema_digest(chunk_model)
+        self._next_id = 0
+        # id -> (stored at, scope, words, answer, band keys), oldest first
+        self._entries: "OrderedDict[int, Tuple[float, int, FrozenSet[str], str, List[int]]]" = OrderedDict()
+        self._buckets: Dict[int, List[int]] = {}
+        self._exact: Dict[Tuple[int, FrozenSet[str]], int] = {}
+
+    def _words(self, query: str) -> Optional[FrozenSet[str]]:
+        if self.fresh_for <= 0:
+            return None
+        words = normalize_query(query)
+        if not words or len(words) > MAX_QUERY_WORDS:
+            return None
+        return words
+
+    @staticmethod
+    def _band_keys(words: FrozenSet[str], scope: int) -> List[int]:
+        sig = signature(words)
+        return [hash((scope, band) + tuple(sig[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+    def _expire(self, now: float):
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if now - entry[0] < self.fresh_for and len(self._entries) <= self.max_entries:
+                return
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: int):
+        _, scope, words, _, keys = self._entries.pop(entry_id)
+        del self._exact[(scope, words)]
+        for key in keys:
+            bucket = self._buckets[key]
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[key]
+
+    def lookup(self, query: str, scope: int = 0) -> Optional[str]:
+        """A fresh answer to a near-identical query, or None."""
+        words = self._words(query)
+        if words is None:
+            self.uncacheable += 1
+            return None
+        self._expire(time.monotonic())
+
+        entry_id = self._exact.get((scope, words))
+        if entry_id is not None:
+            self.hits += 1
+            return self._entries[entry_id][3]
+
+        # With one set inside the other, the similarity is just the ratio of their sizes
+        best, best_similarity = None, 0.0
+        seen = set()
+        for key in self._band_keys(words, scope):
+            for entry_id in self._buckets.get(key, ()):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                _, entry_scope, entry_words, answer, _ = self._entries[entry_id]
+                small, large = (words, entry_words) if len(words) <= len(entry_words) else (entry_words, words)
+                similarity = len(small) / len(large)
+                if (similarity >= self.similarity and similarity > best_similarity and entry_scope == scope
+                        and small <= large):
+                    best, best_similarity = answer, similarity
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def store(self, query: str, answer: str, scope: int = 0):
+        words = self._words(query)
+        if words is None:
+            return
+        previous = self._exact.get((scope, words))
+        if previous is not None:
+            self._remove(previous)
+        entry_id = self._next_id
+        self._next_id += 1
+        keys = self._band_keys(words, scope)
+        self._entries[entry_id] = (time.monotonic(), scope, words, answer, keys)
+        self._exact[(scope, words)] = entry_id
+        for key in keys:
+            self._buckets.setdefault(key, []).append(entry_id)
+        self._expire(time.monotonic())
+
+    def _sent_answer(self, ctx, recipient: str, request_id: Optional[str]) -> Optional[str]:
+        """The final answer the handler sent `recipient`, whole or as chunks, from the context's outbox."""
+        chunks = []
+        finished = False
+        for body, digest in ctx.outbound_messages.get(recipient, []):
+            if digest not in (self._response_digest, self._chunk_digest):
+                continue
+            message = json.loads(body)
+            if message.get("request_id") != request_id:
+                continue
+            if digest == self._response_digest:
+                return message["result"]
+            chunks.append((message["seq"], message["result"]))
+            finished = finished or message.get("final", False)
+        return "".join(text for _, text in sorted(chunks)) if finished else None
+
+    def handler(self, func):
+        """Answer a TaskRequest from the cache when possible; otherwise run the handler and keep its answer."""
+        @functools.wraps(func)
+        async def cached(ctx, sender: str, msg):
+            answer = self.lookup(msg.query, msg.hops)
+            if answer is not None:
+                ctx.logger.info("🗂️ Answered from the recent-answer cache")
+                with tracing.child("reply", cached=True):
+                    if msg.stream:
+                        await ctx.send(sender, self.chunk_model(result=answer, seq=0, final=True,
+                                                                request_id=msg.request_id))
+                    else:
+                        await ctx.send(sender, self.response_model(result=answer, request_id=msg.request_id,
+                                                                   trace=tracing.context()))
+                return
+
+            with self.answering(ctx, sender, msg.request_id, msg.query, msg.hops):
+                await func(ctx, sender, msg)
+        return cached
+
+    @contextmanager
+    def answering(self, ctx, recipient: str, request_id: Optional[str], query: str, scope: int = 0):
+        """Store the final answer sent to `recipient` in this block, unless `degraded()` was called.
+
+        For answers sent outside the TaskRequest handler (e.g. once a tool replies);
+        inside another `answering()` block it leaves the storing to that one.
+        """
+        if _degraded.get() is not None:
+            yield
+            return
+        reasons = []
+        token = _degraded.set(reasons)
+        try:
+            yield
+        finally:
+            _degraded.reset(token)
+        answer = self._sent_answer(ctx, recipient, request_id)
+        if answer is None:
+            return
+        if reasons:
+            self.not_stored += 1
+            return
+        self.store(query, answer, scope)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncacheable": self.uncacheable,
+            "not_stored": self.not_stored,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries)
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,428 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from completioncache import CompletionCache
+from singleflight import SingleFlight
+from resilience import BACKOFF_CAP, RETRIES, CircuitBreaker, LatencyWindow, backoff
+from scheduler import ENRICHMENT, Scheduler
+from promptbudget import estimate_tokens
+import metrics
+import tracing
+
+# === ASI1 endpoint & pool settings ===
+ASI1_URL = os.getenv("ASI1_URL", "https://api.asi1.ai/v1/chat/completions")
+ASI1_MODEL = os.getenv("ASI1_MODEL", "asi1-mini")
+MAX_CONNECTIONS = int(os.getenv("ASI1_MAX_CONNECTIONS", "20"))
+MAX_CONCURRENCY = int(os.getenv("ASI1_MAX_CONCURRENCY", "8"))
+KEEPALIVE_SECONDS = float(os.getenv("ASI1_KEEPALIVE_SECONDS", "30"))
+DEFAULT_TIMEOUT = float(os.getenv("ASI1_TIMEOUT", "60"))
+
+
+class ASI1Error(Exception):
+    """A failed ASI1 call. `retryable` marks failures worth another attempt (timeouts, 429, 5xx).
+
+    `kind` is a coarse class of the failure for the metrics: connection,
+    timeout, rate_limited, http, bad_response or circuit_open.
+    """
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None,
+                 kind: str = "connection"):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.kind = kind
+
+    @property
+    def rejected(self) -> bool:
+        """ASI1 answered but refused the request (a 4xx other than 429), which says nothing about its health."""
+        return self.kind == "http" and not self.retryable
+
+    @classmethod
+    def from_status(cls, status: int, body: str, retry_after: Optional[str] = None) -> "ASI1Error":
+        try:
+            wait = min(float(retry_after), BACKOFF_CAP) if retry_after else None
+        except ValueError:
+            wait = None
+        return cls(f"HTTP {status}: {body}", retryable=status == 429 or status >= 500, retry_after=wait,
+                   kind="rate_limited" if status == 429 else "http")
+
+
+class CircuitOpenError(ASI1Error):
+    """Raised without calling ASI1 while the circuit breaker is open."""
+
+    def __init__(self, message: str):
+        super().__init__(message, kind="circuit_open")
+
+
+def _agent() -> str:
+    """The agent whose span is making the current call, for metric labels."""
+    span = tracing.current()
+    return span.service if span is not None else "unknown"
+
+
+def _count_error(error: ASI1Error):
+    """Count a failure that reached the caller, under the agent that made the call."""
+    metrics.asi1_errors.inc(_agent(), error.kind)
+
+
+# One keep-alive pool per process, shared by every ASI1Client so agents
+# running side by side reuse the same connections.
+_session: Optional[aiohttp.ClientSession] = None
+# One scheduler (rate budget, priority queues) per API key, shared the same way
+_schedulers: Dict[str, Scheduler] = {}
+
+
+def _pool() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, keepalive_timeout=KEEPALIVE_SECONDS)
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+
+def scheduler_for(api_key: str) -> Scheduler:
+    if api_key not in _schedulers:
+        _schedulers[api_key] = Scheduler(concurrency=MAX_CONCURRENCY)
+    return _schedulers[api_key]
+
+
+def scheduler_stats() -> Dict[str, dict]:
+    """Queue depth, waits and throttling per API key (keys shortened to their last 4 characters)."""
+    return {f"...{(key or '')[-4:]}": scheduler.stats() for key, scheduler in _schedulers.items()}
+
+
+# Identical calls in flight at the same time (any client, same API key, priority,
+# model, temperature and prompt) share one request; `inflight.stats()` counts the duplicates saved.
+inflight = SingleFlight()
+
+# Recent latencies (adaptive timeouts, hedging) and the circuit breaker are per
+# process too, since every client talks to the same endpoint.
+latency = LatencyWindow()
+breaker = CircuitBreaker()
+counters = {"retries": 0, "hedges": 0}
+
+
+def resilience_stats() -> dict:
+    return dict(
+        counters,
+        p50=latency.percentile(50),
+        p95=latency.percentile(95),
+        timeout=latency.timeout(DEFAULT_TIMEOUT),
+        breaker=breaker.stats()
+    )
+
+
+async def close_pool():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+class ASI1Client:
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = ASI1_MODEL,
+        temperature: float = 0.7,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache: Optional[CompletionCache] = None,
+    ):
+        self.api_key = api_key or os.getenv("ASI1_API_KEY")
+        self.model = model
+        self.temperature = temperature
+        self.timeout = timeout
+        self.cache = cache
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, messages: List[Dict[str, str]], temperature: float, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": stream
+        }
+
+    @staticmethod
+    def _messages(prompt: str, system: Optional[str]) -> List[Dict[str, str]]:
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def _key(self, prompt: str, system: Optional[str], temperature: float) -> str:
+        return CompletionCache.key(self.model, temperature, f"{system or ''}\n{prompt}")
+
+    def _flight_key(self, key: str, priority: int) -> str:
+        """A shared call runs on its first caller's API key and priority, so only callers with both may join it."""
+        return f"{self.api_key}\n{priority}\n{key}"
+
+    def _cached(self, key: str) -> Optional[str]:
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _remember(self, key: str, content: str):
+        if self.cache is not None and content:
+            self.cache.set(key, content)
+
+    async def complete(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: Optional[float] = None,
+        timeout: Optional[float] = None,
+        priority: int = ENRICHMENT,
+        session_id: Optional[str] = None,
+    ) -> str:
+        """Return the completion text for `prompt`, raising ASI1Error on failure.
+
+        Slow calls are hedged with a duplicate request, retryable failures are
+        retried, and the timeout shrinks to a multiple of the observed p99.
+        The call waits for the API key's scheduler at `priority` (see
+        scheduler.py), taking turns with other `session_id`s at that priority.
+        """
+        temperature = self.temperature if temperature is None else temperature
+        timeout = timeout or self.timeout
+
+        key = self._key(prompt, system, temperature)
+        with tracing.child("asi1.complete", priority=priority, prompt_tokens=estimate_tokens(prompt)) as span:
+            cached = self._cached(key)
+            if cached is not None:
+                span.set(cached=True, completion_tokens=estimate_tokens(cached))
+                return cached
+
+            data = self._payload(self._messages(prompt, system), temperature, stream=False)
+            admit = (priority, session_id)
+            try:
+                flight = self._flight_key(key, priority)
+                parts = [part async for part in inflight.join(flight, lambda: self._post(data, timeout, key, admit))]
+            except ASI1Error as e:
+                _count_error(e)
+                raise
+            content = "".join(parts)
+            span.set(completion_tokens=estimate_tokens(content))
+            return content
+
+    async def stream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: Optional[float] = None,
+        timeout: Optional[float] = None,
+        priority: int = ENRICHMENT,
+        session_id: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Yield completion deltas as ASI1 streams them (SSE), raising ASI1Error on failure.
+
+        `timeout` bounds the wait for each chunk rather than the whole stream.
+        A failed stream is retried only if it failed before its first delta.
+        """
+        temperature = self.temperature if temperature is None else temperature
+        timeout = timeout or self.timeout
+
+        key = self._key(prompt, system, temperature)
+        # Not made current: a context variable set in a generator would leak into the consumer
+        span = tracing.start_child("asi1.stream", priority=priority, prompt_tokens=estimate_tokens(prompt))
+        cached = self._cached(key)
+        if cached is not None:
+            span.end(cached=True, completion_tokens=estimate_tokens(cached))
+            yield cached
+            return
+
+        data = self._payload(self._messages(prompt, system), temperature, stream=True)
+        admit = (priority, session_id)
+        parts = []
+        try:
+            flight = self._flight_key(key, priority)
+            async for delta in inflight.join(flight, lambda: self._post_stream(data, timeout, key, admit)):
+                if not parts:
+                    span.set(first_token_ms=round((time.time() - span.start) * 1000, 3))
+                parts.append(delta)
+                yield delta
+        except ASI1Error as e:
+            span.set(error=str(e))
+            _count_error(e)
+            raise
+        finally:
+            span.end(completion_tokens=estimate_tokens("".join(parts)))
+
+    async def _post(self, data: dict, timeout: float, key: str, admit: Tuple[int, Optional[str]]) -> AsyncIterator[str]:
+        content = await self._resilient(lambda: self._hedged(data, timeout, admit))
+        self._remember(key, content)
+        yield content
+
+    async def _resilient(self, call: Callable[[], Awaitable[str]]) -> str:
+        """Run `call` behind the circuit breaker, retrying retryable failures with jittered backoff."""
+        for attempt in range(RETRIES + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"ASI1 circuit open after {breaker.consecutive} consecutive failures")
+            try:
+                result = await call()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except ASI1Error as e:
+                if e.rejected:
+                    breaker.release()
+                else:
+                    breaker.failure()
+                if not e.retryable or attempt == RETRIES:
+                    raise
+                counters["retries"] += 1
+                await asyncio.sleep(max(backoff(attempt), e.retry_after or 0.0))
+            except Exception:
+                # Anything unforeseen still ends the call, so a half-open probe cannot stay in flight
+                breaker.failure()
+                raise
+            else:
+                breaker.success()
+                return result
+
+    async def _hedged(self, data: dict, timeout: float, admit: Tuple[int, Optional[str]]) -> str:
+        """One attempt, plus a duplicate if the first is still running past the p95 latency."""
+        timeout = latency.timeout(timeout)
+        admitted = asyncio.Event()
+        first = asyncio.ensure_future(self._attempt(data, timeout, admit, admitted))
+        delay = latency.hedge_delay()
+        if delay is None or delay >= timeout:
+            return await first
+
+        attempts = {first}
+        try:
+            # Time spent queued in the scheduler does not count towards the hedge delay
+            started = asyncio.ensure_future(admitted.wait())
+            await asyncio.wait({first, started}, return_when=asyncio.FIRST_COMPLETED)
+            started.cancel()
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                counters["hedges"] += 1
+                attempts.add(asyncio.ensure_future(self._attempt(data, timeout, admit)))
+            error = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def _attempt(self, data: dict, timeout: float, admit: Tuple[int, Optional[str]],
+                       admitted: Optional[asyncio.Event] = None) -> str:
+        session = _pool()
+        started = None
+        try:
+            async with scheduler_for(self.api_key).slot(*admit):
+                # Time the call itself, not its wait in the queue
+                started = time.monotonic()
+                if admitted is not None:
+                    admitted.set()
+                async with session.post(
+                    ASI1_URL,
+                    headers=self._headers(),
+                    json=data,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                ) as response:
+                    if response.status == 429:
+                        scheduler_for(self.api_key).bucket.drain()
+                    if response.status != 200:
+                        raise ASI1Error.from_status(response.status, await response.text(),
+                                                    response.headers.get("Retry-After"))
+                    body = await response.json()
+        except asyncio.TimeoutError:
+            raise ASI1Error(f"timed out after {timeout:.1f}s", retryable=True, kind="timeout")
+        except (aiohttp.ContentTypeError, ValueError) as e:
+            # 200 with a body that is not JSON (ContentTypeError is a ClientError, so it comes first)
+            raise ASI1Error(f"undecodable response: {e}", kind="bad_response")
+        except aiohttp.ClientError as e:
+            raise ASI1Error(str(e), retryable=True)
+        finally:
+            if started is not None:
+                metrics.asi1_seconds.observe(time.monotonic() - started, _agent(), "request")
+
+        try:
+            content = body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise ASI1Error(f"unexpected response shape: {e}", kind="bad_response")
+        if body.get("usage") and tracing.current() is not None:
+            # ASI1's own token counts, next to the estimates on the asi1.complete span
+            tracing.current().set(usage=body["usage"])
+        latency.add(time.monotonic() - started)
+        return content
+
+    async def _post_stream(self, data: dict, timeout: float, key: str,
+                           admit: Tuple[int, Optional[str]]) -> AsyncIterator[str]:
+        parts: List[str] = []
+        # Retrying is only safe until the first delta has been passed on
+        for attempt in range(RETRIES + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"ASI1 circuit open after {breaker.consecutive} consecutive failures")
+            try:
+                async for delta in self._stream_attempt(data, timeout, admit):
+                    parts.append(delta)
+                    yield delta
+            except (asyncio.CancelledError, GeneratorExit):
+                breaker.release()
+                raise
+            except ASI1Error as e:
+                if e.rejected:
+                    breaker.release()
+                else:
+                    breaker.failure()
+                if parts or not e.retryable or attempt == RETRIES:
+                    raise
+                counters["retries"] += 1
+                await asyncio.sleep(max(backoff(attempt), e.retry_after or 0.0))
+            except Exception:
+                breaker.failure()
+                raise
+            else:
+                breaker.success()
+                break
+
+        self._remember(key, "".join(parts))
+
+    async def _stream_attempt(self, data: dict, timeout: float, admit: Tuple[int, Optional[str]]) -> AsyncIterator[str]:
+        session = _pool()
+        try:
+            async with scheduler_for(self.api_key).slot(*admit):
+                started = time.monotonic()
+                async with session.post(
+                    ASI1_URL,
+                    headers=self._headers(),
+                    json=data,
+                    timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+                ) as response:
+                    if response.status != 200:
+                        raise ASI1Error.from_status(response.status, await response.text(),
+                                                    response.headers.get("Retry-After"))
+                    async for raw in response.content:
+                        line = raw.decode("utf-8", errors="replace").strip()
+                        if not line.startswith("data:"):
+                            continue
+                        event = line[len("data:"):].strip()
+                        if event == "[DONE]":
+                            break
+                        try:
+                            delta = json.loads(event)["choices"][0].get("delta", {}).get("content")
+                        except (ValueError, KeyError, IndexError, TypeError) as e:
+                            raise ASI1Error(f"unexpected stream chunk: {e}", kind="bad_response")
+                        if delta:
+                            if started is not None:
+                                metrics.asi1_seconds.observe(time.monotonic() - started, _agent(), "stream_first_token")
+                                started = None
+                            yield delta
+        except asyncio.TimeoutError:
+            raise ASI1Error(f"stream stalled for more than {timeout}s", retryable=True, kind="timeout")
+        except aiohttp.ClientError as e:
+            raise ASI1Error(str(e), retryable=True)
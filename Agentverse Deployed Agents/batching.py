@@ -0,0 +1,90 @@
+import asyncio
+import re
+from typing import Dict, Optional
+
+from asi1client import ASI1Client, ASI1Error
+
+_HEADER = "=== SECTION: {name} ==="
+# Tolerates markdown around the header, e.g. "**=== SECTION: x ===**" or "## === SECTION: x ==="
+_HEADER_LINE = re.compile(r"^[\s#*_]*=+\s*SECTION:\s*(.+?)\s*=+[\s*_]*$", re.M | re.I)
+
+
+def split_sections(text: str, names) -> Dict[str, str]:
+    """Pull the named sections out of a multi-section completion; unknown or empty ones are left out."""
+    by_key = {name.casefold(): name for name in names}
+    headers = list(_HEADER_LINE.finditer(text))
+    sections = {}
+    for i, header in enumerate(headers):
+        name = by_key.get(header.group(1).strip("*_ ").casefold())
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        body = text[header.end():end].strip()
+        if name and body and name not in sections:
+            sections[name] = body
+    return sections
+
+
+class SectionBatch:
+    """Runs several analyses of the same input as one ASI1 call.
+
+    The input is sent once, followed by one instruction per section and an
+    output schema of `=== SECTION: <name> ===` headers. The reply is split
+    back into sections. Sections that are missing or empty in the reply (or
+    all of them, if the batched call fails) are asked for one by one, unless
+    the caller turns `fallback` off to handle them itself.
+    """
+
+    def __init__(self, client: ASI1Client):
+        self.client = client
+        self.batches = 0
+        self.sections = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def prompt(shared_input: str, sections: Dict[str, str]) -> str:
+        briefs = "\n".join(f"- {name}: {instruction}" for name, instruction in sections.items())
+        headers = "\n".join(_HEADER.format(name=name) + "\n<content>" for name in sections)
+        return f"""
+Produce {len(sections)} separate analyses of the input below, one per section.
+
+Sections:
+{briefs}
+
+Input:
+\"\"\"{shared_input}\"\"\"
+
+Answer with exactly these section headers, each on its own line and in this order, and nothing before the first header:
+{headers}
+"""
+
+    async def complete(self, shared_input: str, sections: Dict[str, str], system: Optional[str] = None,
+                       fallback: bool = True, **admit) -> Dict[str, str]:
+        """Return {section name: text}; with `fallback` off, sections the batch did not produce are absent.
+
+        `admit` (priority, session_id) is passed on to every ASI1 call.
+        """
+        self.batches += 1
+        self.sections += len(sections)
+        try:
+            reply = await self.client.complete(self.prompt(shared_input, sections), system=system, **admit)
+            results = split_sections(reply, sections)
+        except ASI1Error:
+            results = {}
+
+        missing = [name for name in sections if name not in results]
+        self.fallbacks += len(missing)
+        if missing and fallback:
+            answers = await asyncio.gather(*[
+                self.client.complete(f"{sections[name]}\n\nInput:\n\"\"\"{shared_input}\"\"\"", system=system, **admit)
+                for name in missing
+            ], return_exceptions=True)
+            for name, answer in zip(missing, answers):
+                results[name] = answer if isinstance(answer, str) else f"ASI1 call failed: {answer}"
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "sections": self.sections,
+            "fallbacks": self.fallbacks,
+            "calls_saved": self.sections - self.batches - self.fallbacks
+        }
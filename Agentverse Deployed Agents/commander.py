@@ -0,0 +1,263 @@
+from uagents import Agent, Context, Model
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+import re
+from asi1client import ASI1Client, ASI1Error, close_pool
+from completioncache import CompletionCache
+from streaming import StreamRelay
+from sessions import new_request_id
+from fanin import ScatterGather
+from router import KeywordRouter
+from hops import HopGuard
+from scheduler import priority_for
+from tracing import Tracer
+import tracing
+from metrics import AgentMetrics
+from answercache import AnswerCache
+import answercache
+from batching import SectionBatch
+
+# ASI1 client for the final synthesis (reads ASI1_API_KEY from the environment)
+asi1 = ASI1Client(temperature=0.5, cache=CompletionCache(ttl=3600))
+
+# Specialist agents
+SUBAGENTS = {
+    "agent1qvpk7cwgjfdtzfsxv092gcdu0sdsu43z6p0z8nrfckxmcmzd532dgxuy0x5": "Resume Expert",
+    "agent1qgys89d7tr5rxxamvdhkdg80z9q99jf7sfq08kx0yftt59yjggpsk4ewgm4": "Skill Assessment",
+    "agent1qfvyd3y9qf9cmsl2waatsdchumu8gjj2fl6ynuzy0mlqcjwpge6ekp74qen": "Demand Analysis",
+    "agent1qvfed9rmxdz4j488gqvannjs6fatpl3u0ehk2kelez6pz8tr2u8nyxjg5kc": "Training Resource",
+    "agent1qv4xn6kxtylzyvf5zc4ywx4qcq2g3q6cp2mpvz8twkwmtnm27gl6xp9x7av": "Job Matching"
+}
+
+# Keyword routing of each sentence of the query to a specialist
+router = KeywordRouter.for_agent("Commander")
+DEFAULT_AGENT = "Skill Assessment"
+
+# Hop budget and cycle check for dispatched sub-tasks
+hop_guard = HopGuard()
+
+# Per-agent reply deadlines (seconds); agents that scrape or search get longer
+AGENT_TIMEOUTS = {
+    "Resume Expert": 30.0,
+    "Skill Assessment": 30.0,
+    "Demand Analysis": 30.0,
+    "Training Resource": 45.0,
+    "Job Matching": 45.0
+}
+
+# Maximum sub-task sends in progress across all queries; a slot is freed once the message is out,
+# so a slow specialist never holds up other queries' dispatches
+MAX_PARALLEL = int(os.getenv("COMMANDER_MAX_PARALLEL", "10"))
+dispatch_gate = asyncio.Semaphore(MAX_PARALLEL)
+
+# Sub-agent replies awaited per request
+fanin = ScatterGather()
+
+# Optional batched mode: when two or more of these specialists are needed for
+# one query, the Commander writes their sections itself in a single ASI1 call
+# instead of dispatching to each. They need no live data, only the query.
+BATCHED_AGENTS = {name.strip() for name in os.getenv("COMMANDER_BATCH_AGENTS", "").split(",") if name.strip()}
+SECTION_BRIEFS = {
+    "Resume Expert": "Review the user's resume or profile: key strengths, weak areas and specific, actionable improvements.",
+    "Skill Assessment": "Evaluate the user's skills: structured strengths and weaknesses, gaps against industry needs, and how to close them.",
+    "Demand Analysis": "Analyze market demand for the roles or skills mentioned: current demand, top 5 in-demand skills, 2–5 year growth outlook and the industries driving it."
+}
+batch = SectionBatch(asi1)
+
+# Spans for every step of a query (written to TRACE_FILE when set)
+tracer = Tracer("Commander")
+
+# Prometheus metrics (served on METRICS_PORT or written to METRICS_FILE when set)
+metrics = AgentMetrics("Commander")
+
+# Agent init
+commander = Agent(name="commander", seed="commander_secret_seed", handle_messages_concurrently=True)
+
+# Models
+class TaskRequest(Model):
+    query: str
+    stream: bool = False
+    request_id: Optional[str] = None
+    hops: int = 0
+    visited: List[str] = []
+    trace: Optional[str] = None
+
+class TaskResponse(Model):
+    result: str
+    request_id: Optional[str] = None
+    trace: Optional[str] = None
+
+class TaskResponseChunk(Model):
+    result: str
+    seq: int
+    final: bool = False
+    request_id: Optional[str] = None
+
+# Recent final answers, served again to near-identical queries
+answers = AnswerCache(TaskResponse, TaskResponseChunk)
+
+
+def split_tasks(query: str) -> Dict[str, str]:
+    """Split a compound query into one sub-task per specialist, keyed by agent address."""
+    sentences = [s.strip() for s in re.split(r"(?<=[.?!])\s+", query) if s.strip()]
+    picked: Dict[str, List[str]] = {}
+    for sentence in sentences:
+        for name in router.route(sentence):
+            picked.setdefault(name, []).append(sentence)
+
+    if not picked:
+        picked[DEFAULT_AGENT] = sentences or [query]
+
+    tasks = {}
+    for address, name in SUBAGENTS.items():
+        if name not in picked:
+            continue
+        parts = picked[name]
+        # Later sentences often refer back to the first ("those roles"), so keep it as context
+        if sentences and parts[0] != sentences[0]:
+            parts = [f"Context: {sentences[0]}"] + parts
+        tasks[address] = " ".join(parts)
+    return tasks
+
+
+async def run_subtask(ctx: Context, request_id: str, address: str, subquery: str,
+                      hops: int, visited: List[str]) -> List[Tuple[str, Optional[str]]]:
+    name = SUBAGENTS[address]
+    span = tracer.start("dispatch", agent=name)
+    async with dispatch_gate:
+        await ctx.send(address, TaskRequest(query=subquery, request_id=request_id, hops=hops, visited=visited,
+                                            trace=span.context))
+    span.end()  # includes any wait for a free dispatch slot
+    ctx.logger.info(f"🛰️ Dispatched to {name}: {subquery}")
+    with tracer.span("wait", kind="wait", agent=name) as span:
+        result = await fanin.wait_for(request_id, address, AGENT_TIMEOUTS.get(name, 30.0))
+        span.set(answered=result is not None)
+    if result is None:
+        ctx.logger.warning(f"⏰ {name} missed its deadline")
+        answercache.degraded("deadline")
+    return [(address, result)]
+
+
+async def run_batch(ctx: Context, request_id: str, query: str, batched: Dict[str, str],
+                    hops: int, visited: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """Answer several specialists' sub-tasks with one ASI1 call; dispatch any section it misses."""
+    names = {SUBAGENTS[address]: address for address in batched}
+    sections = {name: f"{SECTION_BRIEFS[name]} Focus on: {batched[address]}" for name, address in names.items()}
+    ctx.logger.info(f"🧩 Batching {', '.join(sections)} into one ASI1 call")
+    replies = await batch.complete(query, sections, fallback=False, priority=priority_for(hops), session_id=request_id)
+
+    results = [(names[name], reply) for name, reply in replies.items()]
+    missing = [names[name] for name in sections if name not in replies]
+    if missing:
+        ctx.logger.warning(f"⚠️ Batched reply lacked {len(missing)} section(s); asking the specialists instead")
+        for finished in asyncio.as_completed([run_subtask(ctx, request_id, a, batched[a], hops, visited) for a in missing]):
+            results += await finished
+    return results
+
+
+# Sent models are counted by name; the gauges read these at scrape time
+metrics.models(TaskRequest, TaskResponse, TaskResponseChunk)
+metrics.watch_cache("completions", asi1.cache)
+metrics.watch_cache("answers", answers)
+metrics.watch_fanin(fanin)
+
+@commander.on_message(model=TaskRequest)
+@tracer.handler
+@metrics.handler
+@answers.handler
+async def handle_query(ctx: Context, sender: str, msg: TaskRequest):
+    ctx.logger.info(f"📩 Commander received query: {msg.query}")
+
+    request_id = new_request_id()
+    hops, visited = hop_guard.next_hop(ctx.agent.address, msg.hops, msg.visited)
+    tasks = split_tasks(msg.query)
+    allowed = hop_guard.allowed(ctx, tasks, hops, visited, SUBAGENTS)
+    tasks = {address: tasks[address] for address in allowed}
+    fanin.expect(request_id, tasks)
+    tracing.current().set(query=msg.query[:200], fan_out=len(tasks))
+    metrics.fan_out(len(tasks))
+
+    batched = {a: q for a, q in tasks.items() if SUBAGENTS[a] in BATCHED_AGENTS and SUBAGENTS[a] in SECTION_BRIEFS}
+    if len(batched) < 2:
+        batched = {}
+    jobs = [run_subtask(ctx, request_id, a, q, hops, visited) for a, q in tasks.items() if a not in batched]
+    if batched:
+        jobs.append(run_batch(ctx, request_id, msg.query, batched, hops, visited))
+
+    relay = StreamRelay(ctx, sender, TaskResponseChunk, request_id=msg.request_id) if msg.stream else None
+    results: Dict[str, str] = {}
+    try:
+        # Every specialist runs in parallel; each result is relayed the moment it lands
+        for finished in asyncio.as_completed(jobs):
+            for address, result in await finished:
+                if result is None:
+                    continue
+                results[address] = result
+                if relay:
+                    await relay.send(f"### {SUBAGENTS[address]}\n{result.strip()}\n\n")
+    finally:
+        fanin.discard(request_id)
+
+    if not results:
+        final = "None of the specialist agents answered in time. Please try again shortly."
+        if relay:
+            await relay.send(final)
+    elif len(results) == 1:
+        # A single specialist's answer needs no merging
+        final = next(iter(results.values()))
+    else:
+        final = await synthesize(msg.query, results, relay, priority_for(msg.hops), msg.request_id)
+
+    with tracer.span("reply"):
+        if relay:
+            await relay.finish()
+        else:
+            await ctx.send(sender, TaskResponse(result=final, request_id=msg.request_id, trace=tracing.context()))
+    ctx.logger.info(f"✅ Final response sent ({len(results)}/{len(tasks)} specialists answered)")
+
+
+async def synthesize(query: str, results: Dict[str, str], relay: Optional[StreamRelay],
+                     priority: int, session_id: Optional[str]) -> str:
+    sections = "\n\n".join(f"### {SUBAGENTS[a]}\n{r.strip()}" for a, r in results.items())
+    prompt = f"""
+You are CareerSaathi, a career guidance assistant.
+Merge the specialist reports below into one coherent answer to the user's request. Keep concrete details (job links, course names, skill gaps), remove repetition, and do NOT ask follow-up questions.
+
+User request: "{query}"
+
+Specialist reports:
+{sections}
+"""
+    try:
+        if relay:
+            await relay.send("### Summary\n")
+            return await relay.relay(asi1.stream(prompt, priority=priority, session_id=session_id))
+        return await asi1.complete(prompt, priority=priority, session_id=session_id)
+    except ASI1Error as e:
+        answercache.degraded("asi1")
+        # Fall back to the raw reports rather than losing them
+        if relay:
+            await relay.send(f"(Synthesis unavailable: {e})")
+        return sections
+
+
+@commander.on_message(model=TaskResponse)
+@tracer.handler
+@metrics.handler
+async def handle_subagent_response(ctx: Context, sender: str, msg: TaskResponse):
+    if fanin.resolve(msg.request_id, sender, msg.result):
+        ctx.logger.info(f"📥 Response received from {SUBAGENTS.get(sender, sender)}")
+    else:
+        ctx.logger.warning(f"⚠️ Ignoring late or unexpected response from {SUBAGENTS.get(sender, sender)}")
+
+@commander.on_event("startup")
+async def start_metrics(ctx: Context):
+    await metrics.start(ctx)
+
+@commander.on_event("shutdown")
+async def close_asi1(ctx: Context):
+    await close_pool()
+
+if __name__ == "__main__":
+    commander.run()
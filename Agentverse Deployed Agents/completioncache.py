@@ -0,0 +1,89 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# Optional on-disk tier shared by every agent on this machine
+CACHE_DB = os.getenv("ASI1_CACHE_DB")
+MAX_ENTRIES = int(os.getenv("ASI1_CACHE_MAX_ENTRIES", "512"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+class CompletionCache:
+    """Two-tier (memory LRU + optional SQLite) cache of ASI1 completions with a TTL."""
+
+    def __init__(self, ttl: float = 3600, max_entries: int = MAX_ENTRIES, path: Optional[str] = CACHE_DB):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(model: str, temperature: float, prompt: str) -> str:
+        raw = f"{model}|{temperature:.3f}|{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._memory[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[1] > now:
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                return row[0]
+            if row:
+                self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._db.commit()
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        expires = time.time() + self.ttl
+        self._remember(key, value, expires)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, expires)
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, value: str, expires: float):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._memory)
+        }
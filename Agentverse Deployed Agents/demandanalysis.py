@@ -1,11 +1,28 @@
 from uagents import Agent, Context, Model
-import os
-import requests
-from typing import Dict, Set
+from typing import Dict, List, Optional
 import asyncio
-
-# Use your ASI1 API Key here
-asi1_api_key = os.getenv("ASI1_API_KEY")
+from asi1client import ASI1Client, ASI1Error, close_pool
+from completioncache import CompletionCache
+from enrichment import Enricher
+from streaming import StreamRelay
+from sessions import new_request_id
+from fanin import ScatterGather, FANIN_DEADLINE
+from router import KeywordRouter, addresses_for
+from hops import HopGuard
+from scheduler import priority_for
+from promptbudget import InsightBudget
+from tracing import Tracer
+import tracing
+from metrics import AgentMetrics
+from answercache import AnswerCache
+import answercache
+
+# ASI1 client (reads ASI1_API_KEY from the environment)
+asi1 = ASI1Client(temperature=0.6, cache=CompletionCache(ttl=6 * 3600))  # market outlooks change slowly
+
+# Sub-agent insights are merged into the analysis once they arrive
+ROLE = "Job Market Analyst specializing in demand analysis"
+enricher = Enricher(asi1)
 
 # Sub-agent addresses
 SUBAGENTS: Dict[str, str] = {
@@ -15,77 +32,85 @@ SUBAGENTS: Dict[str, str] = {
     "agent1qv4xn6kxtylzyvf5zc4ywx4qcq2g3q6cp2mpvz8twkwmtnm27gl6xp9x7av": "Job Matching"
 }
 
+# Keyword routing to the sub-agents above
+router = KeywordRouter.for_agent("Demand Analysis")
+
+# Hop budget and cycle check for forwarded requests
+hop_guard = HopGuard()
+
+# Token budget for each sub-agent's insights in the merge prompt
+insight_budget = InsightBudget()
+
+# Sub-agent replies awaited per request
+fanin = ScatterGather()
+
+# Spans for every step of a query (written to TRACE_FILE when set)
+tracer = Tracer("Demand Analysis")
+
+# Prometheus metrics (served on METRICS_PORT or written to METRICS_FILE when set)
+metrics = AgentMetrics("Demand Analysis")
+
 # Initialize the agent
-demand_analysis = Agent(name="demand_analysis", seed="demand_analysis_secret_seed")
+demand_analysis = Agent(name="demand_analysis", seed="demand_analysis_secret_seed", handle_messages_concurrently=True)
 
 # Models
 class TaskRequest(Model):
     query: str
+    stream: bool = False
+    request_id: Optional[str] = None
+    hops: int = 0
+    visited: List[str] = []
+    trace: Optional[str] = None
 
 class TaskResponse(Model):
     result: str
+    request_id: Optional[str] = None
+    trace: Optional[str] = None
 
-class SubAgentRequest(Model):
-    query: str
-
-class SubAgentResponse(Model):
+class TaskResponseChunk(Model):
     result: str
+    seq: int
+    final: bool = False
+    request_id: Optional[str] = None
 
+# Recent final answers, served again to near-identical queries
+answers = AnswerCache(TaskResponse, TaskResponseChunk)
 
-def extract_asi1_content(response_json):
-    try:
-        return response_json["choices"][0]["message"]["content"]
-    except Exception as e:
-        return f"ASI1 LLM failed to extract result: {e}"
+
+# Sent models are counted by name; the gauges read these at scrape time
+metrics.models(TaskRequest, TaskResponse, TaskResponseChunk)
+metrics.watch_cache("completions", asi1.cache)
+metrics.watch_cache("answers", answers)
+metrics.watch_fanin(fanin)
 
 @demand_analysis.on_message(model=TaskRequest)
+@tracer.handler
+@metrics.handler
+@answers.handler
 async def handle_task(ctx: Context, sender: str, msg: TaskRequest):
     ctx.logger.info(f"📩 Received demand analysis query: {msg.query}")
 
-    keyword_map = {
-        "resume": "Resume Expert",
-        "cv": "Resume Expert",
-        "gap": "Skill Assessment",
-        "upskill": "Training Resource",
-        "learn": "Training Resource",
-        "course": "Training Resource",
-        "job": "Job Matching",
-        "vacancy": "Job Matching",
-        "hiring": "Job Matching"
-    }
-
-    found_agents: Set[str] = set()
-    for word in msg.query.lower().split():
-        if word in keyword_map:
-            found_agents.add(keyword_map[word])
-
-    subagent_responses = []
-    ctx.storage.set("subagent_names", list(found_agents))
-
-    for address, name in SUBAGENTS.items():
-        if name in found_agents:
+    found_agents = router.route(msg.query)
+
+    request_id = new_request_id()
+    hops, visited = hop_guard.next_hop(ctx.agent.address, msg.hops, msg.visited)
+    allowed = hop_guard.allowed(ctx, addresses_for(found_agents, SUBAGENTS), hops, visited, SUBAGENTS)
+    targets = {address: SUBAGENTS[address] for address in allowed}
+    fanin.expect(request_id, targets)
+    deadline = asyncio.get_running_loop().time() + FANIN_DEADLINE
+
+    metrics.fan_out(len(targets))
+    with tracer.span("fan-out", width=len(targets)) as span:
+        for address, name in targets.items():
             try:
-                await ctx.send(address, SubAgentRequest(query=msg.query))
+                await ctx.send(address, TaskRequest(query=msg.query, request_id=request_id, hops=hops, visited=visited,
+                                                    trace=span.context))
                 ctx.logger.info(f"🛰️ Sent query to sub-agent: {name}")
             except Exception as e:
                 ctx.logger.warning(f"⚠️ Failed to send message to {name}: {e}")
+                fanin.drop(request_id, address)
 
-    await asyncio.sleep(4)
-
-    messages = ctx.storage.get("__messages__") or []
-    for envelope in messages:
-        if envelope.message and hasattr(envelope.message, 'result'):
-            subagent_responses.append(envelope.message.result)
-
-    subagent_names = ctx.storage.get("subagent_names") or []
-    subagent_summary = (
-        f"Additional insights were referenced from the following sub-agents: {', '.join(subagent_names)}."
-        if subagent_names else
-        "No additional sub-agents were needed or invoked for this demand analysis."
-    )
-
-    context_appendix = "\n---\n\nSub-Agent Context:\n" + "\n\n".join(subagent_responses) if subagent_responses else ""
-
+    # Our own analysis runs while the sub-agents work; their insights are merged in afterwards
     asi1_prompt = f"""
 You are a Job Market Analyst specializing in demand analysis.
 Analyze this user query and provide the following in a concise, quantified format:
@@ -95,32 +120,71 @@ Analyze this user query and provide the following in a concise, quantified forma
 3. **Growth prediction** over the next 2–5 years.
 4. **Relevant industries or sectors** driving the demand.
 5. **Any market insights or hiring patterns** that are emerging.
-6. **{subagent_summary} Always include this statement in the response.**
 
 Query: "{msg.query}"
-{context_appendix}
 """
+    admit = dict(priority=priority_for(msg.hops), session_id=msg.request_id)
+    relay = None
+    if msg.stream:
+        relay = StreamRelay(ctx, sender, TaskResponseChunk, request_id=msg.request_id)
+        try:
+            draft = await relay.relay(asi1.stream(asi1_prompt, **admit))
+        except ASI1Error as e:
+            answercache.degraded("asi1")
+            draft = f"ASI1 request failed: {e}"
+            await relay.send(draft)
+    else:
+        try:
+            draft = await asi1.complete(asi1_prompt, **admit)
+        except ASI1Error as e:
+            answercache.degraded("asi1")
+            draft = f"ASI1 request failed: {e}"
+
+    # Continue as soon as every sub-agent has answered or what is left of the deadline passes
+    with tracer.span("wait", kind="wait") as span:
+        results, missing = await fanin.gather(request_id, max(0.0, deadline - asyncio.get_running_loop().time()))
+        span.set(missing=len(missing))
+    if missing:
+        ctx.logger.warning(f"⏰ Sub-agents missed the deadline: {', '.join(targets[a] for a in missing)}")
+        answercache.degraded("deadline")
+    insights = {targets[a]: text for a, text in insight_budget.fit(ctx, results).items()}
+
+    # The draft was written before any sub-agent replied, so this statement is added once they have
+    subagent_summary = (
+        f"Additional insights were referenced from the following sub-agents: {', '.join(insights)}."
+        if insights else
+        "No additional sub-agents were needed or invoked for this demand analysis."
+    )
 
-    headers = {
-        "Authorization": f"Bearer {asi1_api_key}",
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "model": "asi1-mini",
-        "messages": [{"role": "user", "content": asi1_prompt}],
-        "temperature": 0.6,
-        "stream": False
-    }
-
-    try:
-        response = requests.post("https://api.asi1.ai/v1/chat/completions", headers=headers, json=data)
-        result = extract_asi1_content(response.json()) if response.status_code == 200 else f"ASI1 error: {response.text}"
-    except Exception as e:
-        result = f"ASI1 request failed: {e}"
-
-    await ctx.send(sender, TaskResponse(result=result))
-    ctx.logger.info("✅ Final demand analysis response sent to Commander.")
+    if relay is not None:
+        with tracer.span("merge", insights=len(insights)):
+            await relay.relay(enricher.stream(ROLE, msg.query, draft, insights, **admit))
+        await relay.finish("\n\n" + subagent_summary)
+    else:
+        with tracer.span("merge", insights=len(insights)):
+            section = await enricher.complete(ROLE, msg.query, draft, insights, **admit)
+        with tracer.span("reply"):
+            await ctx.send(sender, TaskResponse(result=draft.strip() + section + "\n\n" + subagent_summary,
+                                                request_id=msg.request_id,
+                                                trace=tracing.context()))
+    ctx.logger.info(f"✅ Final demand analysis response sent to Commander ({len(insights)} sub-agent insight(s) merged).")
+
+@demand_analysis.on_message(model=TaskResponse)
+@tracer.handler
+@metrics.handler
+async def handle_subagent_response(ctx: Context, sender: str, msg: TaskResponse):
+    if fanin.resolve(msg.request_id, sender, msg.result):
+        ctx.logger.info(f"📥 Sub-agent response received from {SUBAGENTS.get(sender, sender)}")
+    else:
+        ctx.logger.warning(f"⚠️ Ignoring late or unexpected response from {SUBAGENTS.get(sender, sender)}")
+
+@demand_analysis.on_event("startup")
+async def start_metrics(ctx: Context):
+    await metrics.start(ctx)
+
+@demand_analysis.on_event("shutdown")
+async def close_asi1(ctx: Context):
+    await close_pool()
 
 if __name__ == "__main__":
     demand_analysis.run()
@@ -0,0 +1,79 @@
+import os
+from typing import AsyncIterator, Dict
+
+from asi1client import ASI1Client, ASI1Error
+import answercache
+
+# Length cap for the merge step's output; it only adds to an analysis already written
+MERGE_MAX_WORDS = int(os.getenv("MERGE_MAX_WORDS", "150"))
+
+
+class Enricher:
+    """Merges sub-agent insights into an analysis that was written without waiting for them.
+
+    An agent starts its own analysis (the draft) as soon as it has sent its
+    fan-out, so the two run side by side. Once the insights are in or their
+    deadline has passed, `complete()` / `stream()` write a short section
+    that adds what the insights change, to be appended to the draft. With no
+    insights in time there is nothing to merge, so no call is made. If the
+    merge call fails, the draft is sent on its own.
+    """
+
+    def __init__(self, client: ASI1Client):
+        self.client = client
+        self.merged = 0
+        self.skipped = 0
+        self.failed = 0
+
+    @staticmethod
+    def prompt(role: str, query: str, draft: str, insights: Dict[str, str]) -> str:
+        notes = "\n\n".join(f"From {name}:\n{text.strip()}" for name, text in insights.items())
+        return f"""
+You are a {role}. You already answered the user's query (your analysis is below) before other specialist agents replied.
+Write a short section titled "🔍 Additional Agent Insights", at most {MERGE_MAX_WORDS} words, with only what their insights add to or change in your analysis, naming the agent each point comes from.
+Do not repeat your analysis and do NOT ask follow-up questions.
+
+Query: "{query}"
+
+Your analysis:
+{draft.strip()}
+
+Insights from other agents:
+{notes}
+"""
+
+    async def complete(self, role: str, query: str, draft: str, insights: Dict[str, str], **admit) -> str:
+        """The section to append to `draft`, or "" when there is nothing to merge or the merge fails."""
+        if not insights:
+            self.skipped += 1
+            return ""
+        try:
+            section = await self.client.complete(self.prompt(role, query, draft, insights), **admit)
+        except ASI1Error:
+            self.failed += 1
+            answercache.degraded("merge")
+            return ""
+        self.merged += 1
+        return "\n\n" + section.strip()
+
+    async def stream(self, role: str, query: str, draft: str, insights: Dict[str, str],
+                     **admit) -> AsyncIterator[str]:
+        """Like `complete()`, as deltas; stops quietly if the merge fails."""
+        if not insights:
+            self.skipped += 1
+            return
+        started = False
+        try:
+            async for delta in self.client.stream(self.prompt(role, query, draft, insights), **admit):
+                if not started:
+                    started = True
+                    yield "\n\n"
+                yield delta
+        except ASI1Error:
+            self.failed += 1
+            answercache.degraded("merge")
+            return
+        self.merged += 1
+
+    def stats(self) -> dict:
+        return {"merged": self.merged, "skipped": self.skipped, "failed": self.failed}
@@ -0,0 +1,84 @@
+import asyncio
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Default time to wait for sub-agent replies before answering without them
+FANIN_DEADLINE = float(os.getenv("FANIN_DEADLINE", "8"))
+
+
+class ScatterGather:
+    """Tracks the sub-agent replies each request is waiting for.
+
+    Register the expected senders with `expect()` before sending, feed every
+    incoming reply to `resolve()`, and `await gather()` to get the replies once
+    all are in or the deadline passes, whichever comes first.
+    """
+
+    def __init__(self):
+        self._waits: Dict[str, Dict[str, asyncio.Future]] = {}
+        self.late = 0
+
+    def expect(self, request_id: str, senders: Iterable[str]):
+        loop = asyncio.get_running_loop()
+        waits = self._waits.setdefault(request_id, {})
+        for sender in senders:
+            waits.setdefault(sender, loop.create_future())
+
+    def drop(self, request_id: str, sender: str):
+        """Stop waiting for `sender`, e.g. because the request could not be sent."""
+        future = self._waits.get(request_id, {}).pop(sender, None)
+        if future is not None:
+            future.cancel()
+
+    def resolve(self, request_id: Optional[str], sender: str, result: str) -> bool:
+        """Record a reply. Returns False if nobody is waiting for it (unknown or late)."""
+        future = self._waits.get(request_id, {}).get(sender)
+        if future is None or future.done():
+            self.late += 1
+            return False
+        future.set_result(result)
+        return True
+
+    async def wait_for(self, request_id: str, sender: str, timeout: float = FANIN_DEADLINE) -> Optional[str]:
+        """Wait for one sender's reply; None if it is not expected or misses the deadline."""
+        future = self._waits.get(request_id, {}).get(sender)
+        if future is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.CancelledError:
+            if future.cancelled():
+                return None
+            raise
+
+    def discard(self, request_id: str):
+        for future in self._waits.pop(request_id, {}).values():
+            future.cancel()
+
+    def pending(self, request_id: str) -> List[str]:
+        return [s for s, f in self._waits.get(request_id, {}).items() if not f.done()]
+
+    async def gather(self, request_id: str, timeout: float = FANIN_DEADLINE) -> Tuple[Dict[str, str], List[str]]:
+        """Wait for the expected replies; return (results by sender, senders that missed the deadline)."""
+        waits = self._waits.get(request_id, {})
+        if waits:
+            await asyncio.wait(list(waits.values()), timeout=timeout)
+        waits = self._waits.pop(request_id, {})
+
+        results = {}
+        missing = []
+        for sender, future in waits.items():
+            if future.done() and not future.cancelled():
+                results[sender] = future.result()
+            else:
+                future.cancel()
+                missing.append(sender)
+        return results, missing
+
+    def stats(self) -> dict:
+        return {"pending": len(self._waits), "late": self.late}
+
+    def __len__(self) -> int:
+        return len(self._waits)
@@ -0,0 +1,46 @@
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Longest chain of agent-to-agent forwards a request may travel
+MAX_HOPS = int(os.getenv("MAX_HOPS", "2"))
+
+
+class HopGuard:
+    """Keeps fan-out between agents from looping or multiplying.
+
+    Every TaskRequest carries `hops` (forwards so far) and `visited` (addresses
+    already on the chain). Before forwarding, an agent extends the chain with
+    `next_hop()` and passes its targets through `allowed()`, which drops any
+    target already on the chain or beyond `max_hops`, and counts them.
+    """
+
+    def __init__(self, max_hops: int = MAX_HOPS):
+        self.max_hops = max_hops
+        self.suppressed = {"depth": 0, "cycle": 0}
+
+    @staticmethod
+    def next_hop(own_address: str, hops: int, visited: Iterable[str]) -> Tuple[int, List[str]]:
+        """Hop count and visited list to put on requests this agent forwards."""
+        chain = list(visited)
+        if own_address not in chain:
+            chain.append(own_address)
+        return hops + 1, chain
+
+    def allowed(self, ctx, targets: Iterable[str], hops: int, visited: List[str],
+                names: Optional[Dict[str, str]] = None) -> List[str]:
+        passed = []
+        for address in targets:
+            if address in visited:
+                reason = "cycle"
+            elif hops > self.max_hops:
+                reason = "depth"
+            else:
+                passed.append(address)
+                continue
+            self.suppressed[reason] += 1
+            name = (names or {}).get(address, address)
+            ctx.logger.info(f"🛑 Not forwarding to {name} ({reason}, hop {hops}/{self.max_hops})")
+        return passed
+
+    def stats(self) -> dict:
+        return dict(self.suppressed, total=sum(self.suppressed.values()))
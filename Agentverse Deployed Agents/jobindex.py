@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import time
+from typing import Iterable, List, Optional
+
+from listings import JobListing, MAX_LISTINGS
+from router import tokenize, words
+
+# Optional on-disk index shared by every Job Matching process on this machine
+INDEX_DB = os.getenv("JOB_INDEX_DB")
+# Listings last seen longer ago than this no longer count as fresh matches
+FRESH_FOR = float(os.getenv("JOB_INDEX_FRESH_SECONDS", str(6 * 3600)))
+# Postings older than this (or not seen in a scrape for as long) are deleted
+MAX_AGE = float(os.getenv("JOB_INDEX_MAX_AGE_SECONDS", str(30 * 86400)))
+# Fresh, well-matching listings needed to answer without scraping again
+MIN_MATCHES = int(os.getenv("JOB_INDEX_MIN_MATCHES", "5"))
+
+# Words that say "find me jobs" rather than which ones
+_FILLER = frozenset(tokenize(
+    "a an and any are as at be can do find for from get give i in is it job jobs latest let list me "
+    "my near new of on or please position positions recent role roles show some the those to vacancy "
+    "vacancies what which with opening openings hiring also if know need recommend course courses "
+    "resume skill skills skillset competitive"
+))
+# Title words shared by too many roles to tell them apart
+_GENERIC_TITLE = frozenset(tokenize("senior junior lead associate trainee intern fresher sr jr i ii iii"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE,
+    title TEXT, company TEXT, location TEXT, salary TEXT, url TEXT,
+    posted_at REAL, first_seen REAL, last_seen REAL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+    title, company, location, content='jobs', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS jobs_ai AFTER INSERT ON jobs BEGIN
+    INSERT INTO jobs_fts(rowid, title, company, location) VALUES (new.id, new.title, new.company, new.location);
+END;
+CREATE TRIGGER IF NOT EXISTS jobs_ad AFTER DELETE ON jobs BEGIN
+    INSERT INTO jobs_fts(jobs_fts, rowid, title, company, location)
+    VALUES ('delete', old.id, old.title, old.company, old.location);
+END;
+CREATE TRIGGER IF NOT EXISTS jobs_au AFTER UPDATE ON jobs BEGIN
+    INSERT INTO jobs_fts(jobs_fts, rowid, title, company, location)
+    VALUES ('delete', old.id, old.title, old.company, old.location);
+    INSERT INTO jobs_fts(rowid, title, company, location) VALUES (new.id, new.title, new.company, new.location);
+END;
+CREATE INDEX IF NOT EXISTS jobs_last_seen ON jobs(last_seen);
+"""
+
+
+def _match_any(terms: Iterable[str], column: str) -> str:
+    return f"{column} : (" + " OR ".join(f'"{term}"' for term in terms) + ")"
+
+
+class JobIndex:
+    """Full-text (SQLite FTS5) index of every listing Job Matching has scraped.
+
+    `upsert()` adds or refreshes listings by their Indeed job key, `search()`
+    ranks stored listings against a query with BM25 (title weighted highest),
+    and `expire()` deletes postings older than `max_age`. Memory-only unless
+    JOB_INDEX_DB names a file.
+    """
+
+    def __init__(self, path: Optional[str] = INDEX_DB, fresh_for: float = FRESH_FOR,
+                 max_age: float = MAX_AGE, min_matches: int = MIN_MATCHES):
+        self.fresh_for = fresh_for
+        self.max_age = max_age
+        self.min_matches = min_matches
+        self.searches = 0
+        self.answered = 0
+        self._db = sqlite3.connect(path or ":memory:")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def upsert(self, listings: Iterable[JobListing], now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        rows = []
+        for listing in listings:
+            age = listing.age_days
+            posted_at = now - age * 86400 if age is not None else None
+            rows.append((listing.key, listing.title, listing.company, listing.location, listing.salary,
+                         listing.url, posted_at, now, now))
+        self._db.executemany(
+            """
+            INSERT INTO jobs (key, title, company, location, salary, url, posted_at, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                title = excluded.title,
+                company = COALESCE(NULLIF(excluded.company, ''), company),
+                location = COALESCE(NULLIF(excluded.location, ''), location),
+                salary = COALESCE(NULLIF(excluded.salary, ''), salary),
+                url = COALESCE(NULLIF(excluded.url, ''), url),
+                posted_at = COALESCE(posted_at, excluded.posted_at),
+                last_seen = excluded.last_seen
+            """,
+            rows
+        )
+        self._db.commit()
+        return len(rows)
+
+    def search(self, query: str, limit: int = MAX_LISTINGS, fresh_only: bool = False) -> List[JobListing]:
+        """Stored listings whose title matches the query, best BM25 match first."""
+        terms = self._terms(query)
+        if not terms:
+            return []
+        where = "jobs_fts MATCH ?"
+        params: list = [_match_any(terms, "title")]
+        if fresh_only:
+            where += " AND jobs.last_seen >= ?"
+            params.append(time.time() - self.fresh_for)
+        rows = self._db.execute(
+            f"""
+            SELECT jobs.title, jobs.company, jobs.location, jobs.salary, jobs.url, jobs.posted_at,
+                   bm25(jobs_fts, 10.0, 1.0, 4.0)
+            FROM jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid
+            WHERE {where}
+            ORDER BY bm25(jobs_fts, 10.0, 1.0, 4.0)
+            LIMIT ?
+            """,
+            params + [limit]
+        ).fetchall()
+        now = time.time()
+        return [
+            JobListing(title=title, company=company, location=location, salary=salary, url=url,
+                       posted=self._posted(now, posted_at), score=-rank)
+            for title, company, location, salary, url, posted_at, rank in rows
+        ]
+
+    def fresh_matches(self, query: str, limit: int = MAX_LISTINGS) -> List[JobListing]:
+        """Fresh listings that cover every role and place word of the query.
+
+        Returns an empty list unless there are at least `min_matches` of them,
+        i.e. whenever the caller should scrape again.
+        """
+        self.searches += 1
+        wanted = {tokenize(term)[0] for term in self._terms(query)}
+        matches = []
+        for listing in self.search(query, limit=limit * 4, fresh_only=True):
+            title = set(tokenize(listing.title)) - _GENERIC_TITLE
+            if not title or len(title & wanted) / len(title) < 0.6:
+                continue
+            if not wanted <= set(tokenize(f"{listing.title} {listing.company} {listing.location}")) | _GENERIC_TITLE:
+                continue
+            matches.append(listing)
+        if len(matches) < self.min_matches:
+            return []
+        self.answered += 1
+        return matches[:limit]
+
+    @staticmethod
+    def _terms(query: str) -> List[str]:
+        return [w for w in dict.fromkeys(words(query)) if w.isalnum() and tokenize(w)[0] not in _FILLER]
+
+    def expire(self, now: Optional[float] = None) -> int:
+        cutoff = (time.time() if now is None else now) - self.max_age
+        deleted = self._db.execute(
+            "DELETE FROM jobs WHERE last_seen < ? OR posted_at < ?", (cutoff, cutoff)
+        ).rowcount
+        self._db.commit()
+        return deleted
+
+    @staticmethod
+    def _posted(now: float, posted_at: Optional[float]) -> str:
+        if posted_at is None:
+            return ""
+        days = int((now - posted_at) // 86400)
+        return f"Posted {days} days ago" if days else "Posted today"
+
+    def stats(self) -> dict:
+        (entries,) = self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        return {
+            "entries": entries,
+            "searches": self.searches,
+            "answered_locally": self.answered,
+            "hit_rate": self.answered / self.searches if self.searches else 0.0
+        }
+
+    def __len__(self) -> int:
+        return self.stats()["entries"]
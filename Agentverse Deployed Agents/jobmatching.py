@@ -1,12 +1,30 @@
 from uagents import Agent, Context, Model
-import os
-import requests
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from urllib.parse import quote_plus
-import json
+from collections import OrderedDict
+import asyncio
+import time
+from asi1client import ASI1Client, ASI1Error, close_pool
+from completioncache import CompletionCache
+from streaming import StreamRelay
+from sessions import SessionStore
+from router import KeywordRouter, addresses_for
+from hops import HopGuard
+from scheduler import priority_for
+from promptbudget import InsightBudget
+from tracing import Tracer
+import tracing
+from metrics import AgentMetrics
+from answercache import AnswerCache
+import answercache
+from listings import FALLBACK_CHARS, JobListing, format_listings, parse_listings
+from jobranking import rank_for_profile
+from jobindex import JobIndex
+from fanin import ScatterGather, FANIN_DEADLINE
+from toolcache import ToolCache, normalize_url
 
-# ASI1 API Key
-asi1_api_key = os.getenv("ASI1_API_KEY")
+# ASI1 client (reads ASI1_API_KEY from the environment)
+asi1 = ASI1Client(temperature=0.6, cache=CompletionCache(ttl=15 * 60))  # listings go stale quickly
 
 # Scraper + Sub-agents
 SCRAPER_AGENT_ADDRESS = "agent1qwnjmzwwdq9rjs30y3qw988htrvte6lk2xaak9xg4kz0fsdz0t9ws4mwsgs"
@@ -17,28 +35,94 @@ SUBAGENTS = {
     "agent1qvfed9rmxdz4j488gqvannjs6fatpl3u0ehk2kelez6pz8tr2u8nyxjg5kc": "Training Resource"
 }
 
-# Keyword mapping for triggering subagents
-KEYWORD_MAP = {
-    "resume": "Resume Expert",
-    "cv": "Resume Expert",
-    "skills": "Skill Assessment",
-    "qualification": "Skill Assessment",
-    "trend": "Demand Analysis",
-    "market": "Demand Analysis",
-    "course": "Training Resource",
-    "certification": "Training Resource",
-    "training": "Training Resource"
-}
+# Sub-agents whose answers describe the user's profile, used to rank listings
+PROFILE_AGENTS = {"Resume Expert", "Skill Assessment"}
+
+# Keyword routing for triggering subagents
+router = KeywordRouter.for_agent("Job Matching")
+
+# Hop budget and cycle check for forwarded requests
+hop_guard = HopGuard()
+
+# Sub-agent insights share the prompt with the job listings, so keep them short
+insight_budget = InsightBudget(tokens=200)
+
+# Every listing scraped so far; queries it already answers well skip the scraper
+job_index = JobIndex()
+
+# Scraped search pages by normalized URL; a stale page is still served while it is re-scraped
+scraper_cache = ToolCache(fresh_for=15 * 60, stale_for=45 * 60, normalize=normalize_url)
+
+# In-flight requests, keyed by request ID. The scraper's reply carries neither
+# the request ID nor the URL, so at most one scrape per URL is in flight and a
+# reply answers the oldest one: scrapes_in_flight maps URL -> (round-trip span,
+# sent at) in send order, and awaiting_scraper the request IDs waiting on each URL.
+sessions = SessionStore()
+scrapes_in_flight: "OrderedDict[str, Tuple[tracing.Span, float]]" = OrderedDict()
+awaiting_scraper: Dict[str, List[str]] = {}
+
+def next_scrape():
+    """(URL, live request IDs waiting on it, round-trip span) of the oldest scrape in flight."""
+    if not scrapes_in_flight:
+        return None, [], None
+    url, (round_trip, _) = scrapes_in_flight.popitem(last=False)
+    waiting = awaiting_scraper.pop(url, [])
+    return url, [request_id for request_id in waiting if sessions.get(request_id) is not None], round_trip
+
+def prune_scrapes():
+    """Give up on scrapes unanswered for longer than a session lives, and forget expired requests."""
+    now = time.monotonic()
+    while scrapes_in_flight:
+        url, (round_trip, sent) = next(iter(scrapes_in_flight.items()))
+        if now - sent < sessions.ttl:
+            break
+        del scrapes_in_flight[url]
+        for request_id in awaiting_scraper.pop(url, []):
+            fanin.discard(request_id)
+        round_trip.end(expired=True)
+    for url, waiting in awaiting_scraper.items():
+        for request_id in [r for r in waiting if sessions.get(r) is None]:
+            waiting.remove(request_id)
+            fanin.discard(request_id)
+
+async def scrape(ctx: Context, url: str, **attrs):
+    """Ask the scraper for `url`, unless a scrape of it is already in flight."""
+    if url in scrapes_in_flight:
+        return
+    scrapes_in_flight[url] = (tracer.start("scraper", url=url, **attrs), time.monotonic())
+    await ctx.send(SCRAPER_AGENT_ADDRESS, WebsiteScraperRequest(url=url))
+
+# Sub-agent replies, awaited until FANIN_DEADLINE after the fan-out whichever way the listings come
+fanin = ScatterGather()
+
+# Spans for every step of a query (written to TRACE_FILE when set)
+tracer = Tracer("Job Matching")
+
+# Prometheus metrics (served on METRICS_PORT or written to METRICS_FILE when set)
+metrics = AgentMetrics("Job Matching")
 
 # Agent init
-job_matching = Agent(name="job_matching", seed="job_matching_secret_seed")
+job_matching = Agent(name="job_matching", seed="job_matching_secret_seed", handle_messages_concurrently=True)
 
 # Models
 class TaskRequest(Model):
     query: str
+    stream: bool = False
+    request_id: Optional[str] = None
+    hops: int = 0
+    visited: List[str] = []
+    trace: Optional[str] = None
 
 class TaskResponse(Model):
     result: str
+    request_id: Optional[str] = None
+    trace: Optional[str] = None
+
+class TaskResponseChunk(Model):
+    result: str
+    seq: int
+    final: bool = False
+    request_id: Optional[str] = None
 
 class WebsiteScraperRequest(Model):
     url: str
@@ -46,70 +130,134 @@ class WebsiteScraperRequest(Model):
 class WebsiteScraperResponse(Model):
     text: str
 
+# Recent final answers, served again to near-identical queries
+answers = AnswerCache(TaskResponse, TaskResponseChunk)
+
 # ASI1 helper
-async def call_asi1(prompt: str) -> str:
-    headers = {
-        "Authorization": f"Bearer {asi1_api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "asi1-mini",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.6,
-        "stream": False
-    }
+async def call_asi1(prompt: str, fallback: Optional[str] = None, **admit) -> str:
     try:
-        response = requests.post("https://api.asi1.ai/v1/chat/completions", headers=headers, json=data)
-        if response.status_code == 200:
-            return response.json()["choices"][0]["message"]["content"]
-        else:
-            return f"ASI1 Error: {response.text}"
-    except Exception as e:
-        return f"ASI1 call failed: {str(e)}"
+        return await asi1.complete(prompt, **admit)
+    except ASI1Error as e:
+        answercache.degraded("asi1")
+        return fallback if fallback is not None else f"ASI1 call failed: {str(e)}"
+
+# Sent models are counted by name; the gauges read these at scrape time
+metrics.models(TaskRequest, TaskResponse, TaskResponseChunk, WebsiteScraperRequest)
+metrics.watch_cache("completions", asi1.cache)
+metrics.watch_cache("answers", answers)
+metrics.watch_fanin(fanin)
+metrics.watch_sessions(sessions)
+metrics.watch_cache("scraper", scraper_cache)
+metrics.watch_cache("job_index", job_index)
 
 # Incoming user query
 @job_matching.on_message(model=TaskRequest)
+@tracer.handler
+@metrics.handler
+@answers.handler
 async def handle_query(ctx: Context, sender: str, msg: TaskRequest):
     ctx.logger.info(f"📩 Received query: {msg.query}")
 
-    ctx.storage.set("query", msg.query)
-    ctx.storage.set("sender", sender)
-    ctx.storage.set("subagent_results", json.dumps({}))
+    request_id, session = sessions.open(
+        query=msg.query,
+        sender=sender,
+        reply_id=msg.request_id,
+        stream=msg.stream,
+        priority=priority_for(msg.hops),
+        hops=msg.hops
+    )
 
     # Determine subagents
-    triggered = set()
-    for word in msg.query.lower().split():
-        if word in KEYWORD_MAP:
-            agent_name = KEYWORD_MAP[word]
-            for address, name in SUBAGENTS.items():
-                if name == agent_name:
-                    triggered.add(address)
-
-    for agent_addr in triggered:
-        ctx.logger.info(f"🔄 Forwarded to sub-agent: {agent_addr}")
-        await ctx.send(agent_addr, TaskRequest(query=msg.query))
-
-    # Scraper fetch
+    hops, visited = hop_guard.next_hop(ctx.agent.address, msg.hops, msg.visited)
+    triggered = hop_guard.allowed(ctx, addresses_for(router.route(msg.query), SUBAGENTS), hops, visited, SUBAGENTS)
+
     encoded_query = quote_plus(msg.query)
     indeed_url = f"https://in.indeed.com/jobs?q={encoded_query}&start=0"
-    await ctx.send(SCRAPER_AGENT_ADDRESS, WebsiteScraperRequest(url=indeed_url))
+    indexed = job_index.fresh_matches(msg.query)
+    page, refresh = (None, False) if indexed else scraper_cache.lookup(indeed_url)
+    answer_locally = bool(indexed) or page is not None
+    fanin.expect(request_id, triggered)
+    session["deadline"] = asyncio.get_running_loop().time() + FANIN_DEADLINE
+
+    metrics.fan_out(len(triggered))
+    with tracer.span("fan-out", width=len(triggered)) as span:
+        for agent_addr in triggered:
+            ctx.logger.info(f"🔄 Forwarded to sub-agent: {agent_addr}")
+            await ctx.send(agent_addr, TaskRequest(query=msg.query, request_id=request_id, hops=hops, visited=visited,
+                                                   trace=span.context))
+
+    if not answer_locally:
+        # Scraper fetch
+        awaiting_scraper.setdefault(indeed_url, []).append(request_id)
+        await scrape(ctx, indeed_url)
+        return
+
+    if indexed:
+        ctx.logger.info(f"🗂️ {len(indexed)} fresh matching listings found in the local job index")
+    else:
+        ctx.logger.info(f"🗂️ Scraped listings served from cache{' (stale, refreshing)' if refresh else ''}")
+    if refresh:
+        await scrape(ctx, indeed_url, refresh=True)
+    await answer_with_listings(ctx, request_id, page)
 
 # Handle sub-agent responses
 @job_matching.on_message(model=TaskResponse)
+@tracer.handler
+@metrics.handler
 async def collect_subagent_response(ctx: Context, sender: str, msg: TaskResponse):
-    results = json.loads(ctx.storage.get("subagent_results") or "{}")
-    results[sender] = msg.result
-    ctx.storage.set("subagent_results", json.dumps(results))
+    if fanin.resolve(msg.request_id, sender, msg.result):
+        ctx.logger.info(f"📥 Sub-agent response received from {SUBAGENTS.get(sender, sender)}")
+    else:
+        ctx.logger.warning(f"⚠️ Ignoring late or unexpected response from {SUBAGENTS.get(sender, sender)}")
 
 # Handle scraper response
 @job_matching.on_message(model=WebsiteScraperResponse)
+@metrics.handler
 async def handle_scraper(ctx: Context, sender: str, msg: WebsiteScraperResponse):
     ctx.logger.info("🔍 Scraper content received.")
 
-    query = ctx.storage.get("query")
-    sender_address = ctx.storage.get("sender")
-    scraper_text = msg.text[:2000]
-    subagent_results = json.loads(ctx.storage.get("subagent_results") or "{}")
+    url, request_ids, round_trip = next_scrape()
+    if url is None:
+        ctx.logger.warning("⚠️ Scraper content arrived with no scrape in flight")
+        return
+    # The scraper's models carry no trace context, so the round trip is timed here
+    round_trip.end(chars=len(msg.text), requests=len(request_ids))
+    with tracer.span("handle WebsiteScraperResponse", round_trip.context):
+        found = parse_listings(msg.text)
+        job_index.upsert(found)
+        scraper_cache.set(url, msg.text)
+        await asyncio.gather(*(answer_with_listings(ctx, request_id, msg.text, found) for request_id in request_ids))
+
+async def answer_with_listings(ctx: Context, request_id: str, page: Optional[str] = None,
+                               found: Optional[List[JobListing]] = None):
+    session = sessions.get(request_id)
+    if session is None:
+        ctx.logger.warning("⚠️ Scraper content arrived for an unknown or expired request")
+        fanin.discard(request_id)
+        return
+    sessions.close(request_id)
+
+    # Sub-agents still get whatever is left of the deadline set at the fan-out
+    with tracer.span("wait", kind="wait") as span:
+        results, missing = await fanin.gather(request_id,
+                                              max(0.0, session["deadline"] - asyncio.get_running_loop().time()))
+        span.set(missing=len(missing))
+    if missing:
+        ctx.logger.warning(f"⏰ Sub-agents missed the deadline: {', '.join(SUBAGENTS.get(a, a) for a in missing)}")
+
+    query = session["query"]
+    sender_address = session["sender"]
+    if found is None:
+        found = parse_listings(page) if page else []
+    # Listings from earlier scrapes compete with this page's for the top spots
+    candidates = {listing.key: listing for listing in job_index.search(query)}
+    candidates.update((listing.key, listing) for listing in found)
+    # Rank locally against the query and whatever resume / skill insights are in, so ASI1 only sees the top few
+    profile = "\n".join(content for agent_addr, content in results.items()
+                        if SUBAGENTS.get(agent_addr) in PROFILE_AGENTS)
+    top = rank_for_profile(candidates.values(), query, profile)
+    job_listings = format_listings(top) or (page or "")[:FALLBACK_CHARS]
+    subagent_results = insight_budget.fit(ctx, results)
 
     # Build annotated summary of sub-agent help
     subagent_insights = ""
@@ -120,19 +268,59 @@ async def handle_scraper(ctx: Context, sender: str, msg: WebsiteScraperResponse)
     asi1_prompt = f"""
 You are a Job Matching assistant.
 
-Based on the query and job listings, provide 3–5 most relevant job links, career suggestions, and possible training resources if needed. Do NOT ask follow-up questions.
+The job listings below are already ranked against the user's query and profile, best match first. Based on the query and these listings, provide the 3–5 most relevant job links, career suggestions, and possible training resources if needed. Do NOT ask follow-up questions.
 
 Query: "{query}"
 
-Scraped Job Listings:
-{scraper_text}
+Job Listings (title | company | location | salary | posted | link), best matches first:
+{job_listings}
 
 {subagent_insights if subagent_insights else "No additional sub-agents were consulted."}
 """
 
-    result = await call_asi1(asi1_prompt)
-    await ctx.send(sender_address, TaskResponse(result=result))
+    # If ASI1 is down or the circuit is open, the ranked listings are still worth sending
+    degraded = f"Top matching job listings for \"{query}\" (AI summary currently unavailable):\n{job_listings}"
+    admit = dict(priority=session["priority"], session_id=session["reply_id"])
+    # Answers sent after a scrape leave the TaskRequest handler behind, so they are cached here
+    with answers.answering(ctx, sender_address, session["reply_id"], query, session["hops"]):
+        if missing:
+            answercache.degraded("deadline")
+        if session["stream"]:
+            relay = StreamRelay(ctx, sender_address, TaskResponseChunk, request_id=session["reply_id"])
+            try:
+                await relay.relay(asi1.stream(asi1_prompt, **admit))
+            except ASI1Error as e:
+                answercache.degraded("asi1")
+                ctx.logger.warning(f"⚠️ ASI1 call failed: {e}")
+                await relay.send(degraded)
+            await relay.finish()
+        else:
+            result = await call_asi1(asi1_prompt, fallback=degraded, **admit)
+            with tracer.span("reply"):
+                await ctx.send(sender_address, TaskResponse(result=result, request_id=session["reply_id"],
+                                                            trace=tracing.context()))
     ctx.logger.info("✅ Final response sent to Commander/User.")
 
+@job_matching.on_interval(period=60.0)
+async def expire_sessions(ctx: Context):
+    expired = sessions.sweep()
+    prune_scrapes()
+    if expired:
+        ctx.logger.info(f"🧹 Expired {expired} stale request(s)")
+
+@job_matching.on_interval(period=3600.0)
+async def expire_listings(ctx: Context):
+    expired = job_index.expire()
+    if expired:
+        ctx.logger.info(f"🧹 Removed {expired} expired job listing(s) from the index")
+
+@job_matching.on_event("startup")
+async def start_metrics(ctx: Context):
+    await metrics.start(ctx)
+
+@job_matching.on_event("shutdown")
+async def close_asi1(ctx: Context):
+    await close_pool()
+
 if __name__ == "__main__":
     job_matching.run()
@@ -0,0 +1,75 @@
+import os
+from typing import Iterable, List
+
+from listings import JobListing, rank_listings
+from router import STOPWORDS, tokenize
+
+try:
+    import numpy as np
+except ImportError:  # optional: without NumPy, listings.rank_listings does the ranking
+    np = None
+
+# Listings handed to ASI1 after ranking
+TOP_K = int(os.getenv("JOB_RANK_TOP_K", "8"))
+# Weight of resume / skill profile terms relative to the query's own terms
+PROFILE_WEIGHT = float(os.getenv("JOB_RANK_PROFILE_WEIGHT", "0.3"))
+
+# BM25 parameters; a title counts three times towards a listing's terms
+K1 = 1.2
+B = 0.75
+TITLE_REPEAT = 3
+
+
+def _terms(listing: JobListing) -> List[str]:
+    return tokenize(listing.title) * TITLE_REPEAT + tokenize(listing.company) + tokenize(listing.location)
+
+
+def rank_for_profile(listings: Iterable[JobListing], query: str, profile: str = "", limit: int = TOP_K) -> List[JobListing]:
+    """BM25-rank listings against the query plus any resume or skill text, best first.
+
+    All listings are scored in one matrix product: BM25 term saturation of
+    the listing-by-term count matrix times IDF-weighted query terms. Query
+    terms weigh 1, profile terms up to PROFILE_WEIGHT by how often the
+    profile mentions them. Salary and freshness add a small bonus.
+    """
+    listings = list(listings)
+    if np is None or not listings:
+        return rank_listings(listings, f"{query} {profile}", limit)
+
+    vocabulary = {}
+    rows, columns = [], []
+    for row, listing in enumerate(listings):
+        for term in _terms(listing):
+            rows.append(row)
+            columns.append(vocabulary.setdefault(term, len(vocabulary)))
+    counts = np.zeros((len(listings), len(vocabulary)), dtype=np.float32)
+    np.add.at(counts, (rows, columns), 1.0)
+
+    wanted = np.zeros(len(vocabulary), dtype=np.float32)
+    profile_terms = [t for t in tokenize(profile) if t in vocabulary and t not in STOPWORDS]
+    if profile_terms:
+        mentions = np.bincount([vocabulary[t] for t in profile_terms], minlength=len(vocabulary))
+        wanted = PROFILE_WEIGHT * mentions / mentions.max()
+    for term in tokenize(query):
+        if term in vocabulary and term not in STOPWORDS:
+            wanted[vocabulary[term]] = 1.0
+
+    lengths = counts.sum(axis=1, keepdims=True)
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log1p((len(listings) - document_frequency + 0.5) / (document_frequency + 0.5))
+    # Listings with no text at all have no average length to normalise by
+    mean_length = lengths.mean() or 1.0
+    saturation = counts * (K1 + 1) / (counts + K1 * (1 - B + B * lengths / mean_length))
+    relevance = saturation @ (idf * wanted)
+    scores = relevance.copy()
+
+    ages = np.array([30 if listing.age_days is None else listing.age_days for listing in listings], dtype=np.float32)
+    scores += 0.5 * np.clip(1 - ages / 30, 0, 1)
+    scores += 0.25 * np.array([bool(listing.salary) for listing in listings], dtype=np.float32)
+
+    order = np.argsort(-scores, kind="stable")[:limit]
+    # Listings sharing nothing with the query or profile only dilute the prompt
+    order = [i for i in order if relevance[i] > 0] or list(order)
+    for i in order:
+        listings[i].score = float(scores[i])
+    return [listings[i] for i in order]
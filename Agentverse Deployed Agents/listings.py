@@ -0,0 +1,202 @@
+import html
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from router import tokenize
+
+# Most listings passed on to ASI1, and the raw-text fallback when nothing parses
+MAX_LISTINGS = int(os.getenv("JOB_LISTINGS_MAX", "15"))
+FALLBACK_CHARS = 2000
+
+INDEED_BASE = "https://in.indeed.com"
+
+_JOB_KEY = re.compile(r"\bjk=([0-9a-f]{8,})", re.I)
+_URL = re.compile(r"(?:https?://[^\s\"'<>)\]]+|/(?:viewjob|rc/clk|pagead/clk)\?[^\s\"'<>)\]]+)")
+_SALARY = re.compile(
+    r"(?:₹|Rs\.?|INR|\$|€|£)\s?[\d,.]+(?:\s?(?:lakhs?|lacs?|LPA)\b|\s?[kKlL]\b)?"
+    r"(?:\s*(?:-|–|to)\s*(?:₹|Rs\.?|INR|\$|€|£)?\s?[\d,.]+(?:\s?(?:lakhs?|lacs?|LPA)\b|\s?[kKlL]\b)?)?"
+    r"(?:\s*(?:a|an|per|/)\s*(?:year|annum|month|week|day|hour))?",
+    re.I
+)
+_POSTED = re.compile(
+    r"(?:(?:Posted|Employer|Active)\s+)?(?:\d+\+?\s+days?\s+ago|just posted|today|yesterday|\d+\+?\s+hours?\s+ago)",
+    re.I
+)
+_DAYS = re.compile(r"(\d+)\+?\s+days?", re.I)
+_LOCATION_HINT = re.compile(
+    r"\b(?:remote|hybrid|work from home|india|maharashtra|karnataka|telangana|tamil nadu|delhi|haryana|"
+    r"uttar pradesh|gujarat|west bengal|kerala|\d{6})\b|,",
+    re.I
+)
+# Badges and page chrome that sit between the fields of an Indeed job card
+_NOISE = re.compile(
+    r"^(?:skip to main content|new|easily apply|urgently hiring|responsive employer|hiring multiple candidates|"
+    r"full[- ]time|part[- ]time|permanent|contract|internship|fresher|temporary|day shift|night shift|"
+    r"morning shift|rotational shift|monday to friday|\d(?:\.\d)?|\d(?:\.\d)? out of 5(?: stars)?|"
+    r"more\.{3}|view similar jobs.*|save job|not interested|report job|apply now|.*\bjob(?:s)? in\b.*results?.*)$",
+    re.I
+)
+_BLOCK_BREAK = re.compile(r"\n\s*\n|\n\s*(?:-{3,}|={3,}|\*{3,})\s*\n")
+_FIELD_SEPARATOR = re.compile(r"\s+(?:-|–|\||·|•)\s+")
+_TAGS = re.compile(r"<[^>]+>")
+_HTML_CARD = re.compile(r"data-jk=[\"']([0-9a-f]+)[\"']", re.I)
+
+
+@dataclass
+class JobListing:
+    title: str
+    company: str = ""
+    location: str = ""
+    salary: str = ""
+    posted: str = ""
+    url: str = ""
+    score: float = 0.0
+
+    @property
+    def key(self) -> str:
+        jk = _JOB_KEY.search(self.url)
+        if jk:
+            return jk.group(1).lower()
+        return "|".join(_normal(part) for part in (self.title, self.company, self.location))
+
+    @property
+    def age_days(self) -> Optional[int]:
+        if not self.posted:
+            return None
+        days = _DAYS.search(self.posted)
+        return int(days.group(1)) if days else 0
+
+    def line(self) -> str:
+        fields = [self.title, self.company, self.location, self.salary, self.posted, self.url]
+        return " | ".join(field for field in fields if field)
+
+
+def _normal(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _canonical_url(url: str) -> str:
+    jk = _JOB_KEY.search(url)
+    if jk:
+        return f"{INDEED_BASE}/viewjob?jk={jk.group(1)}"
+    if url.startswith("/"):
+        return INDEED_BASE + url
+    return url
+
+
+def _from_fields(lines: List[str]) -> Optional[JobListing]:
+    """Build a listing from the text fields of one job card, in page order."""
+    url = salary = posted = ""
+    rest = []
+    for line in lines:
+        line = line.strip(" \t•·|-–")
+        if not line:
+            continue
+        found_url = _URL.search(line)
+        if found_url and not url:
+            url = _canonical_url(found_url.group(0))
+            line = (line[:found_url.start()] + line[found_url.end():]).strip(" \t•·|-–")
+            if not line:
+                continue
+        found_salary = _SALARY.search(line)
+        if found_salary and not salary and found_salary.end() - found_salary.start() > 3:
+            salary = found_salary.group(0).strip()
+            line = (line[:found_salary.start()] + line[found_salary.end():]).strip(" \t•·|-–")
+        found_posted = _POSTED.search(line)
+        if found_posted and not posted:
+            posted = found_posted.group(0).strip()
+            line = (line[:found_posted.start()] + line[found_posted.end():]).strip(" \t•·|-–")
+        if line and not _NOISE.match(line) and len(line) <= 120:
+            rest.append(line)
+
+    if not rest:
+        return None
+    title = rest[0]
+    company = location = ""
+    others = rest[1:]
+    for i, field in enumerate(others):
+        if _LOCATION_HINT.search(field) and not location:
+            location = field
+            others = others[:i] + others[i + 1:]
+            break
+    if others:
+        company = others[0]
+    if not location and len(others) > 1:
+        location = others[1]
+
+    # Page chrome has none of a job card's links, pay or dates
+    if not (url or salary or posted):
+        return None
+    return JobListing(title=title, company=company, location=location, salary=salary, posted=posted, url=url)
+
+
+def _html_cards(page: str) -> List[List[str]]:
+    """Split an HTML search page into the text lines of each job card."""
+    found = list(_HTML_CARD.finditer(page))
+    cards = []
+    for i, match in enumerate(found):
+        end = found[i + 1].start() if i + 1 < len(found) else len(page)
+        chunk = page[page.find(">", match.end()) + 1:end]
+        jk = match.group(1)
+        text = html.unescape(_TAGS.sub("\n", chunk))
+        cards.append([f"{INDEED_BASE}/viewjob?jk={jk}"] + [line for line in text.splitlines() if line.strip()])
+    return cards
+
+
+def _text_cards(page: str) -> List[List[str]]:
+    """Split scraped page text into candidate job cards.
+
+    Cards are separated by blank lines or rules; a card written on one line
+    ("Title - Company - City - URL") is split on its field separators.
+    """
+    cards = []
+    for block in _BLOCK_BREAK.split(page):
+        lines = [line for line in block.splitlines() if line.strip()]
+        if len(lines) == 1 or (lines and all(_FIELD_SEPARATOR.search(line) for line in lines)):
+            cards.extend(_FIELD_SEPARATOR.split(line) for line in lines)
+        elif lines:
+            cards.append(lines)
+    return cards
+
+
+def parse_listings(page: str) -> List[JobListing]:
+    """Pull deduplicated job records out of a scraped Indeed search page (HTML or text)."""
+    cards = _html_cards(page) if _HTML_CARD.search(page) else _text_cards(page)
+    listings = {}
+    for card in cards:
+        listing = _from_fields(card)
+        if listing is None:
+            continue
+        seen = listings.get(listing.key)
+        if seen is None:
+            listings[listing.key] = listing
+        else:
+            # Fill in whatever the first copy of the card was missing
+            for field in ("company", "location", "salary", "posted", "url"):
+                if not getattr(seen, field):
+                    setattr(seen, field, getattr(listing, field))
+    return list(listings.values())
+
+
+def rank_listings(listings: Iterable[JobListing], query: str, limit: int = MAX_LISTINGS) -> List[JobListing]:
+    """Order listings by title/location match with the query, then detail and freshness."""
+    wanted = set(tokenize(query))
+    ranked = []
+    for listing in listings:
+        title = set(tokenize(listing.title))
+        score = 4.0 * len(wanted & title) / (len(title) or 1)
+        score += 1.0 * bool(wanted & set(tokenize(listing.location)))
+        score += 0.5 * bool(listing.salary) + 0.25 * bool(listing.url)
+        age = listing.age_days
+        if age is not None:
+            score += max(0.0, 1.0 - age / 30)
+        listing.score = score
+        ranked.append(listing)
+    ranked.sort(key=lambda listing: listing.score, reverse=True)
+    return ranked[:limit]
+
+
+def format_listings(listings: Iterable[JobListing]) -> str:
+    return "\n".join(f"{i}. {listing.line()}" for i, listing in enumerate(listings, 1))
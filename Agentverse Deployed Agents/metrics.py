@@ -0,0 +1,208 @@
+import asyncio
+import bisect
+import functools
+import math
+import os
+from typing import Callable, Dict, Iterable, Sequence, Tuple
+
+from aiohttp import web
+from uagents import Model
+
+# Serve every agent's metrics in Prometheus text format on this port (per process)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Or write them to this file every METRICS_INTERVAL seconds
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "60"))
+# How often the event loop is probed for lag
+LAG_PROBE_SECONDS = 0.5
+
+_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40, 60)
+_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+_WIDTH_BUCKETS = (0, 1, 2, 3, 4, 5)
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, escaped))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Counted with `inc()`, or read from a `collect()` callback when the metrics are rendered."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self._collectors: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def collect(self, *labels: str, read: Callable[[], float]):
+        self._collectors[labels] = read
+
+    def samples(self) -> Iterable[str]:
+        for labels, read in self._collectors.items():
+            self.values[labels] = float(read())
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value:g}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = _LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        counts = self.values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+        counts[0][bisect.bisect_left(self.buckets, value)] += 1
+        counts[1] += value
+
+    def samples(self) -> Iterable[str]:
+        names = self.labels + ("le",)
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                yield f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total:g}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# One registry per process; every agent in it reports under its own `agent` label
+registry = Registry()
+messages_in = registry.add(Counter("agent_messages_received_total", "Messages handled, by model", ("agent", "model")))
+messages_out = registry.add(Counter("agent_messages_sent_total", "Messages sent from handlers, by model", ("agent", "model")))
+handler_errors = registry.add(Counter("agent_handler_errors_total", "Handlers that raised", ("agent", "model")))
+fan_out_width = registry.add(Histogram("agent_fan_out_width", "Sub-agents a request was forwarded to", ("agent",),
+                                       buckets=_WIDTH_BUCKETS))
+pending_fanin = registry.add(Gauge("agent_fanin_pending", "Requests still waiting on sub-agent replies", ("agent",)))
+late_replies = registry.add(Counter("agent_fanin_late_total", "Replies that arrived after their request was answered",
+                                    ("agent",)))
+open_sessions = registry.add(Gauge("agent_sessions_open", "Requests in flight", ("agent",)))
+cache_hit_ratio = registry.add(Gauge("agent_cache_hit_ratio", "Hit rate of each cache since start", ("agent", "cache")))
+asi1_seconds = registry.add(Histogram("asi1_request_duration_seconds",
+                                      "ASI1 HTTP requests once admitted by the scheduler: whole requests, and "
+                                      "the first token of streamed ones", ("agent", "call")))
+asi1_errors = registry.add(Counter("asi1_errors_total", "ASI1 calls that failed and reached the agent, by kind",
+                                   ("agent", "kind")))
+loop_lag = registry.add(Histogram("event_loop_lag_seconds", "How late the event loop ran a scheduled probe",
+                                  buckets=_LAG_BUCKETS))
+
+_digests: Dict[str, str] = {}
+_tasks = []
+
+
+async def _probe_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LAG_PROBE_SECONDS
+        await asyncio.sleep(LAG_PROBE_SECONDS)
+        loop_lag.observe(max(0.0, loop.time() - expected))
+
+
+async def _dump():
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        # Written whole, then renamed, so a reader never sees half a file
+        with open(METRICS_FILE + ".tmp", "w", encoding="utf-8") as f:
+            f.write(registry.render())
+        os.replace(METRICS_FILE + ".tmp", METRICS_FILE)
+
+
+async def _serve(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+class AgentMetrics:
+    """Metrics of one agent: wraps its handlers and reads its caches and fan-in state."""
+
+    def __init__(self, agent: str):
+        self.agent = agent
+
+    def models(self, *models):
+        """Name the models this agent sends, so sent messages are counted by model name."""
+        for model in models:
+            _digests[Model.build_schema_digest(model)] = model.__name__
+
+    def handler(self, func):
+        """Count the message a handler receives and the messages it sends."""
+        @functools.wraps(func)
+        async def counted(ctx, sender: str, msg):
+            model = type(msg).__name__
+            messages_in.inc(self.agent, model)
+            try:
+                return await func(ctx, sender, msg)
+            except Exception:
+                handler_errors.inc(self.agent, model)
+                raise
+            finally:
+                for messages in ctx.outbound_messages.values():
+                    for _, digest in messages:
+                        messages_out.inc(self.agent, _digests.get(digest, digest[:12]))
+        return counted
+
+    def fan_out(self, width: int):
+        fan_out_width.observe(width, self.agent)
+
+    def watch_fanin(self, fanin):
+        pending_fanin.collect(self.agent, read=lambda: len(fanin))
+        late_replies.collect(self.agent, read=lambda: fanin.late)
+
+    def watch_sessions(self, sessions):
+        open_sessions.collect(self.agent, read=lambda: len(sessions))
+
+    def watch_cache(self, name: str, cache):
+        cache_hit_ratio.collect(self.agent, name, read=lambda: cache.stats()["hit_rate"])
+
+    async def start(self, ctx):
+        """Start the lag probe, the HTTP endpoint and the file dump, once per process."""
+        if _tasks:
+            return
+        _tasks.append(asyncio.ensure_future(_probe_lag()))
+        if METRICS_FILE:
+            _tasks.append(asyncio.ensure_future(_dump()))
+        if METRICS_PORT:
+            app = web.Application()
+            app.router.add_get("/metrics", _serve)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+            ctx.logger.info(f"📈 Metrics served on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
@@ -0,0 +1,129 @@
+import os
+import re
+from typing import Dict, List, Set, Tuple
+
+from router import STOPWORDS, tokenize
+
+# Tokens each sub-agent's answer may take up in a prompt, and how similar two
+# sentences may be (share of their words) before the later one is dropped
+INSIGHT_TOKENS = int(os.getenv("INSIGHT_TOKEN_BUDGET", "250"))
+MAX_OVERLAP = float(os.getenv("INSIGHT_MAX_OVERLAP", "0.6"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[^a-z])")
+_CONCRETE = re.compile(r"https?://|\d")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough ASI1 token count: about four characters per token, as for other BPE models."""
+    return (len(text) + 3) // 4
+
+
+def _content(sentence: str) -> Set[str]:
+    return {t for t in tokenize(sentence) if t not in STOPWORDS and len(t) > 1}
+
+
+class _Sentence:
+    def __init__(self, source: str, line: int, position: int, text: str):
+        self.source = source
+        self.line = line
+        self.position = position
+        self.text = text
+        self.words = _content(text)
+        self.tokens = estimate_tokens(text) + 1
+        self.score = 0.0
+
+
+class InsightBudget:
+    """Extractive compression of sub-agent answers before they go into a prompt.
+
+    Every answer is split into sentences. A sentence that mostly repeats one
+    already kept (from any sub-agent) is dropped, and each answer keeps its
+    highest-value sentences, in their original order, until it fits
+    `tokens`. A sentence is worth more when its words recur across the
+    answers, when it carries numbers or links, and when it comes early.
+    Everything runs locally; no LLM is involved.
+    """
+
+    def __init__(self, tokens: int = INSIGHT_TOKENS, max_overlap: float = MAX_OVERLAP):
+        self.tokens = tokens
+        self.max_overlap = max_overlap
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def compress(self, insights: Dict[str, str]) -> Tuple[Dict[str, str], int, int]:
+        """Return (compressed insights, tokens before, tokens after)."""
+        sentences = self._split(insights)
+        before = sum(estimate_tokens(text) for text in insights.values())
+
+        frequency: Dict[str, int] = {}
+        for sentence in sentences:
+            for word in sentence.words:
+                frequency[word] = frequency.get(word, 0) + 1
+        for sentence in sentences:
+            if sentence.words:
+                centrality = sum(frequency[w] for w in sentence.words) / len(sentence.words)
+                sentence.score = centrality + 0.1 * len(sentence.words)
+            sentence.score += 1.0 if _CONCRETE.search(sentence.text) else 0.0
+            sentence.score /= 1.0 + 0.1 * sentence.position
+
+        kept: List[_Sentence] = []
+        spent = {source: 0 for source in insights}
+        for sentence in sorted(sentences, key=lambda s: s.score, reverse=True):
+            if spent[sentence.source] + sentence.tokens > self.tokens:
+                continue
+            if any(self._overlaps(sentence, other) for other in kept):
+                continue
+            kept.append(sentence)
+            spent[sentence.source] += sentence.tokens
+
+        compressed = {
+            source: self._join([s for s in kept if s.source == source]) or "(Nothing beyond the other insights.)"
+            for source in insights
+        }
+        after = sum(estimate_tokens(text) for text in compressed.values())
+        self.tokens_in += before
+        self.tokens_out += after
+        return compressed, before, after
+
+    def fit(self, ctx, insights: Dict[str, str]) -> Dict[str, str]:
+        """compress(), logging how much smaller the prompt gets."""
+        if not insights:
+            return insights
+        compressed, before, after = self.compress(insights)
+        if after < before:
+            ctx.logger.info(f"✂️ Sub-agent insights cut from ~{before} to ~{after} tokens "
+                            f"(prompt ~{before - after} tokens smaller)")
+        return compressed
+
+    def _overlaps(self, sentence: _Sentence, other: _Sentence) -> bool:
+        if not sentence.words or not other.words:
+            return sentence.text.strip().casefold() == other.text.strip().casefold()
+        shared = len(sentence.words & other.words)
+        return shared / min(len(sentence.words), len(other.words)) >= self.max_overlap
+
+    @staticmethod
+    def _split(insights: Dict[str, str]) -> List[_Sentence]:
+        sentences = []
+        for source, text in insights.items():
+            position = 0
+            for line_no, line in enumerate(text.strip().splitlines()):
+                for part in _SENTENCE_END.split(line.strip()):
+                    if part:
+                        sentences.append(_Sentence(source, line_no, position, part))
+                        position += 1
+        return sentences
+
+    @staticmethod
+    def _join(sentences: List[_Sentence]) -> str:
+        lines: Dict[int, List[str]] = {}
+        for sentence in sorted(sentences, key=lambda s: s.position):
+            lines.setdefault(sentence.line, []).append(sentence.text)
+        return "\n".join(" ".join(parts) for _, parts in sorted(lines.items()))
+
+    def stats(self) -> dict:
+        return {
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "saved": self.tokens_in - self.tokens_out,
+            "ratio": self.tokens_out / self.tokens_in if self.tokens_in else 1.0
+        }
@@ -0,0 +1,116 @@
+import os
+import random
+import time
+from collections import deque
+from typing import Optional
+
+# Adaptive timeout: this multiple of the observed p99, kept between the floor and the configured timeout
+TIMEOUT_MULTIPLIER = float(os.getenv("ASI1_TIMEOUT_MULTIPLIER", "3"))
+MIN_TIMEOUT = float(os.getenv("ASI1_MIN_TIMEOUT", "5"))
+# A duplicate request is fired once the first has run longer than this percentile
+HEDGE_PERCENTILE = float(os.getenv("ASI1_HEDGE_PERCENTILE", "95"))
+# Retries after the first attempt, with full-jitter exponential backoff
+RETRIES = int(os.getenv("ASI1_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("ASI1_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("ASI1_BACKOFF_CAP", "8"))
+# Consecutive failures that open the breaker, and how long it stays open
+BREAKER_FAILURES = int(os.getenv("ASI1_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("ASI1_BREAKER_COOLDOWN", "30"))
+
+# Latencies needed before the percentiles are trusted
+MIN_SAMPLES = 20
+
+
+class LatencyWindow:
+    """Rolling window of recent call durations, for adaptive timeouts and hedging."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self._samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def timeout(self, ceiling: float) -> float:
+        """The configured timeout until enough calls are seen, then a multiple of p99 under it."""
+        p99 = self.percentile(99)
+        if p99 is None:
+            return ceiling
+        return min(ceiling, max(MIN_TIMEOUT, TIMEOUT_MULTIPLIER * p99))
+
+    def hedge_delay(self) -> Optional[float]:
+        return self.percentile(HEDGE_PERCENTILE)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (0-based)."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Fails fast while ASI1 is down instead of letting every caller wait out its timeout.
+
+    After `failures` consecutive failed calls the breaker opens and `allow()`
+    refuses calls for `cooldown` seconds. Then it lets a single probe through
+    (half-open): success closes it, failure opens it again.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self):
+        self.consecutive = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.consecutive += 1
+        if self.probing or self.consecutive >= self.failures:
+            if self.opened_at is None or self.probing:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """A call allowed through ended without telling whether ASI1 is up (cancelled, or its request rejected)."""
+        self.probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive,
+            "trips": self.trips,
+            "rejected": self.rejected
+        }
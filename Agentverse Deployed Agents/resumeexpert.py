@@ -1,10 +1,23 @@
 from uagents import Agent, Context, Model
-import os
-import requests
-import json
-
-# ASI1 API Key
-asi1_api_key = os.getenv("ASI1_API_KEY")
+from typing import Dict, List, Optional
+import asyncio
+from asi1client import ASI1Client, ASI1Error, close_pool
+from completioncache import CompletionCache
+from streaming import StreamRelay
+from sessions import new_request_id
+from fanin import ScatterGather, FANIN_DEADLINE
+from router import KeywordRouter, addresses_for
+from hops import HopGuard
+from scheduler import priority_for
+from promptbudget import InsightBudget
+from tracing import Tracer
+import tracing
+from metrics import AgentMetrics
+from answercache import AnswerCache
+import answercache
+
+# ASI1 client (reads ASI1_API_KEY from the environment)
+asi1 = ASI1Client(temperature=0.7, cache=CompletionCache(ttl=24 * 3600))
 
 # Sub-agent registry
 SUBAGENTS = {
@@ -13,54 +26,85 @@ SUBAGENTS = {
     "agent1qv4xn6kxtylzyvf5zc4ywx4qcq2g3q6cp2mpvz8twkwmtnm27gl6xp9x7av": "Job Matching"
 }
 
+# Keyword routing to the sub-agents above
+router = KeywordRouter.for_agent("Resume Expert")
+
+# Hop budget and cycle check for forwarded requests
+hop_guard = HopGuard()
+
+# Token budget for each sub-agent's insights appended to the review
+insight_budget = InsightBudget()
+
 # Models
 class TaskRequest(Model):
     query: str
+    stream: bool = False
+    request_id: Optional[str] = None
+    hops: int = 0
+    visited: List[str] = []
+    trace: Optional[str] = None
 
 class TaskResponse(Model):
     result: str
+    request_id: Optional[str] = None
+    trace: Optional[str] = None
+
+class TaskResponseChunk(Model):
+    result: str
+    seq: int
+    final: bool = False
+    request_id: Optional[str] = None
+
+# Recent final answers, served again to near-identical queries
+answers = AnswerCache(TaskResponse, TaskResponseChunk)
+
+# Sub-agent replies awaited by each in-flight request, keyed by request ID
+fanin = ScatterGather()
+
+# Spans for every step of a query (written to TRACE_FILE when set)
+tracer = Tracer("Resume Expert")
+
+# Prometheus metrics (served on METRICS_PORT or written to METRICS_FILE when set)
+metrics = AgentMetrics("Resume Expert")
 
 # Initialize agent
-resume_expert = Agent(name="resume_expert", seed="resume_expert_secret_seed")
+resume_expert = Agent(name="resume_expert", seed="resume_expert_secret_seed", handle_messages_concurrently=True)
 
 # Helper to call ASI1
-def call_asi1(prompt):
-    headers = {
-        "Authorization": f"Bearer {asi1_api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "asi1-mini",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7,
-        "stream": False
-    }
+async def call_asi1(prompt, **admit):
     try:
-        res = requests.post("https://api.asi1.ai/v1/chat/completions", headers=headers, json=data)
-        return res.json()["choices"][0]["message"]["content"]
-    except Exception as e:
+        return await asi1.complete(prompt, **admit)
+    except ASI1Error as e:
+        answercache.degraded("asi1")
         return f"ASI1 LLM failed: {e}"
 
+# Sent models are counted by name; the gauges read these at scrape time
+metrics.models(TaskRequest, TaskResponse, TaskResponseChunk)
+metrics.watch_cache("completions", asi1.cache)
+metrics.watch_cache("answers", answers)
+metrics.watch_fanin(fanin)
+
 # Resume Agent Logic
 @resume_expert.on_message(model=TaskRequest)
+@tracer.handler
+@metrics.handler
+@answers.handler
 async def handle_query(ctx: Context, sender: str, msg: TaskRequest):
     ctx.logger.info(f"📩 Resume Expert received query: {msg.query}")
 
-    ctx.storage.set("main_query", msg.query)
-    ctx.storage.set("sender", sender)
-    ctx.storage.set("subagent_results", json.dumps({}))
+    request_id = new_request_id()
 
     # Forward to relevant sub-agents based on keywords
-    query_lower = msg.query.lower()
-    if any(w in query_lower for w in ["trend", "demand", "industry"]):
-        await ctx.send(list(SUBAGENTS.keys())[0], TaskRequest(query=msg.query))
-        ctx.logger.info(f"🔄 Forwarded to sub-agent: {list(SUBAGENTS.keys())[0]}")
-    if any(w in query_lower for w in ["course", "certification", "learning"]):
-        await ctx.send(list(SUBAGENTS.keys())[1], TaskRequest(query=msg.query))
-        ctx.logger.info(f"🔄 Forwarded to sub-agent: {list(SUBAGENTS.keys())[1]}")
-    if any(w in query_lower for w in ["job", "apply", "vacancy", "hiring"]):
-        await ctx.send(list(SUBAGENTS.keys())[2], TaskRequest(query=msg.query))
-        ctx.logger.info(f"🔄 Forwarded to sub-agent: {list(SUBAGENTS.keys())[2]}")
+    hops, visited = hop_guard.next_hop(ctx.agent.address, msg.hops, msg.visited)
+    targets = hop_guard.allowed(ctx, addresses_for(router.route(msg.query), SUBAGENTS), hops, visited, SUBAGENTS)
+    fanin.expect(request_id, targets)
+    deadline = asyncio.get_running_loop().time() + FANIN_DEADLINE
+    metrics.fan_out(len(targets))
+    with tracer.span("fan-out", width=len(targets)) as span:
+        for address in targets:
+            await ctx.send(address, TaskRequest(query=msg.query, request_id=request_id, hops=hops, visited=visited,
+                                                trace=span.context))
+            ctx.logger.info(f"🔄 Forwarded to sub-agent: {address}")
 
     # Proceed to ASI1 immediately for Resume analysis
     asi1_prompt = f"""
@@ -73,32 +117,45 @@ Avoid vague responses. Focus on impact, relevance, and actionable improvements.
 
 Resume Content:
 \"\"\"{msg.query}\"\"\"
-
-Also, check if any sub-agent insights are available from Demand Analysis, Training Resource, or Job Matching. Include their value in the final response under a section: "🔍 Additional Agent Insights".
 """
-    response = call_asi1(asi1_prompt)
-    ctx.storage.set("base_response", response)
+    admit = dict(priority=priority_for(msg.hops), session_id=msg.request_id)
+    relay = None
+    if msg.stream:
+        # Stream the base review straight through; sub-agent notes follow as the final chunk
+        relay = StreamRelay(ctx, sender, TaskResponseChunk, request_id=msg.request_id)
+        try:
+            response = await relay.relay(asi1.stream(asi1_prompt, **admit))
+        except ASI1Error as e:
+            answercache.degraded("asi1")
+            response = f"ASI1 LLM failed: {e}"
+            await relay.send(response)
+    else:
+        response = await call_asi1(asi1_prompt, **admit)
 
-    await maybe_finalize(ctx)
+    # The sub-agents worked while the review was written; give the slow ones what is left of the deadline
+    with tracer.span("wait", kind="wait") as span:
+        results, missing = await fanin.gather(request_id, max(0.0, deadline - asyncio.get_running_loop().time()))
+        span.set(missing=len(missing))
+    if missing:
+        ctx.logger.warning(f"⏰ Sub-agents missed the deadline: {', '.join(SUBAGENTS.get(a, a) for a in missing)}")
+        answercache.degraded("deadline")
+
+    await finalize(ctx, sender, msg.request_id, response, results, relay)
 
 # Response handler for sub-agents
 @resume_expert.on_message(model=TaskResponse)
+@tracer.handler
+@metrics.handler
 async def handle_subagent_response(ctx: Context, sender: str, msg: TaskResponse):
-    ctx.logger.info(f"📥 Sub-agent response received from {sender}")
-    subagent_results = json.loads(ctx.storage.get("subagent_results") or "{}")
-    subagent_results[sender] = msg.result
-    ctx.storage.set("subagent_results", json.dumps(subagent_results))
-
-    await maybe_finalize(ctx)
-
-# Conditional response dispatch
-async def maybe_finalize(ctx: Context):
-    # Ensure both ASI1 and sub-agents have replied
-    base_response = ctx.storage.get("base_response")
-    if not base_response:
-        return
+    if fanin.resolve(msg.request_id, sender, msg.result):
+        ctx.logger.info(f"📥 Sub-agent response received from {SUBAGENTS.get(sender, sender)}")
+    else:
+        ctx.logger.warning(f"⚠️ Ignoring late or unexpected response from {SUBAGENTS.get(sender, sender)}")
 
-    subagents_output = json.loads(ctx.storage.get("subagent_results") or "{}")
+# Single response dispatch: the review plus whatever sub-agent insights arrived in time
+async def finalize(ctx: Context, sender: str, reply_id: Optional[str], base_response: str,
+                   results: Dict[str, str], relay: Optional[StreamRelay] = None):
+    subagents_output = insight_budget.fit(ctx, results)
     subagent_notes = ""
     if subagents_output:
         subagent_notes = "\n\n🔍 Additional Agent Insights:\n"
@@ -107,10 +164,23 @@ async def maybe_finalize(ctx: Context):
     else:
         subagent_notes = "\n\n📝 No additional sub-agents were needed for this resume evaluation."
 
-    full_reply = base_response.strip() + subagent_notes
-    await ctx.send(ctx.storage.get("sender"), TaskResponse(result=full_reply))
+    if relay is not None:
+        with tracer.span("reply"):
+            await relay.finish(subagent_notes)
+    else:
+        full_reply = base_response.strip() + subagent_notes
+        with tracer.span("reply"):
+            await ctx.send(sender, TaskResponse(result=full_reply, request_id=reply_id, trace=tracing.context()))
     ctx.logger.info("✅ Final Resume Expert response sent to Commander.")
 
+@resume_expert.on_event("startup")
+async def start_metrics(ctx: Context):
+    await metrics.start(ctx)
+
+@resume_expert.on_event("shutdown")
+async def close_asi1(ctx: Context):
+    await close_pool()
+
 # Run agent
 if __name__ == "__main__":
     resume_expert.run()
@@ -0,0 +1,148 @@
+import re
+import string
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Keywords (single words or phrases) each agent forwards a query on, per specialist.
+# Every agent keeps its own rules: the same word may call a specialist from one
+# agent and not from another.
+AGENT_KEYWORDS: Dict[str, Dict[str, List[str]]] = {
+    "Commander": {
+        "Resume Expert": ["resume", "cv"],
+        "Skill Assessment": ["skill", "competitive", "gap", "strength", "weakness"],
+        "Demand Analysis": ["demand", "trend", "market", "growth", "outlook"],
+        "Training Resource": ["course", "certification", "training", "learn", "upskill"],
+        "Job Matching": ["job", "vacancy", "hiring", "opening"]
+    },
+    "Resume Expert": {
+        "Demand Analysis": ["trend", "demand", "industry"],
+        "Training Resource": ["course", "certification", "learning"],
+        "Job Matching": ["job", "apply", "vacancy", "hiring"]
+    },
+    "Skill Assessment": {
+        "Resume Expert": ["resume", "cv"],
+        "Demand Analysis": ["trend", "demand", "market"],
+        "Training Resource": ["course", "training", "certification"],
+        "Job Matching": ["job", "apply", "vacancy"]
+    },
+    "Demand Analysis": {
+        "Resume Expert": ["resume", "cv"],
+        "Skill Assessment": ["gap"],
+        "Training Resource": ["upskill", "learn", "course"],
+        "Job Matching": ["job", "vacancy", "hiring"]
+    },
+    "Training Resource": {
+        "Resume Expert": ["resume", "cv"],
+        "Demand Analysis": ["market", "demand", "trends"],
+        "Job Matching": ["job", "vacancy", "hiring"]
+    },
+    "Job Matching": {
+        "Resume Expert": ["resume", "cv"],
+        "Skill Assessment": ["skills", "qualification"],
+        "Demand Analysis": ["trend", "market"],
+        "Training Resource": ["course", "certification", "training"]
+    }
+}
+
+# Punctuation becomes whitespace so "jobs," and "(CV)" split into plain words
+_SEPARATOR_CHARS = string.punctuation + "“”‘’–—…•"
+_SEPARATORS = str.maketrans({c: " " for c in _SEPARATOR_CHARS})
+_WORD = re.compile(r"[^\s" + re.escape(_SEPARATOR_CHARS) + r"]+")
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """Light suffix stripping so "jobs", "learning" and "courses" match their keywords."""
+    if len(token) <= 3:
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        token = token[:-3] + "y"
+    elif token.endswith("ing") and len(token) > 5:
+        token = token[:-3]
+    elif token.endswith("ed") and len(token) > 4:
+        token = token[:-2]
+    elif token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        token = token[:-1]
+    if token.endswith("e") and len(token) > 3:
+        token = token[:-1]
+    return token
+
+
+def words(text: str) -> List[str]:
+    return text.casefold().translate(_SEPARATORS).split()
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(w) for w in words(text)]
+
+
+# Stemmed words that carry no topic of their own
+STOPWORDS = frozenset(tokenize(
+    "a an and are as at be been but by can could for from has have how i if in into is it its may "
+    "more most of on or our should so such than that the their them there these they this those to "
+    "was we were what when which while who will with would you your also very just"
+))
+
+
+class KeywordRouter:
+    """One agent's keyword rules, matched against whole stemmed words of the query.
+
+    The query is never split into words. Each rule's root (its first word's
+    stem, less a final "y" so that "vacancies" contains "vacanc") is found with
+    C-level substring search in the casefolded query, and only the words
+    starting there are cut out and stemmed. A rule whose root does not occur
+    costs one scan, and a target is settled by the first matching word.
+    Phrase rules are checked against word order only when their first word is
+    present.
+    """
+
+    def __init__(self, rules: Dict[str, Iterable[str]]):
+        # (target, root, stemmed words of the rule)
+        self._rules: List[Tuple[str, str, Tuple[str, ...]]] = []
+        for target, phrases in rules.items():
+            for phrase in phrases:
+                tokens = tuple(tokenize(phrase))
+                if tokens:
+                    self._rules.append((target, tokens[0].rstrip("y") or tokens[0], tokens))
+
+    @classmethod
+    def for_agent(cls, name: str) -> "KeywordRouter":
+        """The routing rules `name` forwards queries on."""
+        return cls(AGENT_KEYWORDS[name])
+
+    def route(self, text: str) -> Set[str]:
+        lowered = text.casefold()
+        targets: Set[str] = set()
+        tokens = None
+        for target, root, phrase in self._rules:
+            if target in targets:
+                continue
+            start = lowered.find(root)
+            if start == -1 or not _has_word(lowered, root, phrase[0], start):
+                continue
+            if len(phrase) > 1:
+                tokens = tokens if tokens is not None else tokenize(text)
+                if not _contains_phrase(tokens, phrase):
+                    continue
+            targets.add(target)
+        return targets
+
+
+def _has_word(lowered: str, root: str, stemmed: str, start: int) -> bool:
+    """Whether a word of `lowered` stems to `stemmed`; every such word starts with `root`, first found at `start`."""
+    while start != -1:
+        if start == 0 or lowered[start - 1].isspace() or lowered[start - 1] in _SEPARATOR_CHARS:
+            if stem(_WORD.match(lowered, start).group()) == stemmed:
+                return True
+        start = lowered.find(root, start + 1)
+    return False
+
+
+def _contains_phrase(tokens: List[str], phrase: Tuple[str, ...]) -> bool:
+    n = len(phrase)
+    return any(tuple(tokens[i:i + n]) == phrase for i, t in enumerate(tokens) if t == phrase[0])
+
+
+def addresses_for(names: Set[str], subagents: Dict[str, str]) -> List[str]:
+    """Map routed agent names back to addresses, keeping the registry's order."""
+    return [address for address, name in subagents.items() if name in names]
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, List, Optional
+
+# Sustained ASI1 requests per minute allowed per API key, and the burst above it
+RATE_PER_MINUTE = float(os.getenv("ASI1_RATE_PER_MINUTE", "120"))
+BURST = int(os.getenv("ASI1_BURST", "20"))
+
+# Priorities, most urgent first. A call's priority is how far it is from the
+# user: the answer to a user's own request, then what the Commander asks its
+# specialists, then what the specialists ask each other.
+FINAL = 0
+SECTION = 1
+ENRICHMENT = 2
+
+# Recent queue waits kept per priority for the stats
+_WAIT_SAMPLES = 200
+
+
+def priority_for(hops: int) -> int:
+    """Priority of a call made while answering a TaskRequest that travelled `hops` forwards."""
+    return min(max(hops, FINAL), ENRICHMENT)
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self):
+        """Spend the whole budget, e.g. after the provider answered 429."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class Scheduler:
+    """Admits ASI1 calls for one API key: token bucket, priorities, fair share per session.
+
+    Callers wait in `slot(priority, session)` until the call may start. Free
+    slots (at most `concurrency` calls at once, and only while the bucket has
+    a token) go to the most urgent priority first. Within a priority, sessions
+    take turns, one call each, so one request's fan-out cannot starve another's.
+    """
+
+    def __init__(self, rate_per_minute: float = RATE_PER_MINUTE, burst: int = BURST, concurrency: int = 8):
+        self.bucket = TokenBucket(rate_per_minute / 60, burst)
+        self.concurrency = concurrency
+        self.running = 0
+        self.admitted = 0
+        self.throttled = 0
+        self._queues: List["OrderedDict[Optional[str], Deque[asyncio.Future]]"] = [
+            OrderedDict() for _ in range(ENRICHMENT + 1)
+        ]
+        self._waits: List[Deque[float]] = [deque(maxlen=_WAIT_SAMPLES) for _ in range(ENRICHMENT + 1)]
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    @asynccontextmanager
+    async def slot(self, priority: int = ENRICHMENT, session: Optional[str] = None):
+        await self.acquire(priority, session)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority: int = ENRICHMENT, session: Optional[str] = None):
+        priority = min(max(priority, FINAL), ENRICHMENT)
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(session, deque()).append(waiter)
+        queued = time.monotonic()
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the caller gave up: hand the slot on
+                self.release()
+            else:
+                self._forget(priority, session, waiter)
+            raise
+        self._waits[priority].append(time.monotonic() - queued)
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _forget(self, priority: int, session: Optional[str], waiter: asyncio.Future):
+        queue = self._queues[priority]
+        waiters = queue.get(session)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del queue[session]
+
+    def _next(self) -> Optional[asyncio.Future]:
+        """Oldest waiter of the next session in turn at the most urgent non-empty priority."""
+        for queue in self._queues:
+            while queue:
+                session, waiters = next(iter(queue.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(session)
+                else:
+                    del queue[session]
+                if not waiter.done():
+                    return waiter
+        return None
+
+    def _dispatch(self):
+        while self.running < self.concurrency and self.depth():
+            wait = self.bucket.take()
+            if wait:
+                self.throttled += 1
+                if self._wakeup is None:
+                    self._wakeup = asyncio.get_running_loop().call_later(wait, self._woken)
+                return
+            waiter = self._next()
+            if waiter is None:
+                # Only cancelled waiters were left; give the token back
+                self.bucket.tokens = min(self.bucket.burst, self.bucket.tokens + 1)
+                return
+            self.running += 1
+            self.admitted += 1
+            waiter.set_result(None)
+
+    def _woken(self):
+        self._wakeup = None
+        self._dispatch()
+
+    def depth(self, priority: Optional[int] = None) -> int:
+        queues = self._queues if priority is None else [self._queues[priority]]
+        return sum(len(waiters) for queue in queues for waiters in queue.values())
+
+    def stats(self) -> dict:
+        waits = {}
+        for priority, name in enumerate(("final", "section", "enrichment")):
+            samples = sorted(self._waits[priority])
+            waits[name] = {
+                "queued": self.depth(priority),
+                "mean_wait": sum(samples) / len(samples) if samples else 0.0,
+                "p95_wait": samples[int(0.95 * (len(samples) - 1))] if samples else 0.0
+            }
+        return {
+            "running": self.running,
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "tokens": round(self.bucket.tokens, 2),
+            "priorities": waits
+        }
@@ -0,0 +1,62 @@
+import os
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+# In-flight requests older than this are dropped
+SESSION_TTL = float(os.getenv("SESSION_TTL", "600"))
+# Most in-flight requests kept; beyond this the oldest is dropped
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class SessionStore:
+    """Per-request fan-out state, keyed by request ID and expired after `ttl` seconds.
+
+    At most `max_entries` sessions are kept. Every session lives for the same
+    `ttl`, so insertion order is expiry order and the oldest is dropped first.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, max_entries: int = SESSION_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evicted = 0
+        self._sessions: Dict[str, Tuple[float, dict]] = {}
+
+    def open(self, **state) -> Tuple[str, dict]:
+        """Start a session under a fresh request ID and return (request_id, state)."""
+        request_id = new_request_id()
+        while len(self._sessions) >= self.max_entries:
+            del self._sessions[next(iter(self._sessions))]
+            self.evicted += 1
+        self._sessions[request_id] = (time.monotonic() + self.ttl, state)
+        return request_id, state
+
+    def get(self, request_id: Optional[str]) -> Optional[dict]:
+        entry = self._sessions.get(request_id) if request_id else None
+        if entry is None:
+            return None
+        expires, state = entry
+        if expires <= time.monotonic():
+            del self._sessions[request_id]
+            return None
+        return state
+
+    def close(self, request_id: str):
+        self._sessions.pop(request_id, None)
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        expired = [rid for rid, (expires, _) in self._sessions.items() if expires <= now]
+        for rid in expired:
+            del self._sessions[rid]
+        return len(expired)
+
+    def stats(self) -> dict:
+        return {"open": len(self._sessions), "evicted": self.evicted}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
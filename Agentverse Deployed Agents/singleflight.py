@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+
+class _Flight:
+    """One outstanding call whose output any number of callers can follow."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.started = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def push(self, part: str):
+        self.parts.append(part)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[str]:
+        seen = 0
+        while True:
+            while seen < len(self.parts):
+                yield self.parts[seen]
+                seen += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._wakeup.wait()
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one.
+
+    The first caller for a key starts the call in its own task; everyone who
+    asks for the same key before it finishes follows that call's output
+    (streamed parts included) instead of starting another. A caller that stops
+    listening does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.duplicates = 0
+        self.saved_seconds = 0.0
+
+    def join(self, key: str, produce: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None:
+            self.calls += 1
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.ensure_future(self._run(key, flight, produce()))
+        else:
+            self.duplicates += 1
+            flight.followers += 1
+        return flight.follow()
+
+    async def _run(self, key: str, flight: _Flight, source: AsyncIterator[str]):
+        try:
+            async for part in source:
+                flight.push(part)
+        except BaseException as e:
+            flight.finish(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        else:
+            flight.finish()
+        finally:
+            del self._flights[key]
+            # Each follower would otherwise have spent the whole call duration on its own request
+            self.saved_seconds += flight.followers * (time.monotonic() - flight.started)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "duplicates": self.duplicates,
+            "in_flight": len(self._flights),
+            "saved_seconds": round(self.saved_seconds, 3)
+        }
+
+    def __len__(self) -> int:
+        return len(self._flights)
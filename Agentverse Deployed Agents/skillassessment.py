@@ -1,14 +1,37 @@
 from uagents import Agent, Context, Model
-import os
-import requests
-import json
-from typing import Dict
-
-# ASI1 API Key
-asi1_api_key = os.getenv("ASI1_API_KEY")
+from typing import Dict, List, Optional
+import asyncio
+from asi1client import ASI1Client, ASI1Error, close_pool
+from completioncache import CompletionCache
+from enrichment import Enricher
+from streaming import StreamRelay
+from sessions import SessionStore
+from fanin import ScatterGather, FANIN_DEADLINE
+from router import KeywordRouter, addresses_for
+from hops import HopGuard
+from scheduler import priority_for
+from promptbudget import InsightBudget
+from tracing import Tracer
+import tracing
+from metrics import AgentMetrics
+from answercache import AnswerCache
+import answercache
+
+# ASI1 client (reads ASI1_API_KEY from the environment)
+asi1 = ASI1Client(temperature=0.7, cache=CompletionCache(ttl=24 * 3600))
+
+# Sub-agent insights are merged into the assessment once they arrive
+ROLE = "Skill Assessment expert"
+enricher = Enricher(asi1)
+
+# Spans for every step of a query (written to TRACE_FILE when set)
+tracer = Tracer("Skill Assessment")
+
+# Prometheus metrics (served on METRICS_PORT or written to METRICS_FILE when set)
+metrics = AgentMetrics("Skill Assessment")
 
 # Agent Initialization
-skill_assessment = Agent(name="skill_assessment", seed="skill_assessment_secret_seed")
+skill_assessment = Agent(name="skill_assessment", seed="skill_assessment_secret_seed", handle_messages_concurrently=True)
 
 # Sub-agents
 SUBAGENTS = {
@@ -18,108 +41,162 @@ SUBAGENTS = {
     "agent1qv4xn6kxtylzyvf5zc4ywx4qcq2g3q6cp2mpvz8twkwmtnm27gl6xp9x7av": "Job Matching"
 }
 
+# Keyword routing to the sub-agents above
+router = KeywordRouter.for_agent("Skill Assessment")
+
+# Hop budget and cycle check for forwarded requests
+hop_guard = HopGuard()
+
+# Token budget for each sub-agent's insights in the merge prompt
+insight_budget = InsightBudget()
+
 # Models
 class TaskRequest(Model):
     query: str
+    stream: bool = False
+    request_id: Optional[str] = None
+    hops: int = 0
+    visited: List[str] = []
+    trace: Optional[str] = None
 
 class TaskResponse(Model):
     result: str
+    request_id: Optional[str] = None
+    trace: Optional[str] = None
+
+class TaskResponseChunk(Model):
+    result: str
+    seq: int
+    final: bool = False
+    request_id: Optional[str] = None
 
-# Storage keys
-QUERY_KEY = "skill_query"
-SENDER_KEY = "skill_sender"
-RESPONSES_KEY = "skill_responses"
-PENDING_KEY = "pending_agents"
+# Recent final answers, served again to near-identical queries
+answers = AnswerCache(TaskResponse, TaskResponseChunk)
+
+# In-flight requests, keyed by request ID, and the sub-agent replies they await
+sessions = SessionStore()
+fanin = ScatterGather()
 
 # Helper to query ASI1
-async def call_asi1(prompt: str) -> str:
-    headers = {
-        "Authorization": f"Bearer {asi1_api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "asi1-mini",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7,
-        "stream": False
-    }
+async def call_asi1(prompt: str, **admit) -> str:
     try:
-        response = requests.post("https://api.asi1.ai/v1/chat/completions", headers=headers, json=data)
-        return response.json()['choices'][0]['message']['content'] if response.status_code == 200 else f"ASI1 error: {response.text}"
-    except Exception as e:
+        return await asi1.complete(prompt, **admit)
+    except ASI1Error as e:
+        answercache.degraded("asi1")
         return f"ASI1 call failed: {str(e)}"
 
+# Sent models are counted by name; the gauges read these at scrape time
+metrics.models(TaskRequest, TaskResponse, TaskResponseChunk)
+metrics.watch_cache("completions", asi1.cache)
+metrics.watch_cache("answers", answers)
+metrics.watch_fanin(fanin)
+metrics.watch_sessions(sessions)
+
 # Incoming user query
 @skill_assessment.on_message(model=TaskRequest)
+@tracer.handler
+@metrics.handler
+@answers.handler
 async def handle_skill_query(ctx: Context, sender: str, msg: TaskRequest):
     ctx.logger.info(f"📩 Skill Assessment Query Received: {msg.query}")
 
-    ctx.storage.set(QUERY_KEY, msg.query)
-    ctx.storage.set(SENDER_KEY, sender)
-    ctx.storage.set(RESPONSES_KEY, json.dumps({}))
-
-    relevant_agents = []
-    keywords = msg.query.lower()
-    if any(k in keywords for k in ["resume", "cv"]):
-        relevant_agents.append("agent1qvpk7cwgjfdtzfsxv092gcdu0sdsu43z6p0z8nrfckxmcmzd532dgxuy0x5")
-    if any(k in keywords for k in ["trend", "demand", "market"]):
-        relevant_agents.append("agent1qfvyd3y9qf9cmsl2waatsdchumu8gjj2fl6ynuzy0mlqcjwpge6ekp74qen")
-    if any(k in keywords for k in ["course", "training", "certification"]):
-        relevant_agents.append("agent1qvfed9rmxdz4j488gqvannjs6fatpl3u0ehk2kelez6pz8tr2u8nyxjg5kc")
-    if any(k in keywords for k in ["job", "apply", "vacancy"]):
-        relevant_agents.append("agent1qv4xn6kxtylzyvf5zc4ywx4qcq2g3q6cp2mpvz8twkwmtnm27gl6xp9x7av")
+    request_id, session = sessions.open(
+        query=msg.query,
+        sender=sender,
+        reply_id=msg.request_id,
+        stream=msg.stream,
+        priority=priority_for(msg.hops)
+    )
 
-    ctx.storage.set(PENDING_KEY, json.dumps(relevant_agents))
+    hops, visited = hop_guard.next_hop(ctx.agent.address, msg.hops, msg.visited)
+    relevant_agents = hop_guard.allowed(ctx, addresses_for(router.route(msg.query), SUBAGENTS), hops, visited, SUBAGENTS)
 
-    for agent in relevant_agents:
-        await ctx.send(agent, TaskRequest(query=msg.query))
-        ctx.logger.info(f"📤 Sent to sub-agent: {agent}")
+    fanin.expect(request_id, relevant_agents)
+    deadline = asyncio.get_running_loop().time() + FANIN_DEADLINE
 
-    if not relevant_agents:
-        await generate_final_response(ctx)
-
-# Handle sub-agent responses
-@skill_assessment.on_message(model=TaskResponse)
-async def handle_subagent_response(ctx: Context, sender: str, msg: TaskResponse):
-    responses = json.loads(ctx.storage.get(RESPONSES_KEY) or "{}")
-    responses[sender] = msg.result
-    ctx.storage.set(RESPONSES_KEY, json.dumps(responses))
-
-    pending = json.loads(ctx.storage.get(PENDING_KEY) or "[]")
-    if sender in pending:
-        pending.remove(sender)
-        ctx.storage.set(PENDING_KEY, json.dumps(pending))
-
-    if not pending:
-        await generate_final_response(ctx)
-
-# Combine and respond
-async def generate_final_response(ctx: Context):
-    query = ctx.storage.get(QUERY_KEY)
-    sender_address = ctx.storage.get(SENDER_KEY)
-    responses = json.loads(ctx.storage.get(RESPONSES_KEY) or "{}")
-
-    if responses:
-        subagent_summary = "Additional sub-agent insights were included:\n"
-        for k, v in responses.items():
-            name = SUBAGENTS.get(k, k[-6:])
-            subagent_summary += f"\n🔹 {name}:\n{v}\n"
-    else:
-        subagent_summary = "No sub-agent insights were required based on the query.\n"
+    metrics.fan_out(len(relevant_agents))
+    with tracer.span("fan-out", width=len(relevant_agents)) as span:
+        for agent in relevant_agents:
+            await ctx.send(agent, TaskRequest(query=msg.query, request_id=request_id, hops=hops, visited=visited,
+                                              trace=span.context))
+            ctx.logger.info(f"📤 Sent to sub-agent: {agent}")
 
+    # Our own assessment runs while the sub-agents work; their insights are merged in afterwards
     prompt = f"""
 You are a Skill Assessment expert.
 Evaluate the user's query, identify current strengths and weaknesses, benchmark skills against industry needs, and recommend improvements.
 Provide: structured evaluation, gap identification, actionable advice.
 
-Query: "{query}"
-
-{subagent_summary}
+Query: "{msg.query}"
 """
+    admit = dict(priority=session["priority"], session_id=msg.request_id)
+    relay = None
+    if msg.stream:
+        relay = StreamRelay(ctx, sender, TaskResponseChunk, request_id=msg.request_id)
+        try:
+            draft = await relay.relay(asi1.stream(prompt, **admit))
+        except ASI1Error as e:
+            answercache.degraded("asi1")
+            draft = f"ASI1 call failed: {e}"
+            await relay.send(draft)
+    else:
+        draft = await call_asi1(prompt, **admit)
+
+    with tracer.span("wait", kind="wait") as span:
+        results, missing = await fanin.gather(request_id, max(0.0, deadline - asyncio.get_running_loop().time()))
+        span.set(missing=len(missing))
+    if missing:
+        ctx.logger.warning(f"⏰ Sub-agents missed the deadline: {', '.join(SUBAGENTS.get(a, a) for a in missing)}")
+        answercache.degraded("deadline")
 
-    final_result = await call_asi1(prompt)
-    await ctx.send(sender_address, TaskResponse(result=final_result))
-    ctx.logger.info("✅ Final skill assessment response sent.")
+    await generate_final_response(ctx, request_id, draft, results, relay)
+
+# Handle sub-agent responses
+@skill_assessment.on_message(model=TaskResponse)
+@tracer.handler
+@metrics.handler
+async def handle_subagent_response(ctx: Context, sender: str, msg: TaskResponse):
+    if not fanin.resolve(msg.request_id, sender, msg.result):
+        ctx.logger.warning(f"⚠️ Ignoring late or unexpected response from {SUBAGENTS.get(sender, sender)}")
+
+# Merge whatever insights arrived in time into the assessment and respond
+async def generate_final_response(ctx: Context, request_id: str, draft: str, results: Dict[str, str],
+                                  relay: Optional[StreamRelay] = None):
+    session = sessions.get(request_id)
+    if session is None:
+        return
+    sessions.close(request_id)
+
+    query = session["query"]
+    sender_address = session["sender"]
+    insights = {SUBAGENTS.get(k, k[-6:]): v for k, v in insight_budget.fit(ctx, results).items()}
+
+    admit = dict(priority=session["priority"], session_id=session["reply_id"])
+    if relay is not None:
+        with tracer.span("merge", insights=len(insights)):
+            await relay.relay(enricher.stream(ROLE, query, draft, insights, **admit))
+        await relay.finish()
+    else:
+        with tracer.span("merge", insights=len(insights)):
+            section = await enricher.complete(ROLE, query, draft, insights, **admit)
+        with tracer.span("reply"):
+            await ctx.send(sender_address, TaskResponse(result=draft.strip() + section, request_id=session["reply_id"],
+                                                        trace=tracing.context()))
+    ctx.logger.info(f"✅ Final skill assessment response sent ({len(insights)} sub-agent insight(s) merged).")
+
+@skill_assessment.on_interval(period=60.0)
+async def expire_sessions(ctx: Context):
+    expired = sessions.sweep()
+    if expired:
+        ctx.logger.info(f"🧹 Expired {expired} stale request(s)")
+
+@skill_assessment.on_event("startup")
+async def start_metrics(ctx: Context):
+    await metrics.start(ctx)
+
+@skill_assessment.on_event("shutdown")
+async def close_asi1(ctx: Context):
+    await close_pool()
 
 if __name__ == "__main__":
     skill_assessment.run()
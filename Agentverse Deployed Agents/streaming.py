@@ -0,0 +1,42 @@
+import os
+from typing import AsyncIterator, Optional, Type
+
+from uagents import Context, Model
+
+# Deltas are coalesced into chunks of at least this many characters (the
+# first delta is always sent on its own to keep time-to-first-token low).
+MIN_CHUNK_CHARS = int(os.getenv("STREAM_MIN_CHUNK_CHARS", "80"))
+
+
+class StreamRelay:
+    """Forwards text to `recipient` as numbered chunk messages ending with a final marker."""
+
+    def __init__(self, ctx: Context, recipient: str, chunk_model: Type[Model], seq: int = 0,
+                 request_id: Optional[str] = None, min_chars: int = MIN_CHUNK_CHARS):
+        self.ctx = ctx
+        self.recipient = recipient
+        self.chunk_model = chunk_model
+        self.seq = seq
+        self.request_id = request_id
+        self.min_chars = min_chars
+
+    async def send(self, text: str, final: bool = False):
+        chunk = self.chunk_model(result=text, seq=self.seq, final=final, request_id=self.request_id)
+        await self.ctx.send(self.recipient, chunk)
+        self.seq += 1
+
+    async def relay(self, deltas: AsyncIterator[str]) -> str:
+        parts = []
+        pending = ""
+        async for delta in deltas:
+            parts.append(delta)
+            pending += delta
+            if self.seq == 0 or len(pending) >= self.min_chars:
+                await self.send(pending)
+                pending = ""
+        if pending:
+            await self.send(pending)
+        return "".join(parts)
+
+    async def finish(self, text: str = ""):
+        await self.send(text, final=True)
@@ -0,0 +1,98 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from completioncache import normalize_prompt
+
+MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "256"))
+# A refresh that has not come back after this long may be retried
+REFRESH_TIMEOUT = float(os.getenv("TOOL_CACHE_REFRESH_TIMEOUT", "60"))
+
+# Query parameters that only track the visit and never change the page
+_TRACKING_PARAMS = {"from", "vjk", "advn", "fccid", "tk", "sjdu", "acatk"}
+
+
+def normalize_url(url: str) -> str:
+    """Same page, same key: lower-cased host, sorted parameters, normalized search text."""
+    parts = urlsplit(url.strip())
+    params = sorted(
+        (name, normalize_prompt(value) if name == "q" else value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name not in _TRACKING_PARAMS and not name.startswith("utm_")
+    )
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", urlencode(params), ""))
+
+
+class ToolCache:
+    """Size-bounded LRU of scraper / web-search results with stale-while-revalidate.
+
+    `lookup()` returns the cached value and whether the caller should refresh
+    it. Within `fresh_for` seconds a value is served as is; for `stale_for`
+    seconds after that it is still served, and the first caller to see it is
+    asked to fetch a new one in the background and `set()` it. Older entries
+    are misses.
+    """
+
+    def __init__(self, fresh_for: float, stale_for: float = 0.0, max_entries: int = MAX_ENTRIES,
+                 normalize: Callable[[str], str] = normalize_prompt):
+        self.fresh_for = fresh_for
+        self.stale_for = stale_for
+        self.max_entries = max_entries
+        self.normalize = normalize
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing: Dict[str, float] = {}
+
+    def lookup(self, raw_key: str) -> Tuple[Optional[Any], bool]:
+        """Return (value or None, whether to refresh it now)."""
+        key = self.normalize(raw_key)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            stored, value = entry
+            age = now - stored
+            if age < self.fresh_for:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value, False
+            if age < self.fresh_for + self.stale_for:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                started = self._refreshing.get(key)
+                if started is not None and now - started < REFRESH_TIMEOUT:
+                    return value, False
+                self._refreshing[key] = now
+                return value, True
+            del self._entries[key]
+        self.misses += 1
+        return None, False
+
+    def set(self, raw_key: str, value: Any):
+        key = self.normalize(raw_key)
+        self._refreshing.pop(key, None)
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._refreshing.pop(evicted, None)
+
+    def refreshing(self, raw_key: str) -> bool:
+        return self.normalize(raw_key) in self._refreshing
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "refreshing": len(self._refreshing)
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
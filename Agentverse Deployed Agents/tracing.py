@@ -0,0 +1,159 @@
+import functools
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, TextIO
+
+# Spans are appended to this JSONL file, one object per line; tracing is off when unset
+TRACE_FILE = os.getenv("TRACE_FILE")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_out: Optional[TextIO] = None
+
+
+def _export(record: dict):
+    global _out
+    if _out is None:
+        _out = open(TRACE_FILE, "a", buffering=1, encoding="utf-8")
+    _out.write(json.dumps(record) + "\n")
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    """One timed step of a query in one agent. `context` is what travels on messages."""
+
+    def __init__(self, service: str, name: str, trace_id: str, parent_id: Optional[str] = None, **attrs):
+        self.service = service
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self.ended = False
+
+    @property
+    def context(self) -> str:
+        return f"{self.trace_id}-{self.span_id}"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, **attrs):
+        if self.ended:
+            return
+        self.ended = True
+        self.attrs.update(attrs)
+        if TRACE_FILE:
+            end = time.time()
+            _export({
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "service": self.service,
+                "name": self.name,
+                "start": self.start,
+                "end": end,
+                "duration_ms": round((end - self.start) * 1000, 3),
+                "attrs": self.attrs
+            })
+
+
+def parse_context(context: Optional[str]):
+    """(trace_id, parent span_id) from a message's `trace` field, or (None, None)."""
+    if not context or "-" not in context:
+        return None, None
+    trace_id, span_id = context.split("-", 1)
+    return trace_id, span_id
+
+
+class Tracer:
+    """Starts spans for one agent (`service`).
+
+    A span's parent is the `parent` trace context if given (taken from an
+    incoming message or a span kept in a session), else the span currently
+    open in this task, else it starts a new trace. `span()` also makes the new
+    span current, so ASI1 calls made inside it nest under it.
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+
+    def start(self, name: str, parent: Optional[str] = None, **attrs) -> Span:
+        trace_id, parent_id = parse_context(parent)
+        if trace_id is None:
+            current = _current.get()
+            if current is not None:
+                trace_id, parent_id = current.trace_id, current.span_id
+            else:
+                trace_id = uuid.uuid4().hex
+        return Span(self.service, name, trace_id, parent_id, **attrs)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[str] = None, **attrs) -> Iterator[Span]:
+        span = self.start(name, parent, **attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+    def handler(self, func):
+        """Wrap a message handler in a span whose parent is the message's `trace` context."""
+        @functools.wraps(func)
+        async def traced(ctx, sender: str, msg):
+            with self.span(f"handle {type(msg).__name__}", getattr(msg, "trace", None), sender=sender):
+                return await func(ctx, sender, msg)
+        return traced
+
+
+class _NoSpan:
+    """Stands in for a span outside any trace."""
+
+    context = None
+    start = 0.0
+
+    def set(self, **attrs):
+        pass
+
+    def end(self, **attrs):
+        pass
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def context() -> Optional[str]:
+    """Trace context of the current span, for the `trace` field of an outgoing message."""
+    span = _current.get()
+    return span.context if span is not None else None
+
+
+def start_child(name: str, **attrs):
+    """A span under the current one that is not made current (for async generators)."""
+    parent = _current.get()
+    if parent is None:
+        return _NoSpan()
+    return Tracer(parent.service).start(name, parent.context, **attrs)
+
+
+@contextmanager
+def child(name: str, **attrs):
+    """A span under the current one, for shared code that has no Tracer (no-op outside a span)."""
+    parent = _current.get()
+    if parent is None:
+        yield _NoSpan()
+        return
+    with Tracer(parent.service).span(name, parent.context, **attrs) as span:
+        yield span
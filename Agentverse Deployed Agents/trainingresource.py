@@ -1,11 +1,31 @@
 from uagents import Agent, Context, Model
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict, deque
+import asyncio
 import os
-import requests
-import json
-from typing import List
+from asi1client import ASI1Client, ASI1Error, close_pool
+from completioncache import CompletionCache
+from enrichment import Enricher
+from streaming import StreamRelay
+from sessions import SessionStore
+from router import KeywordRouter, addresses_for
+from hops import HopGuard
+from scheduler import priority_for
+from promptbudget import InsightBudget
+from tracing import Tracer
+import tracing
+from metrics import AgentMetrics
+from answercache import AnswerCache
+import answercache
+from toolcache import ToolCache
+from fanin import ScatterGather, FANIN_DEADLINE
 
-# === API Key ===
-asi1_api_key = os.getenv("ASI1_API_KEY")
+# === ASI1 Client (reads ASI1_API_KEY from the environment) ===
+asi1 = ASI1Client(temperature=0.7, cache=CompletionCache(ttl=12 * 3600))
+
+# === Sub-agent insights are merged into the recommendations once they arrive ===
+ROLE = "Training Resource and Upskilling Expert"
+enricher = Enricher(asi1)
 
 # === Sub-Agents ===
 SUBAGENTS = {
@@ -14,14 +34,38 @@ SUBAGENTS = {
     "agent1qv4xn6kxtylzyvf5zc4ywx4qcq2g3q6cp2mpvz8twkwmtnm27gl6xp9x7av": "Job Matching"
 }
 
+# Keyword routing to the sub-agents above
+router = KeywordRouter.for_agent("Training Resource")
+
+# Hop budget and cycle check for forwarded requests
+hop_guard = HopGuard()
+
+# Token budget for each sub-agent's insights in the merge prompt
+insight_budget = InsightBudget()
+
 TAVILY_AGENT_ADDRESS = "agent1qt5uffgp0l3h9mqed8zh8vy5vs374jl2f8y0mjjvqm44axqseejqzmzx9v8"
+# How long to wait for Tavily before answering from ASI1 alone
+SEARCH_DEADLINE = float(os.getenv("TAVILY_DEADLINE", "20"))
 
 # === Models ===
 class TaskRequest(Model):
     query: str
+    stream: bool = False
+    request_id: Optional[str] = None
+    hops: int = 0
+    visited: List[str] = []
+    trace: Optional[str] = None
 
 class TaskResponse(Model):
     result: str
+    request_id: Optional[str] = None
+    trace: Optional[str] = None
+
+class TaskResponseChunk(Model):
+    result: str
+    seq: int
+    final: bool = False
+    request_id: Optional[str] = None
 
 class WebSearchRequest(Model):
     query: str
@@ -35,119 +79,244 @@ class WebSearchResponse(Model):
     query: str
     results: List[WebSearchResult]
 
+# === Recent Answers (served again to near-identical queries) ===
+answers = AnswerCache(TaskResponse, TaskResponseChunk)
+
+# === In-flight Requests ===
+# Tavily answers carry only the search query, so requests waiting on a search
+# are queued per query in send order.
+sessions = SessionStore()
+awaiting_search: Dict[str, deque] = defaultdict(deque)
+
+def forget_search(query: str, request_id: str):
+    """Stop waiting for Tavily's answer to `query` on behalf of `request_id`."""
+    waiting = awaiting_search.get(query)
+    if waiting is None:
+        return
+    if request_id in waiting:
+        waiting.remove(request_id)
+    if not waiting:
+        del awaiting_search[query]
+
+# Tavily results by normalized search query; stale results are served while they are refreshed
+search_cache = ToolCache(fresh_for=6 * 3600, stale_for=18 * 3600)
+
+# Sub-agent replies, and the Tavily response when one is needed, awaited per request
+fanin = ScatterGather()
+
+# Spans for every step of a query (written to TRACE_FILE when set)
+tracer = Tracer("Training Resource")
+
+# Prometheus metrics (served on METRICS_PORT or written to METRICS_FILE when set)
+metrics = AgentMetrics("Training Resource")
+
 # === Agent Initialization ===
-training_resource = Agent(name="training_resource", seed="training_resource_secret_seed")
+training_resource = Agent(name="training_resource", seed="training_resource_secret_seed", handle_messages_concurrently=True)
 
 # === Helper: ASI1 Call ===
-def call_asi1(prompt: str) -> str:
-    headers = {
-        "Authorization": f"Bearer {asi1_api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "asi1-mini",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.7,
-        "stream": False
-    }
+async def call_asi1(prompt: str, fallback: Optional[str] = None, **admit) -> str:
     try:
-        response = requests.post("https://api.asi1.ai/v1/chat/completions", headers=headers, json=data)
-        return response.json()["choices"][0]["message"]["content"]
-    except Exception as e:
-        return f"ASI1 call failed: {e}"
+        return await asi1.complete(prompt, **admit)
+    except ASI1Error as e:
+        answercache.degraded("asi1")
+        return fallback if fallback is not None else f"ASI1 call failed: {e}"
+
+# Sent models are counted by name; the gauges read these at scrape time
+metrics.models(TaskRequest, TaskResponse, TaskResponseChunk, WebSearchRequest)
+metrics.watch_cache("completions", asi1.cache)
+metrics.watch_cache("answers", answers)
+metrics.watch_fanin(fanin)
+metrics.watch_sessions(sessions)
+metrics.watch_cache("search", search_cache)
 
 # === Task Handler ===
 @training_resource.on_message(model=TaskRequest)
+@tracer.handler
+@metrics.handler
+@answers.handler
 async def handle_query(ctx: Context, sender: str, msg: TaskRequest):
     ctx.logger.info(f"📩 Received training resource query: {msg.query}")
-    ctx.storage.set("main_query", msg.query)
-    ctx.storage.set("sender", sender)
-    ctx.storage.set("subagent_results", json.dumps({}))
+    request_id, session = sessions.open(
+        main_query=msg.query,
+        sender=sender,
+        reply_id=msg.request_id,
+        stream=msg.stream,
+        priority=priority_for(msg.hops)
+    )
 
-    try:
-        await ctx.send(TAVILY_AGENT_ADDRESS, WebSearchRequest(query=msg.query))
-        ctx.logger.info("🔍 Sent to Tavily Web Search Agent")
-    except Exception as e:
-        ctx.logger.error(f"❌ Failed to contact Tavily: {e}")
-        await fallback_response(ctx, msg.query, sender)
+    search, refresh = search_cache.lookup(msg.query)
+    if search is None or refresh:
+        try:
+            if search is None:
+                fanin.expect(request_id, [TAVILY_AGENT_ADDRESS])
+                awaiting_search[msg.query].append(request_id)
+                # Tavily's models carry no trace context, so the round trip is timed here
+                session["search_span"] = tracer.start("tavily", query=msg.query[:200])
+            await ctx.send(TAVILY_AGENT_ADDRESS, WebSearchRequest(query=msg.query))
+            ctx.logger.info("🔍 Sent to Tavily Web Search Agent")
+        except Exception as e:
+            ctx.logger.error(f"❌ Failed to contact Tavily: {e}")
+            if search is None:
+                forget_search(msg.query, request_id)
+                fanin.drop(request_id, TAVILY_AGENT_ADDRESS)
+    else:
+        ctx.logger.info("🗂️ Search results served from cache")
 
     # Dispatch relevant sub-agents
-    q = msg.query.lower()
-    if any(k in q for k in ["resume", "cv"]):
-        await ctx.send(list(SUBAGENTS.keys())[0], TaskRequest(query=msg.query))
-    if any(k in q for k in ["market", "demand", "trends"]):
-        await ctx.send(list(SUBAGENTS.keys())[1], TaskRequest(query=msg.query))
-    if any(k in q for k in ["job", "vacancy", "hiring"]):
-        await ctx.send(list(SUBAGENTS.keys())[2], TaskRequest(query=msg.query))
+    hops, visited = hop_guard.next_hop(ctx.agent.address, msg.hops, msg.visited)
+    targets = hop_guard.allowed(ctx, addresses_for(router.route(msg.query), SUBAGENTS), hops, visited, SUBAGENTS)
+    fanin.expect(request_id, targets)
+    deadline = asyncio.get_running_loop().time() + FANIN_DEADLINE
+    metrics.fan_out(len(targets))
+    with tracer.span("fan-out", width=len(targets)) as span:
+        for address in targets:
+            await ctx.send(address, TaskRequest(query=msg.query, request_id=request_id, hops=hops, visited=visited,
+                                                trace=span.context))
+
+    # The recommendations are written as soon as the search (if not cached) is in, while the
+    # sub-agents keep working; their insights are merged in afterwards
+    with tracer.span("wait", kind="wait") as span:
+        if search is None:
+            search = await fanin.wait_for(request_id, TAVILY_AGENT_ADDRESS, SEARCH_DEADLINE)
+        span.set(search=search is not None)
+    if search is None:
+        forget_search(msg.query, request_id)
+        fanin.drop(request_id, TAVILY_AGENT_ADDRESS)
+        ctx.logger.warning("⏰ Tavily missed its deadline; answering without web results")
+        answercache.degraded("search")
+    draft, relay = await recommend(ctx, sender, msg, search, session["priority"])
+
+    with tracer.span("wait", kind="wait") as span:
+        results, missing = await fanin.gather(request_id, max(0.0, deadline - asyncio.get_running_loop().time()))
+        results.pop(TAVILY_AGENT_ADDRESS, None)
+        span.set(missing=len(missing))
+    if missing:
+        ctx.logger.warning(f"⏰ Sub-agents missed the deadline: {', '.join(SUBAGENTS.get(a, a) for a in missing)}")
+        answercache.degraded("deadline")
+
+    await finalize(ctx, request_id, draft, results, relay)
 
 # === Tavily Result Handler ===
 @training_resource.on_message(model=WebSearchResponse)
+@metrics.handler
 async def handle_tavily_response(ctx: Context, sender: str, msg: WebSearchResponse):
     ctx.logger.info("🌐 Tavily response received")
-    ctx.storage.set("search_summary", msg)
-    await maybe_finalize(ctx)
+    refreshed = search_cache.refreshing(msg.query)
+    search_cache.set(msg.query, msg)
+    # The oldest request still waiting on this query gets the results
+    request_id = None
+    waiting = awaiting_search.get(msg.query)
+    while waiting:
+        request_id = waiting.popleft()
+        if sessions.get(request_id) is not None:
+            break
+    if waiting is not None and not waiting:
+        del awaiting_search[msg.query]
+    session = sessions.get(request_id)
+    if session is None:
+        if not refreshed:
+            ctx.logger.warning("⚠️ Tavily response arrived for an unknown or expired request")
+        return
+    round_trip = session.pop("search_span", None)
+    if round_trip is not None:
+        round_trip.end(results=len(msg.results))
+    if not fanin.resolve(request_id, TAVILY_AGENT_ADDRESS, msg):
+        ctx.logger.warning("⚠️ Tavily response arrived after the request was answered")
 
 # === Sub-agent Response Handler ===
 @training_resource.on_message(model=TaskResponse)
+@tracer.handler
+@metrics.handler
 async def handle_subagent_response(ctx: Context, sender: str, msg: TaskResponse):
-    ctx.logger.info(f"📥 Sub-agent response from {sender}")
-    subagent_results = json.loads(ctx.storage.get("subagent_results") or "{}")
-    subagent_results[sender] = msg.result
-    ctx.storage.set("subagent_results", json.dumps(subagent_results))
-    await maybe_finalize(ctx)
-
-# === Finalization ===
-async def maybe_finalize(ctx: Context):
-    sender = ctx.storage.get("sender")
-    query = ctx.storage.get("main_query")
-    search = ctx.storage.get("search_summary")
-    if not sender or not query or not search:
-        return
-
-    result_list = json.loads(ctx.storage.get("subagent_results") or "{}")
+    if fanin.resolve(msg.request_id, sender, msg.result):
+        ctx.logger.info(f"📥 Sub-agent response from {SUBAGENTS.get(sender, sender)}")
+    else:
+        ctx.logger.warning(f"⚠️ Ignoring late or unexpected response from {SUBAGENTS.get(sender, sender)}")
 
-    summary = ""
-    for r in search.results[:3]:
-        summary += f"- {r.title}: {r.content[:200]}...\nURL: {r.url}\n\n"
+# === Recommendations (from the search alone, while the sub-agents work) ===
+async def recommend(ctx: Context, sender: str, msg: TaskRequest, search: Optional[WebSearchResponse],
+                    priority: int) -> Tuple[str, Optional[StreamRelay]]:
+    if search is None:
+        prompt = f"""
+You are a Training Resource Expert.
+Without web data, provide general but helpful suggestions for 3–5 courses or certifications related to:
 
-    subagent_contributions = ""
-    if result_list:
-        subagent_contributions += "\n\n🔍 Additional Insights from other Agents:\n"
-        for aid, res in result_list.items():
-            name = SUBAGENTS.get(aid, "Unknown")
-            subagent_contributions += f"From {name}:\n{res}\n\n"
+"{msg.query}"
+"""
+        degraded = None
     else:
-        subagent_contributions = "\n\n📝 No additional sub-agents were needed."
-
-    asi1_prompt = f"""
+        summary = ""
+        for r in search.results[:3]:
+            summary += f"- {r.title}: {r.content[:200]}...\nURL: {r.url}\n\n"
+        prompt = f"""
 You are a Training Resource and Upskilling Expert.
 Given the user's query and search results, recommend 3–5 top resources (courses, platforms, certifications) that directly align with their goals.
 
-Query: "{query}"
+Query: "{msg.query}"
 
 Search Results:
 {summary}
 
-{subagent_contributions}
-
 Avoid asking for more input. Provide helpful, current, and actionable advice.
 """
+        # If ASI1 is down or the circuit is open, the raw search results are still worth sending
+        degraded = f"Training resources found for \"{msg.query}\" (AI summary currently unavailable):\n\n{summary.strip()}"
 
-    final_response = call_asi1(asi1_prompt)
-    await ctx.send(sender, TaskResponse(result=final_response))
-    ctx.logger.info("✅ Final response sent to Commander.")
+    admit = dict(priority=priority, session_id=msg.request_id)
+    if not msg.stream:
+        return await call_asi1(prompt, fallback=degraded, **admit), None
+    relay = StreamRelay(ctx, sender, TaskResponseChunk, request_id=msg.request_id)
+    try:
+        draft = await relay.relay(asi1.stream(prompt, **admit))
+    except ASI1Error as e:
+        answercache.degraded("asi1")
+        ctx.logger.warning(f"⚠️ ASI1 call failed: {e}")
+        draft = degraded if degraded is not None else f"ASI1 call failed: {e}"
+        await relay.send(draft)
+    return draft, relay
 
-# === Fallback if Tavily fails ===
-async def fallback_response(ctx: Context, query: str, sender: str):
-    prompt = f"""
-You are a Training Resource Expert.
-Without web data, provide general but helpful suggestions for 3–5 courses or certifications related to:
+# === Finalization (once per request) ===
+async def finalize(ctx: Context, request_id: str, draft: str, results: Dict[str, str],
+                   relay: Optional[StreamRelay] = None):
+    session = sessions.get(request_id)
+    if session is None:
+        return
+    sessions.close(request_id)
+    sender = session["sender"]
+    query = session["main_query"]
+    forget_search(query, request_id)
 
-"{query}"
-"""
-    final_response = call_asi1(prompt)
-    await ctx.send(sender, TaskResponse(result=final_response))
-    ctx.logger.info("✅ Fallback ASI1 response sent.")
+    insights = {SUBAGENTS.get(aid, "Unknown"): res for aid, res in insight_budget.fit(ctx, results).items()}
+
+    admit = dict(priority=session["priority"], session_id=session["reply_id"])
+    if relay is not None:
+        with tracer.span("merge", insights=len(insights)):
+            await relay.relay(enricher.stream(ROLE, query, draft, insights, **admit))
+        await relay.finish()
+    else:
+        with tracer.span("merge", insights=len(insights)):
+            section = await enricher.complete(ROLE, query, draft, insights, **admit)
+        with tracer.span("reply"):
+            await ctx.send(sender, TaskResponse(result=draft.strip() + section, request_id=session["reply_id"],
+                                                trace=tracing.context()))
+    ctx.logger.info(f"✅ Final response sent to Commander ({len(insights)} sub-agent insight(s) merged).")
+
+@training_resource.on_interval(period=60.0)
+async def expire_sessions(ctx: Context):
+    expired = sessions.sweep()
+    for query, waiting in list(awaiting_search.items()):
+        for request_id in [r for r in waiting if sessions.get(r) is None]:
+            forget_search(query, request_id)
+    if expired:
+        ctx.logger.info(f"🧹 Expired {expired} stale request(s)")
+
+@training_resource.on_event("startup")
+async def start_metrics(ctx: Context):
+    await metrics.start(ctx)
+
+@training_resource.on_event("shutdown")
+async def close_asi1(ctx: Context):
+    await close_pool()
 
 if __name__ == "__main__":
     training_resource.run()
@@ -1,24 +1,60 @@
 # Required installations:
-# pip install uagents openai python-dotenv requests
-# Add at the top of your script
-from pyngrok import ngrok
+# pip install uagents aiohttp python-dotenv requests pyngrok
+# (pyngrok is only needed in the default "tunnel" deployment mode)
 import time
-ngrok.set_auth_token("2v4pO9ooU8CuoEWeNwZBVUoW8UJ_6oKS9xe2kdrJEio6RWQx4")
+from functools import lru_cache
 
-from uagents import Agent, Context, Model
+from uagents import Agent, Bureau, Context, Model
 from uagents.setup import fund_agent_if_low
 import os
+import sys
 from dotenv import load_dotenv
-import openai
 import json
 import requests
 
+# Shared ASI1 client lives next to the deployed agents
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Agentverse Deployed Agents"))
+from asi1client import ASI1Client, ASI1Error, close_pool
+from completioncache import CompletionCache
+from batching import SectionBatch
+from scheduler import FINAL, SECTION
+from sessions import SessionStore
+from metrics import AgentMetrics
+
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Deployment mode:
+#   "tunnel" (default) - every agent on its own port, exposed through ngrok and registered with Agentverse
+#   "local"            - every agent in one Bureau process; messages between them never leave memory,
+#                        and there are no tunnels, registration or funding
+DEPLOYMENT_MODE = os.getenv("DEPLOYMENT_MODE", "tunnel").lower()
+LOCAL_MODE = DEPLOYMENT_MODE == "local"
+LOCAL_BUREAU_PORT = int(os.getenv("LOCAL_BUREAU_PORT", "8000"))
+
+def network_options(port):
+    """Agent networking settings for the selected deployment mode."""
+    if LOCAL_MODE:
+        # The Bureau owns the only server; nothing to advertise or mark inactive
+        return {"mark_inactive_on_shutdown": False}
+    return {"port": port, "endpoint": None, "mailbox": True}  # endpoint is set dynamically
+
+@lru_cache(maxsize=None)
+def _ngrok():
+    from pyngrok import ngrok
+    ngrok.set_auth_token("2v4pO9ooU8CuoEWeNwZBVUoW8UJ_6oKS9xe2kdrJEio6RWQx4")
+    return ngrok
+
+# Configure ASI1 (reads ASI1_API_KEY from the environment)
+asi1 = ASI1Client(cache=CompletionCache(ttl=3600))
+
+async def ask_asi1(system: str, prompt: str, session_id: str = None) -> str:
+    # Each agent's analysis feeds the orchestrator's consolidated answer
+    try:
+        return await asi1.complete(prompt, system=system, priority=SECTION, session_id=session_id)
+    except ASI1Error as e:
+        return f"ASI1 call failed: {e}"
 
 # Define message models
 class UserQuery(Model):
@@ -28,6 +64,7 @@ class UserQuery(Model):
 class AgentResponse(Model):
     response: str
     agent_name: str
+    user_id: str  # the query ID the orchestrator sent with the UserQuery
 
 class TunnelRequest(Model):
     agent_name: str
@@ -48,9 +85,8 @@ innovation_lab_metadata = {
 orchestrator = Agent(
     name="Career Guidance Orchestrator",
     seed=os.getenv("ORCHESTRATOR_SEED", "orchestrator_secret_seed_phrase"),
-    port=8000,
-    endpoint=None,  # Will be set dynamically
-    mailbox=True,
+    **network_options(8000),
+    handle_messages_concurrently=True,
     metadata={
         **innovation_lab_metadata,
         "description": "Central AI agent that coordinates all career guidance sub-agents and user interaction"
@@ -61,9 +97,8 @@ orchestrator = Agent(
 skill_assessment = Agent(
     name="Skill Assessment Agent",
     seed=os.getenv("SKILL_ASSESSMENT_SEED", "skill_assessment_secret_seed_phrase"),
-    port=8001,
-    endpoint=None,  # Will be set dynamically
-    mailbox=True,
+    **network_options(8001),
+    handle_messages_concurrently=True,
     metadata={
         **innovation_lab_metadata,
         "description": "Analyzes user aptitude, experience, and interests to determine career readiness"
@@ -74,9 +109,8 @@ skill_assessment = Agent(
 demand_analysis = Agent(
     name="Demand Analysis Agent", 
     seed=os.getenv("DEMAND_ANALYSIS_SEED", "demand_analysis_secret_seed_phrase"),
-    port=8002,
-    endpoint=None,  # Will be set dynamically
-    mailbox=True,
+    **network_options(8002),
+    handle_messages_concurrently=True,
     metadata={
         **innovation_lab_metadata,
         "description": "Fetches real-time job market data to identify in-demand skills by role and location"
@@ -87,9 +121,8 @@ demand_analysis = Agent(
 training_resource = Agent(
     name="Training Resource Agent",
     seed=os.getenv("TRAINING_RESOURCE_SEED", "training_resource_secret_seed_phrase"),
-    port=8003,
-    endpoint=None,  # Will be set dynamically
-    mailbox=True,
+    **network_options(8003),
+    handle_messages_concurrently=True,
     metadata={
         **innovation_lab_metadata,
         "description": "Recommends relevant courses, certifications, and local government programs"
@@ -100,9 +133,8 @@ training_resource = Agent(
 job_matching = Agent(
     name="Job Matching Agent",
     seed=os.getenv("JOB_MATCHING_SEED", "job_matching_secret_seed_phrase"),
-    port=8004,
-    endpoint=None,  # Will be set dynamically
-    mailbox=True,
+    **network_options(8004),
+    handle_messages_concurrently=True,
     metadata={
         **innovation_lab_metadata,
         "description": "Finds tailored job listings from portals based on user profile and preferences"
@@ -113,14 +145,22 @@ job_matching = Agent(
 personal_assistant = Agent(
     name="Personal Career Assistant",
     seed=os.getenv("PERSONAL_ASSISTANT_SEED", "assistant_secret_seed_phrase"),
-    port=8005,
-    endpoint=None,  # Will be set dynamically
-    mailbox=True,
+    **network_options(8005),
+    handle_messages_concurrently=True,
     metadata={
         **innovation_lab_metadata,
         "description": "Personalized assistant that coordinates between specialized career agents"
     }
 )
+
+# Prometheus metrics per agent (served on METRICS_PORT or written to METRICS_FILE when set)
+orchestrator_metrics = AgentMetrics(orchestrator.name)
+skill_assessment_metrics = AgentMetrics(skill_assessment.name)
+demand_analysis_metrics = AgentMetrics(demand_analysis.name)
+training_resource_metrics = AgentMetrics(training_resource.name)
+job_matching_metrics = AgentMetrics(job_matching.name)
+orchestrator_metrics.models(UserQuery, AgentResponse, TunnelRequest, TunnelResponse)
+orchestrator_metrics.watch_cache("completions", asi1.cache)
 # Add this function to your code
 def ensure_agent_funding(agent):
     from uagents.setup import fund_agent_if_low
@@ -129,12 +169,13 @@ def ensure_agent_funding(agent):
     print(f"Funding complete for {agent.name}")
 
 # Call this function for each agent before running them
-ensure_agent_funding(orchestrator)
-ensure_agent_funding(skill_assessment)
-ensure_agent_funding(demand_analysis)
-ensure_agent_funding(training_resource)
-ensure_agent_funding(job_matching)
-ensure_agent_funding(personal_assistant)
+if not LOCAL_MODE:
+    ensure_agent_funding(orchestrator)
+    ensure_agent_funding(skill_assessment)
+    ensure_agent_funding(demand_analysis)
+    ensure_agent_funding(training_resource)
+    ensure_agent_funding(job_matching)
+    ensure_agent_funding(personal_assistant)
 
 # Tunnel Manager Class
 class TunnelManager:
@@ -158,7 +199,7 @@ class TunnelManager:
         """Release a tunnel for an agent."""
         if agent_name in self.active_tunnels:
             try:
-                ngrok.disconnect(self.active_tunnels[agent_name].public_url)
+                _ngrok().disconnect(self.active_tunnels[agent_name].public_url)
                 del self.active_tunnels[agent_name]
                 del self.endpoints[agent_name]
                 
@@ -176,7 +217,7 @@ class TunnelManager:
     def _create_tunnel(self, agent_name, port):
         """Create a new tunnel for an agent."""
         try:
-            tunnel = ngrok.connect(port)
+            tunnel = _ngrok().connect(port)
             self.active_tunnels[agent_name] = tunnel
             endpoint = f"{tunnel.public_url}/submit"
             self.endpoints[agent_name] = endpoint
@@ -191,6 +232,10 @@ class TunnelManager:
 # Create tunnel manager
 tunnel_manager = TunnelManager(max_tunnels=3)
 
+def is_reachable(agent):
+    """In local mode every agent is reachable; otherwise only those holding a tunnel."""
+    return LOCAL_MODE or tunnel_manager.get_endpoint(agent.name) is not None
+
 # Register all agents with Agentverse
 # Function to manually register agents with Agentverse
 def register_agent_manually(agent, api_key):
@@ -254,154 +299,179 @@ def register_agent_with_tunnel(agent, tunnel_manager):
 
 # Skill Assessment Agent functionality
 @skill_assessment.on_message(UserQuery, replies=AgentResponse)
+@skill_assessment_metrics.handler
 async def handle_skill_assessment(ctx: Context, sender: str, msg: UserQuery):
     ctx.logger.info(f"Skill Assessment Agent received: {msg.query}")
     
-    # Use OpenAI to analyze skills
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a career skills assessment expert. Analyze the user's skills and experience."},
-            {"role": "user", "content": msg.query}
-        ]
+    # Use ASI1 to analyze skills
+    analysis = await ask_asi1(
+        "You are a career skills assessment expert. Analyze the user's skills and experience.",
+        msg.query,
+        msg.user_id
     )
     
-    analysis = response.choices[0].message['content']
-    
     await ctx.send(
         sender,
-        AgentResponse(response=analysis, agent_name="Skill Assessment")
+        AgentResponse(response=analysis, agent_name="Skill Assessment", user_id=msg.user_id)
     )
 
 # Demand Analysis Agent functionality
 @demand_analysis.on_message(UserQuery, replies=AgentResponse)
+@demand_analysis_metrics.handler
 async def handle_demand_analysis(ctx: Context, sender: str, msg: UserQuery):
     ctx.logger.info(f"Demand Analysis Agent received: {msg.query}")
     
     # Simulate fetching job market data (in a real implementation, you'd connect to an API)
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a job market analyst. Provide information about current job market trends."},
-            {"role": "user", "content": f"What are the current job market trends for someone with these skills and interests: {msg.query}"}
-        ]
+    analysis = await ask_asi1(
+        "You are a job market analyst. Provide information about current job market trends.",
+        f"What are the current job market trends for someone with these skills and interests: {msg.query}",
+        msg.user_id
     )
     
-    analysis = response.choices[0].message['content']
-    
     await ctx.send(
         sender,
-        AgentResponse(response=analysis, agent_name="Demand Analysis")
+        AgentResponse(response=analysis, agent_name="Demand Analysis", user_id=msg.user_id)
     )
 
 # Training Resource Agent functionality
 @training_resource.on_message(UserQuery, replies=AgentResponse)
+@training_resource_metrics.handler
 async def handle_training_resource(ctx: Context, sender: str, msg: UserQuery):
     ctx.logger.info(f"Training Resource Agent received: {msg.query}")
     
-    # Use OpenAI to suggest learning resources
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a career coach providing learning resources. Suggest online courses, books, or tutorials for skill enhancement."},
-            {"role": "user", "content": f"Suggest learning resources for improving skills in: {msg.query}"}
-        ]
+    # Use ASI1 to suggest learning resources
+    resources = await ask_asi1(
+        "You are a career coach providing learning resources. Suggest online courses, books, or tutorials for skill enhancement.",
+        f"Suggest learning resources for improving skills in: {msg.query}",
+        msg.user_id
     )
     
-    resources = response.choices[0].message['content']
-    
     await ctx.send(
         sender,
-        AgentResponse(response=resources, agent_name="Training Resource")
+        AgentResponse(response=resources, agent_name="Training Resource", user_id=msg.user_id)
     )
 
 # Job Matching Agent functionality
 @job_matching.on_message(UserQuery, replies=AgentResponse)
+@job_matching_metrics.handler
 async def handle_job_matching(ctx: Context, sender: str, msg: UserQuery):
     ctx.logger.info(f"Job Matching Agent received: {msg.query}")
     
-    # Use OpenAI to match jobs (in real-world, integrate with job listing APIs)
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a job matching assistant. Find suitable job roles based on the user's skills and preferences."},
-            {"role": "user", "content": f"Find job opportunities for someone with these skills and preferences: {msg.query}"}
-        ]
+    # Use ASI1 to match jobs (in real-world, integrate with job listing APIs)
+    job_listings = await ask_asi1(
+        "You are a job matching assistant. Find suitable job roles based on the user's skills and preferences.",
+        f"Find job opportunities for someone with these skills and preferences: {msg.query}",
+        msg.user_id
     )
     
-    job_listings = response.choices[0].message['content']
-    
     await ctx.send(
         sender,
-        AgentResponse(response=job_listings, agent_name="Job Matching")
+        AgentResponse(response=job_listings, agent_name="Job Matching", user_id=msg.user_id)
     )
 
-# Store all responses for a user query
-user_responses = {}
+# Optional batched mode: the orchestrator asks ASI1 for every active agent's
+# analysis in one multi-section call instead of messaging each agent
+BATCH_ANALYSES = os.getenv("BATCH_ANALYSES", "false").lower() in ("1", "true", "yes")
+section_batch = SectionBatch(asi1)
+BATCH_SECTIONS = {
+    skill_assessment.address: ("Skill Assessment", "As a career skills assessment expert, analyze the user's skills and experience."),
+    demand_analysis.address: ("Demand Analysis", "As a job market analyst, describe the current job market trends for someone with these skills and interests."),
+    training_resource.address: ("Training Resource", "As a career coach, suggest online courses, books, or tutorials for improving these skills."),
+    job_matching.address: ("Job Matching", "As a job matching assistant, find suitable job roles based on the user's skills and preferences.")
+}
+
+def response_key(agent_name):
+    return agent_name.lower().replace(" ", "_")
+
+def consolidate(responses):
+    consolidated = "Career Guidance Summary:\n\n"
+    for agent_name, response in responses.items():
+        if response is not None:
+            consolidated += f"{agent_name.replace('_', ' ').title()}: {response}\n\n"
+    return consolidated
+
+# Responses collected per query, keyed by query ID (expired after SESSION_TTL,
+# at most SESSION_MAX_ENTRIES queries at once)
+pending_queries = SessionStore()
+orchestrator_metrics.watch_sessions(pending_queries)
 
 # Orchestrator handling - modified to use active agents
 @orchestrator.on_message(UserQuery)
+@orchestrator_metrics.handler
 async def handle_orchestration(ctx: Context, sender: str, msg: UserQuery):
     ctx.logger.info(f"Orchestrator received query: {msg.query}")
     
-    # Initialize responses dictionary for this query
-    query_id = f"{msg.user_id}_{len(user_responses)}"
-    user_responses[query_id] = {
-        "skill_assessment": None,
-        "demand_analysis": None,
-        "training_resource": None,
-        "job_matching": None
-    }
-    
     # Get active agents
     active_agents = [agent for agent in [skill_assessment, demand_analysis, training_resource, job_matching]
-                     if tunnel_manager.get_endpoint(agent.name)]
+                     if is_reachable(agent)]
     
+    # Track this query under its own ID; agents echo it back on their AgentResponse
+    query_id, query = pending_queries.open(
+        sender=sender,
+        user_id=msg.user_id,
+        responses={response_key(BATCH_SECTIONS[agent.address][0]): None for agent in active_agents}
+    )
+    
+    if BATCH_ANALYSES and len(active_agents) > 1:
+        sections = dict(BATCH_SECTIONS[agent.address] for agent in active_agents)
+        answers = await section_batch.complete(msg.query, sections, priority=FINAL, session_id=query_id)
+        pending_queries.close(query_id)
+        query["responses"].update({response_key(name): text for name, text in answers.items()})
+        consolidated = consolidate(query["responses"])
+        ctx.logger.info(f"Consolidated response ready ({len(sections)} analyses batched into one ASI1 call)")
+        await ctx.send(sender, UserQuery(query=consolidated, user_id=msg.user_id))
+        return
+
     # Send the query to all active agents
+    orchestrator_metrics.fan_out(len(active_agents))
     for agent in active_agents:
         await ctx.send(agent.address, UserQuery(query=msg.query, user_id=query_id))
         ctx.logger.info(f"Sent query to {agent.name}")
 
 # Handle agent responses
 @orchestrator.on_message(AgentResponse)
+@orchestrator_metrics.handler
 async def handle_agent_response(ctx: Context, sender: str, msg: AgentResponse):
     ctx.logger.info(f"Received response from {msg.agent_name}")
     
-    # In a real implementation, you would parse the user_id from the response
-    # For simplicity, we'll use a global variable here
-    current_query_id = list(user_responses.keys())[-1]
+    query = pending_queries.get(msg.user_id)
+    if query is None:
+        ctx.logger.warning(f"Dropping {msg.agent_name} response for unknown or expired query {msg.user_id}")
+        return
     
     # Store the response
-    user_responses[current_query_id][msg.agent_name.lower().replace(" ", "_")] = msg.response
-    
-    # Check if we have all responses from active agents
-    responses = user_responses[current_query_id]
-    active_agents = [agent.name.lower().replace(" ", "_") for agent in [skill_assessment, demand_analysis, training_resource, job_matching]
-                     if tunnel_manager.get_endpoint(agent.name)]
+    responses = query["responses"]
+    key = response_key(msg.agent_name)
+    if key not in responses:
+        ctx.logger.warning(f"Dropping unexpected {msg.agent_name} response for query {msg.user_id}")
+        return
+    responses[key] = msg.response
     
-    all_received = True
-    for agent_name in active_agents:
-        if responses.get(agent_name) is None:
-            all_received = False
-            break
+    # Check if we have all responses from the agents the query was sent to
+    all_received = all(response is not None for response in responses.values())
     
     if all_received:
-        # Generate a consolidated response
-        consolidated = "Career Guidance Summary:\n\n"
+        pending_queries.close(msg.user_id)
         
-        for agent_name, response in responses.items():
-            if response is not None:
-                consolidated += f"{agent_name.replace('_', ' ').title()}: {response}\n\n"
+        # Generate a consolidated response
+        consolidated = consolidate(responses)
         
         # In a real implementation, you would send this back to the user interface
         ctx.logger.info("Consolidated response ready")
         ctx.logger.info(consolidated)
         
-        # Optionally, you could send this back to the user via a message or email
-        await ctx.send(sender, UserQuery(query=consolidated, user_id=current_query_id))
+        # Reply to whoever sent the query, not to the agent that answered last
+        await ctx.send(query["sender"], UserQuery(query=consolidated, user_id=query["user_id"]))
+
+@orchestrator.on_interval(period=60.0)
+async def expire_queries(ctx: Context):
+    expired = pending_queries.sweep()
+    if expired:
+        ctx.logger.info(f"Expired {expired} unanswered quer{'y' if expired == 1 else 'ies'}")
 
 # Custom tunnel request handler for orchestrator
 @orchestrator.on_message(TunnelRequest, replies=TunnelResponse)
+@orchestrator_metrics.handler
 async def handle_tunnel_request(ctx: Context, sender: str, msg: TunnelRequest):
     # Request a tunnel for the agent
     endpoint, message = tunnel_manager.request_tunnel(msg.agent_name, msg.port)
@@ -437,6 +507,24 @@ def rotate_tunnels(release_agent_name, request_agent_name, request_port):
     return endpoint, message
 import asyncio
 
+ALL_AGENTS = [orchestrator, skill_assessment, demand_analysis, training_resource, job_matching, personal_assistant]
+
+@orchestrator.on_event("startup")
+async def start_metrics(ctx: Context):
+    await orchestrator_metrics.start(ctx)
+
+@orchestrator.on_event("shutdown")
+async def close_asi1(ctx: Context):
+    await close_pool()
+
+def run_local():
+    # One process, one server: agents in the Bureau reach each other in memory
+    bureau = Bureau(agents=ALL_AGENTS, port=LOCAL_BUREAU_PORT)
+    print(f"Starting {len(ALL_AGENTS)} agents in a local Bureau on port {LOCAL_BUREAU_PORT}...")
+    for agent in ALL_AGENTS:
+        print(f"  {agent.name}: {agent.address}")
+    bureau.run()
+
 async def run_all_agents():
     # Start all agents concurrently
     tasks = [
@@ -447,9 +535,15 @@ async def run_all_agents():
         job_matching.run_async(),
         personal_assistant.run_async()
     ]
-    await asyncio.gather(*tasks)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await close_pool()
+
+if __name__ == "__main__" and LOCAL_MODE:
+    run_local()
 
-if __name__ == "__main__":
+elif __name__ == "__main__":
     # Initialize the tunnel manager
     print("Initializing tunnel manager...")
     
@@ -460,7 +554,7 @@ if __name__ == "__main__":
     register_agent_with_tunnel(demand_analysis, tunnel_manager)
     
     # Ensure funding for all agents
-    for agent in [orchestrator, skill_assessment, demand_analysis, training_resource, job_matching, personal_assistant]:
+    for agent in ALL_AGENTS:
         ensure_agent_funding(agent)
     
     # Start the agents
@@ -0,0 +1,79 @@
+"""Micro-benchmark: AnswerCache lookups as the cache grows to a few hundred thousand answers.
+
+Run from the repository root:
+    python benchmarks/bench_answercache.py --entries 300000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Agentverse Deployed Agents"))
+from answercache import AnswerCache
+from uagents import Model
+
+
+class TaskResponse(Model):
+    result: str
+
+
+class TaskResponseChunk(Model):
+    result: str
+    seq: int
+    final: bool = False
+
+
+ROLES = ["data analyst", "backend developer", "product manager", "devops engineer", "ux designer",
+         "machine learning engineer", "business analyst", "qa engineer", "data scientist", "cloud architect"]
+CITIES = ["Mumbai", "Bengaluru", "Pune", "Hyderabad", "Delhi", "Chennai", "Kolkata", "Noida", "remote"]
+TOPICS = ["jobs", "skill gaps", "courses", "certifications", "salary trends", "resume tips", "interview prep"]
+NEW_ROLES = ["civil engineer", "chartered accountant", "content writer", "nurse", "pharmacist"]
+EXTRAS = ("python sql excel tableau aws azure spark kubernetes react java golang figma jira scrum fintech "
+          "healthcare startup mnc fresher senior junior internship contract parttime").split()
+
+
+def make_query(rng: random.Random, roles=ROLES) -> str:
+    extras = " ".join(rng.sample(EXTRAS, rng.randint(1, 4)))
+    return f"{rng.choice(TOPICS)} for {rng.choice(roles)} in {rng.choice(CITIES)} with {extras}"
+
+
+def reword(query: str) -> str:
+    return "Please show me the latest " + query.upper().replace("MUMBAI", "Bombay").replace("BENGALURU", "Bangalore")
+
+
+def timed(cache: AnswerCache, queries) -> tuple:
+    hits = 0
+    started = time.perf_counter()
+    for query in queries:
+        hits += cache.lookup(query) is not None
+    return (time.perf_counter() - started) / len(queries), hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=300000, help="answers to fill the cache with")
+    parser.add_argument("--lookups", type=int, default=20000, help="lookups to time of each kind")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    cache = AnswerCache(TaskResponse, TaskResponseChunk, fresh_for=3600, max_entries=args.entries)
+    stored = []
+    started = time.perf_counter()
+    while len(cache) < args.entries:
+        query = make_query(rng)
+        cache.store(query, f"answer to {query}")
+        stored.append(query)
+    took = time.perf_counter() - started
+    print(f"Stored {len(cache)} answers in {took:.1f}s ({took / len(stored) * 1e6:.0f} us each)")
+
+    reworded = [reword(rng.choice(stored)) for _ in range(args.lookups)]
+    # Same topics and cities, a role nobody asked about yet
+    fresh = [make_query(rng, NEW_ROLES) for _ in range(args.lookups)]
+    for name, queries in (("reworded (hit)", reworded), ("new role (miss)", fresh)):
+        per_lookup, hits = timed(cache, queries)
+        print(f"{name:<16} {per_lookup * 1e6:>7.1f} us/lookup  {hits / len(queries):>6.1%} served")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Micro-benchmark: each agent's KeywordRouter vs. the keyword scan that agent used to run.
+
+Every agent routes a query once, in its own process, so each agent's old scan
+is timed against `route` with that agent's own rules.
+
+Run from the repository root:
+    python benchmarks/bench_router.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Agentverse Deployed Agents"))
+from router import AGENT_KEYWORDS, KeywordRouter
+
+RESUME_WORDS = (
+    "experienced data analyst with python sql tableau excel power bi statistics machine learning "
+    "project managed team delivered dashboards stakeholders reporting automation pipelines cloud aws "
+    "azure communication leadership bachelor degree university intern led migrated optimised"
+).split()
+
+# === Legacy scans, as they were in each agent ===
+COMMANDER_ROUTES = {
+    "Resume Expert": ["resume", "cv"],
+    "Skill Assessment": ["skill", "competitive", "gap", "strength", "weakness"],
+    "Demand Analysis": ["demand", "trend", "market", "growth", "outlook"],
+    "Training Resource": ["course", "certification", "training", "learn", "upskill"],
+    "Job Matching": ["job", "vacancy", "hiring", "opening"]
+}
+
+RESUME_SCANS = [["trend", "demand", "industry"], ["course", "certification", "learning"],
+                ["job", "apply", "vacancy", "hiring"]]
+SKILL_SCANS = [["resume", "cv"], ["trend", "demand", "market"], ["course", "training", "certification"],
+               ["job", "apply", "vacancy"]]
+TRAINING_SCANS = [["resume", "cv"], ["market", "demand", "trends"], ["job", "vacancy", "hiring"]]
+
+DEMAND_MAP = {"resume": "Resume Expert", "cv": "Resume Expert", "gap": "Skill Assessment",
+              "upskill": "Training Resource", "learn": "Training Resource", "course": "Training Resource",
+              "job": "Job Matching", "vacancy": "Job Matching", "hiring": "Job Matching"}
+
+JOB_MAP = {"resume": "Resume Expert", "cv": "Resume Expert", "skills": "Skill Assessment",
+           "qualification": "Skill Assessment", "trend": "Demand Analysis", "market": "Demand Analysis",
+           "course": "Training Resource", "certification": "Training Resource", "training": "Training Resource"}
+JOB_SUBAGENTS = {"a1": "Resume Expert", "a2": "Skill Assessment", "a3": "Demand Analysis", "a4": "Training Resource"}
+
+
+def legacy_commander(query):
+    lowered = query.lower()
+    return {name for name, keywords in COMMANDER_ROUTES.items() if any(k in lowered for k in keywords)}
+
+
+def legacy_scans(scans):
+    def scan(query):
+        q = query.lower()
+        return [i for i, keywords in enumerate(scans) if any(k in q for k in keywords)]
+    return scan
+
+
+def legacy_demand(query):
+    return {DEMAND_MAP[w] for w in query.lower().split() if w in DEMAND_MAP}
+
+
+def legacy_jobmatching(query):
+    triggered = set()
+    for word in query.lower().split():
+        if word in JOB_MAP:
+            for address, name in JOB_SUBAGENTS.items():
+                if name == JOB_MAP[word]:
+                    triggered.add(address)
+    return triggered
+
+
+LEGACY = {
+    "Commander": legacy_commander,
+    "Resume Expert": legacy_scans(RESUME_SCANS),
+    "Skill Assessment": legacy_scans(SKILL_SCANS),
+    "Demand Analysis": legacy_demand,
+    "Training Resource": legacy_scans(TRAINING_SCANS),
+    "Job Matching": legacy_jobmatching
+}
+
+
+def make_query(n_words):
+    random.seed(n_words)
+    body = " ".join(random.choice(RESUME_WORDS) for _ in range(n_words))
+    return f"Here is my resume: {body}. Which jobs, courses and market trends fit me?"
+
+
+def bench(fn, query, budget=0.5):
+    number, elapsed = 1, 0.0
+    while elapsed < budget:
+        elapsed = timeit.timeit(lambda: fn(query), number=number)
+        number *= 2
+    return elapsed / (number // 2) * 1e6
+
+
+if __name__ == "__main__":
+    routers = {agent: KeywordRouter.for_agent(agent) for agent in AGENT_KEYWORDS}
+    print(f"{'words':>7} {'chars':>8}  {'agent':<18} {'old scan':>10} {'router':>10} {'speedup':>8}")
+    for n_words in (50, 500, 2000, 10000):
+        query = make_query(n_words)
+        for agent, router in routers.items():
+            old = bench(LEGACY[agent], query)
+            routed = bench(router.route, query)
+            print(f"{n_words:>7} {len(query):>8}  {agent:<18} {old:>8.1f}us {routed:>8.1f}us {old / routed:>7.1f}x")
+    print("\nEach row times one agent routing the query once, with its own keywords.")
@@ -0,0 +1,119 @@
+"""Rebuild each query's critical path from the spans the agents wrote to TRACE_FILE.
+
+Spans form one tree per query: every message carries the sending span's
+context, so a specialist's spans hang under the Commander's dispatch span and
+the Commander's handling of the reply hangs under the specialist's. Walking
+back from the end of the query, the critical path is the chain of spans that
+finished last at each step. "wait" spans are skipped, since the spans they
+waited on explain the same time.
+
+Run from the repository root:
+    TRACE_FILE=traces.jsonl python benchmarks/loadtest.py --queries 20
+    python benchmarks/critical_path.py traces.jsonl --slowest 5
+"""
+import argparse
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# Slack (seconds) when comparing end times taken on different agents' clocks
+EPSILON = 0.002
+
+
+class Trace:
+    def __init__(self, spans: List[dict]):
+        self.spans = {span["span_id"]: span for span in spans}
+        self.children: Dict[Optional[str], List[dict]] = defaultdict(list)
+        for span in spans:
+            parent = span["parent_id"] if span["parent_id"] in self.spans else None
+            self.children[parent].append(span)
+        self.root = min(self.children[None], key=lambda span: span["start"])
+        self._ends: Dict[str, float] = {}
+
+    def end(self, span: dict) -> float:
+        """When the span and everything it caused had finished."""
+        key = span["span_id"]
+        if key not in self._ends:
+            self._ends[key] = max([span["end"]] + [self.end(child) for child in self.children[key]])
+        return self._ends[key]
+
+    @property
+    def duration(self) -> float:
+        return self.end(self.root) - self.root["start"]
+
+    def critical_path(self, span: Optional[dict] = None, depth: int = 0) -> List[tuple]:
+        """[(depth, span, self seconds)] along the chain that decided when `span`'s subtree finished."""
+        span = span or self.root
+        candidates = [c for c in self.children[span["span_id"]] if c["attrs"].get("kind") != "wait"]
+        chain = []
+        until = self.end(span)
+        while True:
+            ready = [c for c in candidates if c["start"] < until and self.end(c) <= until + EPSILON and c not in chain]
+            if not ready:
+                break
+            last = max(ready, key=self.end)
+            chain.append(last)
+            until = last["start"]
+        chain.reverse()
+        covered = sum(min(self.end(c), span["end"]) - c["start"] for c in chain if c["start"] < span["end"])
+        path = [(depth, span, max(0.0, span["end"] - span["start"] - covered))]
+        for child in chain:
+            path += self.critical_path(child, depth + 1)
+        return path
+
+
+def load(path: str) -> Dict[str, Trace]:
+    spans = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                spans[span["trace_id"]].append(span)
+    return {trace_id: Trace(trace_spans) for trace_id, trace_spans in spans.items()}
+
+
+def describe(span: dict) -> str:
+    attrs = span["attrs"]
+    details = [f"{key}={attrs[key]}" for key in ("agent", "width", "priority", "prompt_tokens", "completion_tokens",
+                                                 "cached", "missing", "error") if attrs.get(key) is not None]
+    return f"{span['service']}: {span['name']}" + (f" ({', '.join(details)})" if details else "")
+
+
+def print_trace(trace_id: str, trace: Trace):
+    query = trace.root["attrs"].get("query", "")
+    print(f"\n=== trace {trace_id[:12]}  {trace.duration * 1000:.0f} ms  {query[:80]!r}")
+    print(f"{'start':>8} {'took':>8} {'self':>8}  step")
+    for depth, span, own in trace.critical_path():
+        offset = span["start"] - trace.root["start"]
+        took = trace.end(span) - span["start"]
+        print(f"{offset * 1000:>8.0f} {took * 1000:>8.0f} {own * 1000:>8.0f}  {'  ' * depth}{describe(span)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="JSONL span file written by the agents (TRACE_FILE)")
+    parser.add_argument("--trace", help="show only the trace whose ID starts with this")
+    parser.add_argument("--slowest", type=int, default=3, help="show the critical path of the N slowest traces")
+    args = parser.parse_args()
+
+    traces = load(args.file)
+    if args.trace:
+        shown = [(tid, t) for tid, t in traces.items() if tid.startswith(args.trace)]
+    else:
+        shown = sorted(traces.items(), key=lambda item: item[1].duration, reverse=True)[:args.slowest]
+    for trace_id, trace in shown:
+        print_trace(trace_id, trace)
+
+    # Where critical-path time goes across every trace
+    totals: Dict[str, float] = defaultdict(float)
+    for trace in traces.values():
+        for _, span, own in trace.critical_path():
+            totals[f"{span['service']}: {span['name']}"] += own
+    grand = sum(totals.values()) or 1.0
+    print(f"\n=== self time on the critical path, {len(traces)} traces")
+    for step, seconds in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:15]:
+        print(f"{seconds * 1000 / len(traces):>8.0f} ms/query {seconds / grand:>6.1%}  {step}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Stand-in for the ASI1 chat completions API, for load tests.
+
+Answers every request after `latency` seconds plus up to `jitter` seconds of
+random delay, as a plain JSON completion or as an SSE stream. Calls are counted
+per load-test query: any "lt-<n>" tag found in the prompt is credited to that
+query, everything else to "untagged".
+
+Standalone:
+    python benchmarks/fake_asi1.py --port 8799 --latency 0.5 --jitter 0.2
+then point the agents at it with ASI1_URL=http://127.0.0.1:8799/v1/chat/completions
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+from typing import List
+
+from aiohttp import web
+
+TAG = re.compile(r"\blt-\d+\b")
+SECTION = re.compile(r"^=== SECTION: .+ ===$", re.M)
+
+
+class FakeASI1:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, port: int = 8799):
+        self.latency = latency
+        self.jitter = jitter
+        self.port = port
+        self.calls = 0
+        self.calls_by_query: Counter = Counter()
+        self.latencies: List[float] = []
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1/chat/completions"
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        started = time.perf_counter()
+        body = await request.json()
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        self.calls += 1
+        for tag in set(TAG.findall(prompt)) or {"untagged"}:
+            self.calls_by_query[tag] += 1
+
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        text = self.answer(prompt)
+
+        if body.get("stream"):
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for i in range(0, len(text), 40):
+                delta = {"choices": [{"delta": {"content": text[i:i + 40]}}]}
+                await response.write(f"data: {json.dumps(delta)}\n\n".encode("utf-8"))
+            await response.write(b"data: [DONE]\n\n")
+        else:
+            response = web.json_response({"choices": [{"message": {"content": text}}]})
+        self.latencies.append(time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def answer(prompt: str) -> str:
+        first_line = next((line.strip() for line in prompt.splitlines() if line.strip()), "")
+        body = (
+            f"Synthetic answer to: {first_line[:120]}\n"
+            "1. Strengths: Python, SQL, stakeholder reporting.\n"
+            "2. Gaps: cloud data tooling, experiment design.\n"
+            "3. Next steps: one certification, two portfolio projects, apply to five roles this week.\n"
+        )
+        # Multi-section (batched) prompts get one copy of the answer under each requested header
+        headers = list(dict.fromkeys(SECTION.findall(prompt)))
+        return "\n".join(f"{header}\n{body}" for header in headers) if headers else body
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def serve_forever(args):
+    server = FakeASI1(args.latency, args.jitter, args.port)
+    await server.start()
+    print(f"Fake ASI1 listening on {server.url} (latency {args.latency}s + up to {args.jitter}s jitter)")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency", type=float, default=0.5, help="base response time (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="extra random delay, up to (s)")
+    try:
+        asyncio.run(serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
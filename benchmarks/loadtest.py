@@ -0,0 +1,352 @@
+"""End-to-end load test of the deployed agents, run entirely on this machine.
+
+The Commander and all five specialists run in one Bureau. ASI1 is replaced by
+a local fake server (benchmarks/fake_asi1.py) and the scraper and Tavily
+agents by stubs. N synthetic career queries are then driven through the
+Commander, and the run reports throughput, p50/p95/p99 latency end to end and
+per agent hop, and the number of ASI1 calls each query caused.
+
+Run from the repository root:
+    python benchmarks/loadtest.py --queries 50 --concurrency 10 --latency 0.5 --jitter 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import os
+import random
+import sys
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "Agentverse Deployed Agents"))
+sys.path.insert(0, HERE)
+
+from fake_asi1 import FakeASI1
+
+# Specialist name -> (module, agent attribute)
+SPECIALISTS = {
+    "Resume Expert": ("resumeexpert", "resume_expert"),
+    "Skill Assessment": ("skillassessment", "skill_assessment"),
+    "Demand Analysis": ("demandanalysis", "demand_analysis"),
+    "Training Resource": ("trainingresource", "training_resource"),
+    "Job Matching": ("jobmatching", "job_matching")
+}
+
+ROLES = ["Data Analyst", "Backend Developer", "Product Manager", "DevOps Engineer", "UX Designer",
+         "Machine Learning Engineer", "Business Analyst", "QA Engineer"]
+CITIES = ["Bombay", "Bengaluru", "Pune", "Hyderabad", "Delhi", "Chennai", "remote"]
+FOLLOW_UPS = [
+    "Let me know if my resume is competitive for those roles.",
+    "Which skill gaps should I close first?",
+    "Recommend any courses or certifications if needed.",
+    "How is market demand for this role trending?"
+]
+
+
+def make_query(n: int, rng: random.Random) -> str:
+    # The "lt-<n>" tag sits in the first sentence, which every sub-task carries
+    # along, so the fake ASI1 server can credit each call to its query.
+    first = f"Find the latest jobs for {rng.choice(ROLES)} in {rng.choice(CITIES)} (ref lt-{n})."
+    return " ".join([first] + rng.sample(FOLLOW_UPS, rng.randint(0, len(FOLLOW_UPS))))
+
+
+def reword(query: str) -> str:
+    """The same request as another user might type it: other filler, other case, Bombay as Mumbai."""
+    return query.replace("Find the latest jobs for", "Please show me current jobs for").replace("Bombay", "Mumbai").lower()
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+class HopRecorder:
+    """Times every request/reply pair between agents by wrapping `Context.send`.
+
+    TaskRequest/TaskResponse pairs are matched on (request_id, caller, callee);
+    scraper and Tavily replies carry no ID and are matched in send order. A
+    final reply with no request left to match is counted as a duplicate.
+    """
+
+    def __init__(self, labels: Dict[str, str]):
+        self.labels = labels
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._open: Dict[tuple, float] = {}
+        self._unkeyed: Dict[tuple, deque] = defaultdict(deque)
+        self.duplicates: Dict[str, int] = defaultdict(int)
+
+    def label(self, address: str) -> str:
+        return self.labels.get(address, address[:16])
+
+    def record(self, sender: str, destination: str, message):
+        now = time.perf_counter()
+        kind = type(message).__name__
+        request_id = getattr(message, "request_id", None)
+        if kind == "TaskRequest":
+            self._open.setdefault((request_id, sender, destination), now)
+        elif kind == "TaskResponse" or (kind == "TaskResponseChunk" and message.final):
+            started = self._open.pop((request_id, destination, sender), None)
+            if started is not None:
+                self.samples[f"{self.label(destination)} -> {self.label(sender)}"].append(now - started)
+            elif request_id is not None:
+                self.duplicates[f"{self.label(destination)} -> {self.label(sender)}"] += 1
+        elif kind in ("WebsiteScraperRequest", "WebSearchRequest"):
+            self._unkeyed[(sender, destination)].append(now)
+        elif kind in ("WebsiteScraperResponse", "WebSearchResponse"):
+            waiting = self._unkeyed.get((destination, sender))
+            if waiting:
+                self.samples[f"{self.label(destination)} -> {self.label(sender)}"].append(now - waiting.popleft())
+
+    def install(self):
+        from uagents.context import ExternalContext, InternalContext
+
+        recorder = self
+        for cls in (InternalContext, ExternalContext):
+            original = cls.send
+
+            async def send(ctx, destination, message, *args, _original=original, **kwargs):
+                recorder.record(ctx.agent.address, destination, message)
+                return await _original(ctx, destination, message, *args, **kwargs)
+
+            cls.send = send
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.fake = FakeASI1(args.latency, args.jitter, args.asi1_port)
+        # Agents read ASI1_URL when their modules are imported
+        os.environ["ASI1_URL"] = self.fake.url
+        os.environ.setdefault("ASI1_API_KEY", "load-test")
+        os.environ.pop("ASI1_CACHE_DB", None)
+        os.environ["ASI1_RATE_PER_MINUTE"] = str(args.rate)
+        if args.trace:
+            os.environ["TRACE_FILE"] = args.trace
+
+        from uagents import Agent
+
+        self.commander = importlib.import_module("commander")
+        self.modules = {name: importlib.import_module(module) for name, (module, _) in SPECIALISTS.items()}
+        self.specialists = {name: getattr(self.modules[name], attr) for name, (_, attr) in SPECIALISTS.items()}
+        self.scraper = Agent(name="stub_scraper", seed="loadtest_stub_scraper_seed", handle_messages_concurrently=True)
+        self.tavily = Agent(name="stub_tavily", seed="loadtest_stub_tavily_seed", handle_messages_concurrently=True)
+        self.driver = Agent(name="load_driver", seed="loadtest_driver_seed")
+        self._rewire()
+        self._register_stubs()
+        self._register_driver()
+
+        labels = {agent.address: name for name, agent in self.specialists.items()}
+        labels.update({
+            self.commander.commander.address: "Commander",
+            self.scraper.address: "Scraper (stub)",
+            self.tavily.address: "Tavily (stub)",
+            self.driver.address: "Load driver"
+        })
+        self.hops = HopRecorder(labels)
+        self.hops.install()
+
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.first_chunk: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.ttfb: List[float] = []
+        self.answered: List[str] = []
+        self.timed_out = 0
+        self.wall = 0.0
+
+    def _rewire(self):
+        """Point every agent's sub-agent table and external tools at the in-process agents."""
+        addresses = {name: agent.address for name, agent in self.specialists.items()}
+        for module in [self.commander] + list(self.modules.values()):
+            names = list(module.SUBAGENTS.values())
+            module.SUBAGENTS.clear()
+            module.SUBAGENTS.update({addresses[name]: name for name in names})
+        self.modules["Job Matching"].SCRAPER_AGENT_ADDRESS = self.scraper.address
+        self.modules["Training Resource"].TAVILY_AGENT_ADDRESS = self.tavily.address
+
+    def _tool_delay(self) -> float:
+        return self.args.tool_latency + random.uniform(0, self.args.jitter)
+
+    def _register_stubs(self):
+        jobs = self.modules["Job Matching"]
+        training = self.modules["Training Resource"]
+
+        # The scraper's reply is text only, matched by Job Matching in send order,
+        # so the stub's replies leave in the order the requests came in
+        last_reply = None
+
+        @self.scraper.on_message(model=jobs.WebsiteScraperRequest)
+        async def scrape(ctx, sender, msg):
+            nonlocal last_reply
+            previous, sent = last_reply, asyncio.get_running_loop().create_future()
+            last_reply = sent
+            await asyncio.sleep(self._tool_delay())
+            listings = "\n".join(
+                f"{role} - Example Corp {i} - {city} - https://in.indeed.com/viewjob?jk=lt{i:04d}"
+                for i, (role, city) in enumerate(zip(ROLES, CITIES * 2))
+            )
+            if previous is not None:
+                await previous
+            await ctx.send(sender, jobs.WebsiteScraperResponse(text=listings))
+            sent.set_result(None)
+
+        @self.tavily.on_message(model=training.WebSearchRequest)
+        async def search(ctx, sender, msg):
+            await asyncio.sleep(self._tool_delay())
+            results = [
+                training.WebSearchResult(title=f"Course {i}", url=f"https://example.org/course/{i}",
+                                         content=f"A practical course related to: {msg.query[:60]}")
+                for i in range(5)
+            ]
+            await ctx.send(sender, training.WebSearchResponse(query=msg.query, results=results))
+
+    def _register_driver(self):
+        commander = self.commander
+
+        @self.driver.on_event("startup")
+        async def start(ctx):
+            asyncio.ensure_future(self.run(ctx))
+
+        @self.driver.on_message(model=commander.TaskResponse)
+        async def answer(ctx, sender, msg):
+            future = self.pending.get(msg.request_id)
+            if future is not None and not future.done():
+                future.set_result(time.perf_counter())
+
+        @self.driver.on_message(model=commander.TaskResponseChunk)
+        async def chunk(ctx, sender, msg):
+            self.first_chunk.setdefault(msg.request_id, time.perf_counter())
+            future = self.pending.get(msg.request_id)
+            if msg.final and future is not None and not future.done():
+                future.set_result(time.perf_counter())
+
+    async def one_query(self, ctx, n: int, query: str, gate: asyncio.Semaphore):
+        request_id = f"lt-{n}"
+        async with gate:
+            future = self.pending[request_id] = asyncio.get_running_loop().create_future()
+            started = time.perf_counter()
+            await ctx.send(self.commander.commander.address,
+                           self.commander.TaskRequest(query=query, stream=self.args.stream, request_id=request_id))
+            try:
+                finished = await asyncio.wait_for(future, self.args.timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                return
+        self.latencies.append(finished - started)
+        if request_id in self.first_chunk:
+            self.ttfb.append(self.first_chunk[request_id] - started)
+        self.answered.append(request_id)
+
+    async def run(self, ctx):
+        await self.fake.start()
+        await asyncio.sleep(self.args.warmup)
+        rng = random.Random(self.args.seed)
+        gate = asyncio.Semaphore(self.args.concurrency)
+        queries = []
+        for n in range(self.args.queries):
+            if queries and rng.random() < self.args.repeat:
+                queries.append(reword(rng.choice(queries)))
+            else:
+                queries.append(make_query(n, rng))
+        started = time.perf_counter()
+        await asyncio.gather(*[self.one_query(ctx, n, query, gate) for n, query in enumerate(queries)])
+        self.wall = time.perf_counter() - started
+        self.report()
+        await self.fake.stop()
+        self.main_task.cancel()
+
+    def report(self):
+        args = self.args
+        print(f"\n=== Load test: {args.queries} queries, concurrency {args.concurrency}, "
+              f"ASI1 {args.latency}s + up to {args.jitter}s, tools {args.tool_latency}s"
+              f"{', streaming' if args.stream else ''} ===")
+        print(f"Answered {len(self.answered)}/{args.queries} ({self.timed_out} timed out) in {self.wall:.2f}s"
+              f" -> {len(self.answered) / self.wall:.2f} queries/s")
+
+        rows = []
+        if self.latencies:
+            rows.append(("end to end", self.latencies))
+        if self.ttfb:
+            rows.append(("first chunk", self.ttfb))
+        rows += sorted(self.hops.samples.items())
+        rows.append(("ASI1 call (server side)", self.fake.latencies))
+        print(f"\n{'latency (s)':<40} {'n':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}")
+        for name, values in rows:
+            if values:
+                print(f"{name:<40} {len(values):>5} {percentile(values, 50):>7.3f} {percentile(values, 95):>7.3f}"
+                      f" {percentile(values, 99):>7.3f} {max(values):>7.3f}")
+
+        per_query = [self.fake.calls_by_query.get(tag, 0) for tag in self.answered]
+        print(f"\nASI1 calls: {self.fake.calls} total, {self.fake.calls_by_query.get('untagged', 0)} untagged")
+        if per_query:
+            print(f"ASI1 calls per answered query: mean {sum(per_query) / len(per_query):.2f},"
+                  f" p50 {percentile(per_query, 50)}, max {max(per_query)}")
+        duplicates = sum(self.hops.duplicates.values())
+        print(f"Duplicate final replies: {duplicates}" + (f" {dict(self.hops.duplicates)}" if duplicates else ""))
+        from asi1client import inflight, resilience_stats, scheduler_stats
+        print(f"Coalesced in-flight duplicates: {inflight.stats()}")
+        print(f"Retries, hedges and circuit breaker: {resilience_stats()}")
+        for key, stats in scheduler_stats().items():
+            print(f"Scheduler {key}: {stats}")
+        print(f"Commander answer cache: {self.commander.answers.stats()}")
+        for name, module in self.modules.items():
+            print(f"{name} answer cache: {module.answers.stats()}")
+            budget = getattr(module, "insight_budget", None)
+            if budget is not None and budget.tokens_in:
+                stats = budget.stats()
+                print(f"{name} sub-agent insights: ~{stats['tokens_in']} -> ~{stats['tokens_out']} tokens"
+                      f" ({stats['ratio']:.0%} kept)")
+            enricher = getattr(module, "enricher", None)
+            if enricher is not None:
+                print(f"{name} insight merges: {enricher.stats()}")
+        if self.args.metrics:
+            from metrics import registry
+            with open(self.args.metrics, "w", encoding="utf-8") as f:
+                f.write(registry.render())
+            print(f"Prometheus metrics written to {self.args.metrics}")
+
+    def start(self):
+        from uagents import Bureau
+
+        agents = [self.commander.commander, self.scraper, self.tavily, self.driver] + list(self.specialists.values())
+        bureau = Bureau(agents=agents, port=self.args.port, loop=self.loop, log_level=self.args.log_level,
+                        shutdown_timeout=5)
+        self.main_task = self.loop.create_task(bureau.run_async())
+        with contextlib.suppress(asyncio.CancelledError, KeyboardInterrupt):
+            self.loop.run_until_complete(self.main_task)
+
+    @classmethod
+    def build(cls, args) -> "LoadTest":
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        test = cls(args)
+        test.loop = loop
+        return test
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="End-to-end load test with local stand-ins for ASI1, scraper and Tavily")
+    parser.add_argument("--queries", type=int, default=20, help="number of user queries to send")
+    parser.add_argument("--concurrency", type=int, default=10, help="queries in flight at once")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake ASI1 base latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="extra random delay for ASI1 and tools, up to (s)")
+    parser.add_argument("--rate", type=float, default=0, help="ASI1 requests per minute allowed (0 = unlimited)")
+    parser.add_argument("--tool-latency", type=float, default=0.3, help="stub scraper/Tavily latency (s)")
+    parser.add_argument("--stream", action="store_true", help="ask for streamed answers")
+    parser.add_argument("--repeat", type=float, default=0.0,
+                        help="share of queries that re-ask an earlier one in other words (answer cache hits)")
+    parser.add_argument("--timeout", type=float, default=90.0, help="give up on a query after this long (s)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="wait before the first query (s)")
+    parser.add_argument("--seed", type=int, default=7, help="random seed for the synthetic queries")
+    parser.add_argument("--port", type=int, default=8790, help="Bureau port")
+    parser.add_argument("--asi1-port", type=int, default=8799, help="fake ASI1 port")
+    parser.add_argument("--trace", help="write spans to this JSONL file (see benchmarks/critical_path.py)")
+    parser.add_argument("--metrics", help="write every agent's Prometheus metrics to this file at the end")
+    parser.add_argument("--log-level", default="WARNING", help="agent log level")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    LoadTest.build(parse_args()).start()
@@ -1,11 +1,26 @@
 from uagents import Agent, Context, Model
+from typing import List, Optional
 import re
+import uuid
 
 class TaskRequest(Model):
     query: str
+    stream: bool = False
+    request_id: Optional[str] = None
+    hops: int = 0
+    visited: List[str] = []
+    trace: Optional[str] = None
 
 class TaskResponse(Model):
     result: str
+    request_id: Optional[str] = None
+    trace: Optional[str] = None
+
+class TaskResponseChunk(Model):
+    result: str
+    seq: int
+    final: bool = False
+    request_id: Optional[str] = None
 
 user = Agent(
     name="test_user",
@@ -18,7 +33,7 @@ async def ask(ctx: Context):
     print("🚀 Sending query to Commander...")
     await ctx.send(
         "test-agent://agent1qtjjk3xfvel6qkqk48n2he4kwqmytwcc6tplvszvwty9qp38nfs4w3r3xme",  # Commander
-        TaskRequest(query="Find the latest jobs for Data Analyst job in Bombay. Also let me know if my resume and skillset are competitive for those roles, and recommend any courses if needed.")  # User's query
+        TaskRequest(query="Find the latest jobs for Data Analyst job in Bombay. Also let me know if my resume and skillset are competitive for those roles, and recommend any courses if needed.", stream=True, request_id=uuid.uuid4().hex)  # User's query
     )
 
 def strip_markdown(md_text):
@@ -38,4 +53,21 @@ async def handle(ctx: Context, sender: str, msg: TaskResponse):
     clean_text = strip_markdown(msg.result)
     print(clean_text)
 
+# Streamed chunks may arrive out of order, so hold them until their turn
+pending_chunks = {}
+next_seq = 0
+
+@user.on_message(model=TaskResponseChunk)
+async def handle_chunk(ctx: Context, sender: str, msg: TaskResponseChunk):
+    global next_seq
+    if next_seq == 0 and not pending_chunks:
+        print("\n✅ Streaming Response from Commander:\n")
+    pending_chunks[msg.seq] = msg
+    while next_seq in pending_chunks:
+        chunk = pending_chunks.pop(next_seq)
+        next_seq += 1
+        print(re.sub(r'[*_]{1,2}', '', chunk.result), end="", flush=True)
+        if chunk.final:
+            print("\n\n🏁 Response complete.")
+
 user.run()
@@ -0,0 +1,31 @@
+import logging
+import os
+import sys
+
+import pytest
+
+# The agents import their helper modules as top-level modules, as they do when run from that directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Agentverse Deployed Agents"))
+
+from uagents import Model
+
+
+class FakeContext:
+    """Just enough of a uagents Context for handlers: a logger and an outbox kept like the real one."""
+
+    def __init__(self):
+        self.logger = logging.getLogger("test-agent")
+        self.outbound_messages = {}
+
+    async def send(self, destination: str, message: Model):
+        self.outbound_messages.setdefault(destination, []).append(
+            (message.json(), Model.build_schema_digest(message))
+        )
+
+    def sent(self, destination: str):
+        return [body for body, _ in self.outbound_messages.get(destination, [])]
+
+
+@pytest.fixture
+def ctx():
+    return FakeContext()
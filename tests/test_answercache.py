@@ -0,0 +1,134 @@
+import asyncio
+import json
+from typing import Optional
+
+import pytest
+from uagents import Model
+
+import answercache
+from answercache import AnswerCache, normalize_query
+
+
+class TaskRequest(Model):
+    query: str
+    request_id: Optional[str] = None
+    hops: int = 0
+    stream: bool = False
+
+
+class TaskResponse(Model):
+    result: str
+    request_id: Optional[str] = None
+    trace: Optional[str] = None
+
+
+class TaskResponseChunk(Model):
+    result: str
+    seq: int
+    final: bool = False
+    request_id: Optional[str] = None
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    # MinHash finds near matches only with high probability (word hashes change per process),
+    # so every stored answer of the scope is made a candidate and only the subset and threshold rules decide
+    monkeypatch.setattr(AnswerCache, "_band_keys", staticmethod(lambda words, scope: [scope]))
+    return AnswerCache(TaskResponse, TaskResponseChunk, fresh_for=60, similarity=0.75)
+
+
+def test_normalize_drops_filler_and_folds_synonyms():
+    assert normalize_query("Please show me the latest ML jobs in Bombay") == \
+        normalize_query("machine learning job mumbai")
+
+
+def test_exact_and_reworded_queries_hit(cache):
+    cache.store("data analyst jobs in Pune", "answer")
+    assert cache.lookup("data analyst jobs in Pune") == "answer"
+    assert cache.lookup("Please show me the latest Data Analyst jobs in Poona") == "answer"
+    assert cache.stats()["hits"] == 2
+
+
+def test_extra_word_within_threshold_hits(cache):
+    # 4 of 5 words: similarity 0.8
+    cache.store("data analyst jobs in Pune", "answer")
+    assert cache.lookup("remote data analyst jobs in Pune") == "answer"
+
+
+def test_extra_words_beyond_threshold_miss(cache):
+    # 4 of 6 words: similarity 0.67
+    cache.store("data analyst jobs in Pune", "answer")
+    assert cache.lookup("senior remote data analyst jobs in Pune") is None
+
+
+def test_swapped_word_misses_even_when_similar(cache):
+    cache.store("senior remote data analyst jobs python in Pune", "pune answer")
+    # 6 of 8 words shared, right at the threshold, but Delhi is not Pune
+    assert cache.lookup("senior remote data analyst jobs python in Delhi") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_scopes_are_kept_apart(cache):
+    cache.store("data analyst jobs in Pune", "answer", scope=1)
+    assert cache.lookup("data analyst jobs in Pune", scope=0) is None
+    assert cache.lookup("data analyst jobs in Pune", scope=1) == "answer"
+
+
+def test_queries_with_no_topic_words_are_uncacheable(cache):
+    cache.store("please show me", "answer")
+    assert cache.lookup("please show me") is None
+    assert len(cache) == 0
+    assert cache.stats()["uncacheable"] == 1
+
+
+def test_oldest_answers_are_evicted_beyond_max_entries():
+    cache = AnswerCache(TaskResponse, TaskResponseChunk, fresh_for=60, max_entries=2)
+    for city in ("Pune", "Delhi", "Chennai"):
+        cache.store(f"data analyst jobs in {city}", city)
+    assert len(cache) == 2
+    assert cache.lookup("data analyst jobs in Pune") is None
+    assert cache.lookup("data analyst jobs in Chennai") == "Chennai"
+
+
+def test_answers_expire(monkeypatch, cache):
+    cache.store("data analyst jobs in Pune", "answer")
+    later = answercache.time.monotonic() + 61
+    monkeypatch.setattr(answercache.time, "monotonic", lambda: later)
+    assert cache.lookup("data analyst jobs in Pune") is None
+    assert len(cache) == 0
+
+
+def test_handler_stores_and_then_serves_the_answer(cache, ctx):
+    calls = []
+
+    @cache.handler
+    async def handle(ctx, sender, msg):
+        calls.append(msg.query)
+        await ctx.send(sender, TaskResponse(result="fresh answer", request_id=msg.request_id))
+
+    asyncio.run(handle(ctx, "commander", TaskRequest(query="data analyst jobs in Pune", request_id="r1")))
+    asyncio.run(handle(ctx, "commander", TaskRequest(query="Data analyst jobs in Poona", request_id="r2")))
+    replies = [json.loads(body) for body in ctx.sent("commander")]
+    assert calls == ["data analyst jobs in Pune"]
+    assert [(reply["result"], reply["request_id"]) for reply in replies] == [("fresh answer", "r1"), ("fresh answer", "r2")]
+
+
+def test_streamed_answer_is_stored_whole(cache, ctx):
+    @cache.handler
+    async def handle(ctx, sender, msg):
+        for seq, (part, final) in enumerate((("fresh ", False), ("answer", True))):
+            await ctx.send(sender, TaskResponseChunk(result=part, seq=seq, final=final, request_id=msg.request_id))
+
+    asyncio.run(handle(ctx, "commander", TaskRequest(query="data analyst jobs in Pune", request_id="r1", stream=True)))
+    assert cache.lookup("data analyst jobs in Pune") == "fresh answer"
+
+
+def test_degraded_answer_is_not_stored(cache, ctx):
+    @cache.handler
+    async def handle(ctx, sender, msg):
+        answercache.degraded("deadline")
+        await ctx.send(sender, TaskResponse(result="partial answer", request_id=msg.request_id))
+
+    asyncio.run(handle(ctx, "commander", TaskRequest(query="data analyst jobs in Pune", request_id="r1")))
+    assert len(cache) == 0
+    assert cache.stats()["not_stored"] == 1
@@ -0,0 +1,84 @@
+import asyncio
+
+from fanin import ScatterGather
+
+
+def test_gather_returns_once_every_reply_is_in():
+    async def run():
+        fanin = ScatterGather()
+        fanin.expect("r1", ["a", "b"])
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.01, fanin.resolve, "r1", "a", "from a")
+        loop.call_later(0.02, fanin.resolve, "r1", "b", "from b")
+        started = loop.time()
+        results, missing = await fanin.gather("r1", timeout=5)
+        return results, missing, loop.time() - started, len(fanin)
+
+    results, missing, took, pending = asyncio.run(run())
+    assert results == {"a": "from a", "b": "from b"}
+    assert missing == []
+    assert took < 1
+    assert pending == 0
+
+
+def test_gather_reports_senders_that_miss_the_deadline():
+    async def run():
+        fanin = ScatterGather()
+        fanin.expect("r1", ["a", "b"])
+        fanin.resolve("r1", "a", "from a")
+        return await fanin.gather("r1", timeout=0.02)
+
+    results, missing = asyncio.run(run())
+    assert results == {"a": "from a"}
+    assert missing == ["b"]
+
+
+def test_late_and_unexpected_replies_are_counted_not_delivered():
+    async def run():
+        fanin = ScatterGather()
+        fanin.expect("r1", ["a"])
+        await fanin.gather("r1", timeout=0.01)
+        late = fanin.resolve("r1", "a", "too late")
+        unknown = fanin.resolve("r2", "a", "never asked")
+        return late, unknown, fanin.late
+
+    assert asyncio.run(run()) == (False, False, 2)
+
+
+def test_duplicate_reply_is_late():
+    async def run():
+        fanin = ScatterGather()
+        fanin.expect("r1", ["a"])
+        first = fanin.resolve("r1", "a", "one")
+        second = fanin.resolve("r1", "a", "two")
+        results, _ = await fanin.gather("r1", timeout=0.01)
+        return first, second, results
+
+    assert asyncio.run(run()) == (True, False, {"a": "one"})
+
+
+def test_wait_for_one_sender():
+    async def run():
+        fanin = ScatterGather()
+        fanin.expect("r1", ["a", "b"])
+        asyncio.get_running_loop().call_later(0.01, fanin.resolve, "r1", "a", "from a")
+        answered = await fanin.wait_for("r1", "a", timeout=5)
+        timed_out = await fanin.wait_for("r1", "b", timeout=0.01)
+        not_expected = await fanin.wait_for("r1", "c", timeout=5)
+        # A wait that timed out leaves the reply expected, so a later one is still delivered
+        delivered = fanin.resolve("r1", "b", "from b")
+        return answered, timed_out, not_expected, delivered
+
+    assert asyncio.run(run()) == ("from a", None, None, True)
+
+
+def test_dropped_sender_ends_its_wait():
+    async def run():
+        fanin = ScatterGather()
+        fanin.expect("r1", ["a"])
+        waiting = asyncio.ensure_future(fanin.wait_for("r1", "a", timeout=5))
+        await asyncio.sleep(0)
+        fanin.drop("r1", "a")
+        return await waiting, fanin.pending("r1")
+
+    assert asyncio.run(run()) == (None, [])
@@ -0,0 +1,63 @@
+import time
+
+from jobindex import JobIndex
+from listings import JobListing
+
+DAY = 86400
+
+
+def _listing(title: str, jk: str, location: str = "Pune, Maharashtra", posted: str = "") -> JobListing:
+    return JobListing(title=title, company="Acme", location=location, posted=posted,
+                      url=f"https://in.indeed.com/viewjob?jk={jk}")
+
+
+def test_search_ranks_title_matches_with_bm25():
+    index = JobIndex(path=None)
+    index.upsert([
+        _listing("Data Analyst", "00000000000000a1"),
+        _listing("Senior Software Engineer, Data Platform", "00000000000000a2"),
+        _listing("Sales Executive", "00000000000000a3"),
+    ])
+    found = index.search("data analyst jobs in pune")
+    assert [listing.title for listing in found] == ["Data Analyst", "Senior Software Engineer, Data Platform"]
+    assert found[0].score > found[1].score
+
+
+def test_upsert_refreshes_by_job_key():
+    index = JobIndex(path=None)
+    index.upsert([_listing("Data Analyst", "00000000000000a1")])
+    index.upsert([JobListing(title="Data Analyst", salary="₹6 LPA", url="https://in.indeed.com/viewjob?jk=00000000000000a1")])
+    (listing,) = index.search("data analyst")
+    assert len(index) == 1
+    assert listing.location == "Pune, Maharashtra"
+    assert listing.salary == "₹6 LPA"
+
+
+def test_expire_deletes_unseen_and_old_postings():
+    index = JobIndex(path=None, max_age=30 * DAY)
+    now = time.time()
+    index.upsert([_listing("Data Analyst", "00000000000000a1")], now=now - 31 * DAY)
+    index.upsert([_listing("Data Analyst", "00000000000000a2", posted="Posted 45 days ago")], now=now)
+    index.upsert([_listing("Data Analyst", "00000000000000a3", posted="Posted 2 days ago")], now=now)
+    assert index.expire(now) == 2
+    assert [listing.url[-2:] for listing in index.search("data analyst")] == ["a3"]
+    # The full-text index forgets the deleted rows too
+    (fts_rows,) = index._db.execute("SELECT COUNT(*) FROM jobs_fts WHERE jobs_fts MATCH 'analyst'").fetchone()
+    assert fts_rows == 1
+
+
+def test_fresh_matches_need_enough_covering_listings():
+    index = JobIndex(path=None, fresh_for=3600, min_matches=3)
+    index.upsert([_listing("Data Analyst", f"00000000000000b{i}") for i in range(2)])
+    index.upsert([_listing("Data Analyst", "00000000000000c1", location="Delhi")])
+    assert index.fresh_matches("data analyst jobs in pune") == []
+    index.upsert([_listing("Senior Data Analyst", "00000000000000b9")])
+    assert len(index.fresh_matches("data analyst jobs in pune")) == 3
+    assert index.stats()["answered_locally"] == 1
+
+
+def test_stale_listings_are_not_fresh_matches():
+    index = JobIndex(path=None, fresh_for=3600, min_matches=1)
+    index.upsert([_listing("Data Analyst", "00000000000000a1")], now=time.time() - 7200)
+    assert index.search("data analyst", fresh_only=True) == []
+    assert index.fresh_matches("data analyst") == []
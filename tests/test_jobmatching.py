@@ -0,0 +1,118 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+from uagents import Model
+
+from fanin import ScatterGather
+from sessions import SessionStore
+import jobmatching
+from jobmatching import SCRAPER_AGENT_ADDRESS, WebsiteScraperResponse
+
+
+class _Span:
+    context = None
+
+    def __init__(self):
+        self.ended = None
+
+    def end(self, **attrs):
+        self.ended = attrs
+
+
+@pytest.fixture
+def matching(monkeypatch):
+    monkeypatch.setattr(jobmatching, "sessions", SessionStore(ttl=60))
+    monkeypatch.setattr(jobmatching, "scrapes_in_flight", OrderedDict())
+    monkeypatch.setattr(jobmatching, "awaiting_scraper", {})
+    monkeypatch.setattr(jobmatching, "fanin", ScatterGather())
+    return jobmatching
+
+
+def _in_flight(matching, url: str, *request_ids, sent: float = None):
+    span = _Span()
+    matching.scrapes_in_flight[url] = (span, matching.time.monotonic() if sent is None else sent)
+    matching.awaiting_scraper[url] = list(request_ids)
+    return span
+
+
+def test_scraper_response_keeps_the_external_protocol():
+    # The deployed scraper sends this model; any other digest never reaches handle_scraper
+    assert Model.build_schema_digest(WebsiteScraperResponse) == \
+        "model:92c20d77b5f5e13c43efeb742649e62cd830af0e28f9de677687ce9c35dee999"
+
+
+def test_reply_answers_the_oldest_scrape_in_flight(matching):
+    pune, _ = matching.sessions.open()
+    delhi, _ = matching.sessions.open()
+    _in_flight(matching, "https://in.indeed.com/jobs?q=analyst+pune", pune)
+    _in_flight(matching, "https://in.indeed.com/jobs?q=analyst+delhi", delhi)
+
+    url, request_ids, _ = matching.next_scrape()
+    assert (url, request_ids) == ("https://in.indeed.com/jobs?q=analyst+pune", [pune])
+    assert list(matching.scrapes_in_flight) == ["https://in.indeed.com/jobs?q=analyst+delhi"]
+    assert matching.next_scrape()[:2] == ("https://in.indeed.com/jobs?q=analyst+delhi", [delhi])
+    assert matching.next_scrape() == (None, [], None)
+
+
+def test_one_reply_answers_every_request_for_the_url(matching):
+    first, _ = matching.sessions.open()
+    second, _ = matching.sessions.open()
+    gone, _ = matching.sessions.open()
+    _in_flight(matching, "https://in.indeed.com/jobs?q=a", first, gone, second)
+    matching.sessions.close(gone)
+    assert matching.next_scrape()[1] == [first, second]
+
+
+def test_same_url_is_scraped_once_while_in_flight(matching, ctx):
+    async def run():
+        await matching.scrape(ctx, "https://in.indeed.com/jobs?q=a")
+        await matching.scrape(ctx, "https://in.indeed.com/jobs?q=a", refresh=True)
+        await matching.scrape(ctx, "https://in.indeed.com/jobs?q=b")
+
+    asyncio.run(run())
+    assert len(ctx.sent(SCRAPER_AGENT_ADDRESS)) == 2
+    assert list(matching.scrapes_in_flight) == ["https://in.indeed.com/jobs?q=a", "https://in.indeed.com/jobs?q=b"]
+
+
+def test_prune_gives_up_on_old_scrapes_and_forgets_expired_requests(matching):
+    gone, _ = matching.sessions.open()
+    alive, _ = matching.sessions.open()
+    now = matching.time.monotonic()
+    old = _in_flight(matching, "https://in.indeed.com/jobs?q=old", sent=now - 120)
+    _in_flight(matching, "https://in.indeed.com/jobs?q=a", gone, alive, sent=now)
+    matching.sessions.close(gone)
+
+    matching.prune_scrapes()
+    assert list(matching.scrapes_in_flight) == ["https://in.indeed.com/jobs?q=a"]
+    assert matching.awaiting_scraper == {"https://in.indeed.com/jobs?q=a": [alive]}
+    assert old.ended == {"expired": True}
+
+
+def test_reply_with_nothing_in_flight_is_ignored(matching, ctx):
+    asyncio.run(matching.handle_scraper(ctx, SCRAPER_AGENT_ADDRESS, WebsiteScraperResponse(text="page")))
+    assert ctx.outbound_messages == {}
+
+
+def test_scrape_path_waits_for_the_sub_agents(matching, monkeypatch, ctx):
+    prompts = []
+
+    async def call_asi1(prompt, fallback=None, **admit):
+        prompts.append(prompt)
+        return "matched jobs"
+
+    monkeypatch.setattr(matching, "call_asi1", call_asi1)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        request_id, _ = matching.sessions.open(query="data analyst jobs", sender="commander", reply_id="r1",
+                                               stream=False, priority=0, hops=0, deadline=loop.time() + 5)
+        matching.fanin.expect(request_id, ["resume-expert"])
+        _in_flight(matching, "https://in.indeed.com/jobs?q=data+analyst", request_id)
+        # The sub-agent answers after the scraper does
+        loop.call_later(0.05, matching.fanin.resolve, request_id, "resume-expert", "Knows SQL and Tableau")
+        await matching.handle_scraper(ctx, SCRAPER_AGENT_ADDRESS, WebsiteScraperResponse(text="no listings here"))
+
+    asyncio.run(run())
+    assert "Knows SQL and Tableau" in prompts[0]
+    assert len(ctx.sent("commander")) == 1
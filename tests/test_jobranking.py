@@ -0,0 +1,69 @@
+import math
+
+import pytest
+
+import jobranking
+from jobranking import rank_for_profile
+from listings import JobListing
+
+
+def _listings():
+    return [
+        JobListing(title="Java Developer", company="A", location="Pune"),
+        JobListing(title="Python Developer", company="B", location="Pune"),
+        JobListing(title="Python Data Engineer", company="C", location="Delhi"),
+        JobListing(title="Office Assistant", company="D", location="Pune"),
+    ]
+
+
+@pytest.mark.skipif(jobranking.np is None, reason="NumPy not installed")
+def test_query_terms_rank_first():
+    ranked = rank_for_profile(_listings(), "python developer")
+    assert ranked[0].company == "B"
+    assert ranked[0].score > ranked[1].score
+    # One matching term each; the shorter listing scores higher
+    assert [listing.company for listing in ranked[1:]] == ["A", "C"]
+
+
+@pytest.mark.skipif(jobranking.np is None, reason="NumPy not installed")
+def test_listings_sharing_nothing_are_dropped():
+    ranked = rank_for_profile(_listings(), "python developer")
+    assert "D" not in [listing.company for listing in ranked]
+
+
+@pytest.mark.skipif(jobranking.np is None, reason="NumPy not installed")
+def test_freshness_and_salary_do_not_keep_unrelated_listings():
+    listings = _listings() + [JobListing(title="Office Manager", company="E", salary="₹9 LPA", posted="Posted today")]
+    ranked = rank_for_profile(listings, "python developer")
+    assert "E" not in [listing.company for listing in ranked]
+
+
+@pytest.mark.skipif(jobranking.np is None, reason="NumPy not installed")
+def test_listings_without_text_still_rank():
+    listings = [JobListing(title="", company="", location=""), JobListing(title="", company="", location="")]
+    ranked = rank_for_profile(listings, "python developer")
+    assert len(ranked) == 2
+    assert not any(math.isnan(listing.score) for listing in ranked)
+
+
+@pytest.mark.skipif(jobranking.np is None, reason="NumPy not installed")
+def test_profile_terms_break_ties():
+    ranked = rank_for_profile(_listings(), "developer jobs", profile="python python django")
+    assert [listing.company for listing in ranked[:2]] == ["B", "A"]
+
+
+@pytest.mark.skipif(jobranking.np is None, reason="NumPy not installed")
+def test_fresher_salaried_listing_wins_a_tie():
+    listings = [JobListing(title="Data Analyst", company="old", posted="Posted 29 days ago"),
+                JobListing(title="Data Analyst", company="new", salary="₹6 LPA", posted="Posted today")]
+    assert rank_for_profile(listings, "data analyst")[0].company == "new"
+
+
+def test_ranks_without_numpy(monkeypatch):
+    monkeypatch.setattr(jobranking, "np", None)
+    ranked = rank_for_profile(_listings(), "python developer", limit=2)
+    assert [listing.company for listing in ranked] == ["B", "A"]
+
+
+def test_nothing_to_rank():
+    assert rank_for_profile([], "python developer") == []
@@ -0,0 +1,104 @@
+from listings import JobListing, format_listings, parse_listings, rank_listings
+
+TEXT_PAGE = """Skip to main content
+Data analyst jobs in Pune
+1,204 results
+
+Data Analyst
+Acme Analytics
+Pune, Maharashtra
+₹6,00,000 - ₹9,00,000 a year
+Posted 3 days ago
+https://in.indeed.com/rc/clk?jk=0123456789abcdef&from=serp
+
+Senior Data Analyst
+Beta Corp
+Remote
+Urgently hiring
+Posted 12 days ago
+https://in.indeed.com/viewjob?jk=fedcba9876543210
+
+Data Analyst
+Acme Analytics
+Pune, Maharashtra
+Easily apply
+https://in.indeed.com/viewjob?jk=0123456789ABCDEF&tk=xyz
+"""
+
+HTML_PAGE = """
+<div class="job_seen_beacon"><a data-jk="aaaabbbbccccdddd" href="/rc/clk?jk=aaaabbbbccccdddd">
+<span>Backend Developer</span></a><span>Gamma Tech</span><div>Bengaluru, Karnataka</div>
+<div>₹12 LPA</div><span>Posted 1 day ago</span></div>
+<div class="job_seen_beacon"><a data-jk="1111222233334444"><span>Java Developer &amp; Lead</span></a>
+<span>Delta Ltd</span><div>Hyderabad, Telangana</div><span>Just posted</span></div>
+"""
+
+
+def test_text_page_cards_become_listings():
+    listings = parse_listings(TEXT_PAGE)
+    assert [listing.title for listing in listings] == ["Data Analyst", "Senior Data Analyst"]
+    analyst = listings[0]
+    assert analyst.company == "Acme Analytics"
+    assert analyst.location == "Pune, Maharashtra"
+    assert analyst.salary == "₹6,00,000 - ₹9,00,000 a year"
+    assert analyst.age_days == 3
+    assert analyst.url == "https://in.indeed.com/viewjob?jk=0123456789abcdef"
+    assert listings[1].location == "Remote"
+
+
+def test_same_job_key_is_merged_not_repeated():
+    listings = parse_listings(TEXT_PAGE)
+    keys = [listing.key for listing in listings]
+    assert keys.count("0123456789abcdef") == 1
+
+
+def test_duplicate_card_fills_in_missing_fields():
+    page = ("Data Analyst - Acme Analytics - https://in.indeed.com/viewjob?jk=0123456789abcdef\n\n"
+            "Data Analyst\nAcme Analytics\nPune, Maharashtra\n₹50,000 a month\n"
+            "https://in.indeed.com/viewjob?jk=0123456789abcdef\n")
+    (listing,) = parse_listings(page)
+    assert listing.location == "Pune, Maharashtra"
+    assert listing.salary == "₹50,000 a month"
+
+
+def test_one_line_cards_are_split_on_separators():
+    page = ("Backend Developer - Example Corp - Pune - https://in.indeed.com/viewjob?jk=00000000000000aa\n"
+            "QA Engineer | Other Corp | Remote | https://in.indeed.com/viewjob?jk=00000000000000bb\n")
+    listings = parse_listings(page)
+    assert [(l.title, l.company, l.location) for l in listings] == [
+        ("Backend Developer", "Example Corp", "Pune"), ("QA Engineer", "Other Corp", "Remote")
+    ]
+
+
+def test_html_page_cards_become_listings():
+    listings = parse_listings(HTML_PAGE)
+    assert [listing.title for listing in listings] == ["Backend Developer", "Java Developer & Lead"]
+    assert listings[0].url == "https://in.indeed.com/viewjob?jk=aaaabbbbccccdddd"
+    assert listings[0].location == "Bengaluru, Karnataka"
+    assert listings[0].salary == "₹12 LPA"
+    assert listings[1].age_days == 0
+
+
+def test_page_chrome_without_jobs_gives_nothing():
+    assert parse_listings("Skip to main content\n\nSign in\n\nFind jobs\nCompany reviews\n") == []
+
+
+def test_listings_without_job_key_dedupe_on_title_company_location():
+    a = JobListing(title="Data  Analyst", company="Acme", location="Pune")
+    b = JobListing(title="data analyst", company="ACME", location="Pune ")
+    assert a.key == b.key
+
+
+def test_rank_prefers_title_match_then_detail():
+    listings = [
+        JobListing(title="Sales Executive", company="A", location="Pune", salary="₹3 LPA", posted="Posted today"),
+        JobListing(title="Data Analyst", company="B", location="Delhi"),
+        JobListing(title="Data Analyst", company="C", location="Pune", salary="₹6 LPA"),
+    ]
+    ranked = rank_listings(listings, "data analyst jobs in pune", limit=2)
+    assert [listing.company for listing in ranked] == ["C", "B"]
+
+
+def test_format_numbers_compact_lines():
+    text = format_listings([JobListing(title="Data Analyst", company="Acme", url="https://x"), JobListing(title="QA")])
+    assert text == "1. Data Analyst | Acme | https://x\n2. QA"
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import asi1client
+from asi1client import ASI1Client, ASI1Error, CircuitOpenError
+from resilience import MIN_SAMPLES, MIN_TIMEOUT, CircuitBreaker, LatencyWindow
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, cooldown=60)
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.success()
+    breaker.failure()
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["trips"] == 1
+    assert breaker.rejected == 1
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker(failures=1, cooldown=0)
+    breaker.failure()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_probe_success_closes_the_breaker():
+    breaker = CircuitBreaker(failures=1, cooldown=0)
+    breaker.failure()
+    breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed"
+    assert breaker.consecutive == 0
+
+
+def test_probe_failure_opens_the_breaker_again():
+    breaker = CircuitBreaker(failures=5, cooldown=0)
+    for _ in range(5):
+        breaker.failure()
+    breaker.allow()
+    breaker.failure()
+    assert breaker.stats()["trips"] == 2
+    assert not breaker.probing
+    # Cooled down again (cooldown 0), so the next probe may go
+    assert breaker.allow()
+
+
+def test_abandoned_probe_frees_the_half_open_slot():
+    breaker = CircuitBreaker(failures=1, cooldown=0)
+    breaker.failure()
+    breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_adaptive_timeout_waits_for_samples():
+    window = LatencyWindow()
+    assert window.timeout(30) == 30
+    for _ in range(MIN_SAMPLES):
+        window.add(0.1)
+    # 3 x p99 is under the floor
+    assert window.timeout(30) == MIN_TIMEOUT
+    for _ in range(MIN_SAMPLES):
+        window.add(20)
+    assert window.timeout(30) == 30
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failures=1, cooldown=0)
+    monkeypatch.setattr(asi1client, "breaker", breaker)
+    return breaker
+
+
+def test_unexpected_error_in_a_probe_is_recorded_and_frees_the_probe(breaker):
+    async def crash():
+        raise RuntimeError("not an ASI1Error")
+
+    breaker.failure()
+    with pytest.raises(RuntimeError):
+        asyncio.run(ASI1Client(api_key="test")._resilient(crash))
+    assert not breaker.probing
+    assert breaker.stats()["trips"] == 2
+    assert breaker.allow()
+
+
+def test_rejected_request_neither_counts_nor_holds_the_probe(breaker):
+    async def bad_request():
+        raise ASI1Error.from_status(400, "invalid model")
+
+    breaker.failure()
+    with pytest.raises(ASI1Error) as error:
+        asyncio.run(ASI1Client(api_key="test")._resilient(bad_request))
+    assert error.value.rejected
+    assert breaker.consecutive == 1
+    assert not breaker.probing
+    assert breaker.allow()
+
+
+def test_server_errors_and_rate_limits_are_not_rejections():
+    assert not ASI1Error.from_status(503, "unavailable").rejected
+    assert not ASI1Error.from_status(429, "slow down").rejected
+    assert not ASI1Error("timed out", retryable=True, kind="timeout").rejected
+
+
+def test_open_breaker_fails_fast(monkeypatch):
+    monkeypatch.setattr(asi1client, "breaker", CircuitBreaker(failures=1, cooldown=60))
+    asi1client.breaker.failure()
+
+    async def never():
+        raise AssertionError("called through an open breaker")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(ASI1Client(api_key="test")._resilient(never))
+
+
+def test_undecodable_body_is_a_bad_response(breaker, monkeypatch):
+    async def not_json(request):
+        return web.Response(text="<html>gateway error</html>", content_type="application/json")
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", not_json)
+        async with TestServer(app) as server:
+            monkeypatch.setattr(asi1client, "ASI1_URL", str(server.make_url("/v1/chat/completions")))
+            try:
+                with pytest.raises(ASI1Error) as error:
+                    await ASI1Client(api_key="test").complete("hi", session_id="test")
+            finally:
+                await asi1client.close_pool()
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.kind == "bad_response"
+    assert not error.retryable
+    assert breaker.consecutive == 1
@@ -0,0 +1,37 @@
+from router import AGENT_KEYWORDS, KeywordRouter, stem
+
+
+def test_keywords_match_whole_stemmed_words():
+    router = KeywordRouter.for_agent("Job Matching")
+    assert router.route("Which COURSES, (certifications) and Market trends?") == {"Training Resource",
+                                                                                  "Demand Analysis"}
+    assert router.route("Review my CV") == {"Resume Expert"}
+    # Inside another word is not a match
+    assert router.route("Supermarkets and discourse") == set()
+
+
+def test_each_agent_routes_on_its_own_keywords():
+    assert KeywordRouter.for_agent("Commander").route("Any opening in Pune?") == {"Job Matching"}
+    assert KeywordRouter.for_agent("Training Resource").route("Any opening in Pune?") == set()
+    assert KeywordRouter.for_agent("Job Matching").route("How is the market?") == {"Demand Analysis"}
+    assert KeywordRouter.for_agent("Demand Analysis").route("How is the market?") == set()
+    assert KeywordRouter.for_agent("Demand Analysis").route("Where is my skill gap?") == {"Skill Assessment"}
+    assert KeywordRouter.for_agent("Job Matching").route("Where is my skill gap?") == {"Skill Assessment"}
+    assert KeywordRouter.for_agent("Skill Assessment").route("Where is my skill gap?") == set()
+
+
+def test_root_survives_y_to_ies():
+    # "vacancies" stems to "vacancy" without containing it
+    assert stem("vacancies") == stem("vacancy")
+    assert KeywordRouter.for_agent("Skill Assessment").route("Any vacancies?") == {"Job Matching"}
+
+
+def test_phrase_rules_need_their_words_in_order():
+    router = KeywordRouter({"Resume Expert": ["curriculum vitae"]})
+    assert router.route("Please check my Curriculum Vitae.") == {"Resume Expert"}
+    assert router.route("The vitae of the curriculum") == set()
+
+
+def test_every_agent_has_rules():
+    assert set(AGENT_KEYWORDS) == {"Commander", "Resume Expert", "Skill Assessment", "Demand Analysis",
+                                   "Training Resource", "Job Matching"}
@@ -0,0 +1,97 @@
+import asyncio
+
+from scheduler import ENRICHMENT, FINAL, SECTION, Scheduler, priority_for
+
+
+def test_priority_for_clamps_hops():
+    assert priority_for(0) == FINAL
+    assert priority_for(1) == SECTION
+    assert priority_for(5) == ENRICHMENT
+    assert priority_for(-1) == FINAL
+
+
+async def _admission_order(scheduler, callers):
+    """Queue `callers` ((name, priority, session), ...) behind a held slot; return the order they start in."""
+    started = []
+
+    async def call(name, priority, session):
+        async with scheduler.slot(priority, session):
+            started.append(name)
+            await asyncio.sleep(0)
+
+    await scheduler.acquire()
+    tasks = [asyncio.ensure_future(call(*caller)) for caller in callers]
+    await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return started
+
+
+def test_most_urgent_priority_goes_first():
+    async def run():
+        scheduler = Scheduler(rate_per_minute=0, concurrency=1)
+        return await _admission_order(scheduler, [
+            ("enrichment", ENRICHMENT, "a"), ("section", SECTION, "b"), ("final", FINAL, "c")
+        ])
+
+    assert asyncio.run(run()) == ["final", "section", "enrichment"]
+
+
+def test_sessions_take_turns_within_a_priority():
+    async def run():
+        scheduler = Scheduler(rate_per_minute=0, concurrency=1)
+        return await _admission_order(scheduler, [
+            ("a1", SECTION, "a"), ("a2", SECTION, "a"), ("a3", SECTION, "a"), ("b1", SECTION, "b"), ("b2", SECTION, "b")
+        ])
+
+    assert asyncio.run(run()) == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_concurrency_cap():
+    async def run():
+        scheduler = Scheduler(rate_per_minute=0, concurrency=2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with scheduler.slot():
+                peak = max(peak, scheduler.running)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        return peak, scheduler.running, scheduler.admitted
+
+    assert asyncio.run(run()) == (2, 0, 6)
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        scheduler = Scheduler(rate_per_minute=0, concurrency=1)
+        await scheduler.acquire()
+        waiter = asyncio.ensure_future(scheduler.acquire(FINAL, "a"))
+        await asyncio.sleep(0)
+        assert scheduler.depth() == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        depth = scheduler.depth()
+        scheduler.release()
+        return depth, scheduler.running
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+def test_empty_bucket_throttles_until_a_token_is_back():
+    async def run():
+        # 600 a minute is one token every 0.1s
+        scheduler = Scheduler(rate_per_minute=600, burst=1, concurrency=8)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with scheduler.slot():
+            pass
+        async with scheduler.slot():
+            pass
+        return loop.time() - started, scheduler.throttled
+
+    waited, throttled = asyncio.run(run())
+    assert waited >= 0.08
+    assert throttled == 1
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+import asi1client
+from asi1client import ASI1Client
+from scheduler import ENRICHMENT, FINAL
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def produce():
+            nonlocal calls
+            calls += 1
+            yield "hello "
+            await asyncio.sleep(0.01)
+            yield "world"
+
+        async def follow():
+            return "".join([part async for part in flight.join("key", produce)])
+
+        results = await asyncio.gather(*(follow() for _ in range(3)))
+        return results, calls, flight.stats()
+
+    results, calls, stats = asyncio.run(run())
+    assert results == ["hello world"] * 3
+    assert calls == 1
+    assert stats["calls"] == 1 and stats["duplicates"] == 2 and stats["in_flight"] == 0
+
+
+def test_finished_call_is_not_reused():
+    async def run():
+        flight = SingleFlight()
+
+        async def produce():
+            yield "x"
+
+        for _ in range(2):
+            assert [part async for part in flight.join("key", produce)] == ["x"]
+        return flight.stats()
+
+    assert asyncio.run(run())["calls"] == 2
+
+
+def test_error_reaches_every_follower():
+    async def run():
+        flight = SingleFlight()
+
+        async def produce():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+            yield  # pragma: no cover
+
+        async def follow():
+            return [part async for part in flight.join("key", produce)]
+
+        return await asyncio.gather(follow(), follow(), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_caller_that_stops_listening_does_not_cancel_the_others():
+    async def run():
+        flight = SingleFlight()
+
+        async def produce():
+            for part in ("a", "b", "c"):
+                await asyncio.sleep(0.01)
+                yield part
+
+        async def follow():
+            return "".join([part async for part in flight.join("key", produce)])
+
+        quitter = asyncio.ensure_future(follow())
+        stayer = asyncio.ensure_future(follow())
+        await asyncio.sleep(0.015)
+        quitter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await quitter
+        return await stayer
+
+    assert asyncio.run(run()) == "abc"
+
+
+def test_client_coalesces_only_same_api_key_and_priority(monkeypatch):
+    monkeypatch.setattr(asi1client, "inflight", SingleFlight())
+    posted = []
+
+    async def post(self, data, timeout, key, admit):
+        posted.append((self.api_key, admit[0]))
+        await asyncio.sleep(0.01)
+        yield "answer"
+
+    monkeypatch.setattr(ASI1Client, "_post", post)
+
+    async def run():
+        calls = [ASI1Client(api_key="a").complete("hi", priority=ENRICHMENT) for _ in range(2)]
+        calls.append(ASI1Client(api_key="b").complete("hi", priority=ENRICHMENT))
+        calls.append(ASI1Client(api_key="a").complete("hi", priority=FINAL))
+        return await asyncio.gather(*calls)
+
+    assert asyncio.run(run()) == ["answer"] * 4
+    assert sorted(posted) == sorted([("a", ENRICHMENT), ("b", ENRICHMENT), ("a", FINAL)])
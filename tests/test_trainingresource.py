@@ -0,0 +1,75 @@
+import asyncio
+from collections import defaultdict, deque
+
+import pytest
+
+from fanin import ScatterGather
+from sessions import SessionStore
+from toolcache import ToolCache
+import trainingresource
+from trainingresource import TAVILY_AGENT_ADDRESS, WebSearchResponse, WebSearchResult
+
+
+@pytest.fixture
+def training(monkeypatch):
+    monkeypatch.setattr(trainingresource, "sessions", SessionStore(ttl=60))
+    monkeypatch.setattr(trainingresource, "awaiting_search", defaultdict(deque))
+    monkeypatch.setattr(trainingresource, "fanin", ScatterGather())
+    monkeypatch.setattr(trainingresource, "search_cache", ToolCache(fresh_for=60))
+    return trainingresource
+
+
+def _search_reply(query: str) -> WebSearchResponse:
+    return WebSearchResponse(query=query, results=[WebSearchResult(title="Course", url="https://x", content="...")])
+
+
+def test_tavily_reply_goes_to_the_oldest_live_request(training, ctx):
+    async def run():
+        request_ids = []
+        for _ in range(3):
+            request_id, _ = training.sessions.open()
+            training.fanin.expect(request_id, [TAVILY_AGENT_ADDRESS])
+            training.awaiting_search["python courses"].append(request_id)
+            request_ids.append(request_id)
+        # The first request expired before Tavily answered
+        training.sessions.close(request_ids[0])
+
+        await training.handle_tavily_response(ctx, TAVILY_AGENT_ADDRESS, _search_reply("python courses"))
+        return request_ids, training.fanin.pending(request_ids[1]), training.fanin.pending(request_ids[2])
+
+    request_ids, second, third = asyncio.run(run())
+    assert second == []
+    assert third == [TAVILY_AGENT_ADDRESS]
+    assert list(training.awaiting_search["python courses"]) == [request_ids[2]]
+
+
+def test_tavily_reply_for_another_query_is_not_misrouted(training, ctx):
+    async def run():
+        request_id, _ = training.sessions.open()
+        training.fanin.expect(request_id, [TAVILY_AGENT_ADDRESS])
+        training.awaiting_search["python courses"].append(request_id)
+        await training.handle_tavily_response(ctx, TAVILY_AGENT_ADDRESS, _search_reply("excel courses"))
+        return training.fanin.pending(request_id)
+
+    assert asyncio.run(run()) == [TAVILY_AGENT_ADDRESS]
+    assert "excel courses" not in training.awaiting_search
+
+
+def test_last_waiting_request_removes_the_query(training, ctx):
+    async def run():
+        request_id, _ = training.sessions.open()
+        training.fanin.expect(request_id, [TAVILY_AGENT_ADDRESS])
+        training.awaiting_search["python courses"].append(request_id)
+        await training.handle_tavily_response(ctx, TAVILY_AGENT_ADDRESS, _search_reply("python courses"))
+
+    asyncio.run(run())
+    assert dict(training.awaiting_search) == {}
+
+
+def test_forget_search_drops_empty_queues(training):
+    training.awaiting_search["python courses"].extend(["r1", "r2"])
+    training.forget_search("python courses", "r1")
+    assert list(training.awaiting_search["python courses"]) == ["r2"]
+    training.forget_search("python courses", "r2")
+    training.forget_search("unknown query", "r3")
+    assert dict(training.awaiting_search) == {}